@@ -0,0 +1,63 @@
+"""Benchmark: memory of the parsed models kept in a history.
+
+Run from the repository root (Python 3)::
+
+    python benchmarks/bench_memory.py [--number N]
+
+Each recorded payload is parsed N times and all the models are kept, like a
+status history of many devices. The table reports, per parsed payload, the
+memory allocated for the whole model (objects, lists and strings) and the
+shallow size of the model object (including its ``__dict__`` if any).
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import bench_parsing  # noqa: E402
+
+
+def _shallow_size(model):
+    size = sys.getsizeof(model)
+    if hasattr(model, '__dict__'):
+        size += sys.getsizeof(model.__dict__)
+    return size
+
+
+def measure(parse, payload, number):
+    """Return (bytes per parsed payload, shallow bytes of the model)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = [parse(payload) for _ in range(number)]
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    model = history[0]
+    if isinstance(model, list):
+        model = model[0]
+    return allocated / float(number), _shallow_size(model)
+
+
+def main():
+    """Run the benchmark and print the table."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=2000,
+                        help='Parsed payloads kept (default 2000)')
+    args = parser.parse_args()
+
+    print('%-26s %14s %14s' % ('payload', 'bytes/payload', 'model bytes'))
+    for name, payload, _, parse in bench_parsing.cases():
+        allocated, shallow = measure(parse, payload, args.number)
+        print('%-26s %14.0f %14d' % (name, allocated, shallow))
+
+
+if __name__ == '__main__':
+    main()
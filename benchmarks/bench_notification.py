@@ -0,0 +1,212 @@
+"""Benchmark: websocket notifications with a thread per device vs a hub.
+
+Run from the repository root (Linux, Python 3)::
+
+    python benchmarks/bench_notification.py [--devices N] [--messages M]
+
+A local websocket server (separate process) accepts the connections of N
+devices and pushes M volume notifications to each of them. Each mode runs in
+its own process and reports the threads, the memory per monitored device
+(RSS and Python heap) and the context switches while the notifications are
+delivered.
+"""
+
+from __future__ import print_function
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from requests import Session  # noqa: E402
+
+from libsoundtouch.device import SoundTouchDevice, \
+    BaseSoundTouchDevice  # noqa: E402
+from libsoundtouch.notification import NotificationHub  # noqa: E402
+
+_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+with open(os.path.join(ROOT, 'tests', 'data', 'ws_volume.xml'), 'rb') as \
+        volume_file:
+    MESSAGE = volume_file.read().strip()
+
+
+# Server process ----------------------------------------------------------
+
+def _handshake(client):
+    request = b""
+    while b"\r\n\r\n" not in request:
+        request += client.recv(1024)
+    key = [line.split(b":", 1)[1].strip() for line in request.split(b"\r\n")
+           if line.lower().startswith(b"sec-websocket-key:")][0]
+    accept = base64.b64encode(hashlib.sha1(key + _GUID).digest())
+    client.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                   b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                   b"Sec-WebSocket-Protocol: gabbo\r\n"
+                   b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+
+def serve(devices, messages):
+    """Accept the devices, then push the notifications on 'go'."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1024)
+    print(server.getsockname()[1])
+    sys.stdout.flush()
+    clients = []
+    while len(clients) < devices:
+        client = server.accept()[0]
+        _handshake(client)
+        clients.append(client)
+    sys.stdin.readline()
+    frame = struct.pack('!BBH', 0x81, 126, len(MESSAGE)) + MESSAGE
+    for _ in range(messages):
+        for client in clients:
+            client.sendall(frame)
+        time.sleep(0.01)
+    sys.stdin.readline()
+
+
+# Client process ----------------------------------------------------------
+
+class _BenchDevice(SoundTouchDevice):
+    """Device with a known configuration: no HTTP request."""
+
+    def __init__(self, ws_port):
+        # pylint: disable=super-init-not-called
+        BaseSoundTouchDevice.__init__(self, '127.0.0.1', ws_port=ws_port)
+        self._session = Session()
+        self._idle_timeout = 30
+        self._timeout = None
+        self._last_request = None
+        self._ws_client = None
+        self._hub = None
+        self._coalescer = None
+        self.count = 0
+        self.add_volume_listener(self._on_volume)
+
+    def _on_volume(self, volume):
+        # pylint: disable=unused-argument
+        self.count += 1
+
+
+def _rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _context_switches():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_nvcsw + usage.ru_nivcsw
+
+
+def _wait(predicate, timeout=60):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def run_client(mode, devices, messages):
+    """Monitor the devices in one mode and return the measures."""
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve',
+         '--devices', str(devices), '--messages', str(messages)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        universal_newlines=True)
+    port = int(server.stdout.readline())
+    tracemalloc.start()
+    threads = threading.active_count()
+    rss = _rss_kb()
+    heap = tracemalloc.get_traced_memory()[0]
+
+    hub = NotificationHub() if mode == 'hub' else None
+    monitored = [_BenchDevice(port) for _ in range(devices)]
+    for device in monitored:
+        device.start_notification(hub=hub)
+    connected = _wait(lambda: all(device.notification_connected
+                                  for device in monitored))
+    time.sleep(0.5)
+    heap = tracemalloc.get_traced_memory()[0] - heap
+    result = {
+        'mode': mode,
+        'connected': connected,
+        'threads': threading.active_count() - threads,
+        'rss_kb_per_device': (_rss_kb() - rss) / float(devices),
+        'heap_kb_per_device': heap / 1024.0 / devices,
+    }
+    tracemalloc.stop()
+
+    switches = _context_switches()
+    start = time.time()
+    server.stdin.write('go\n')
+    server.stdin.flush()
+    delivered = _wait(lambda: all(device.count >= messages
+                                  for device in monitored))
+    result['delivered'] = delivered
+    result['seconds'] = time.time() - start
+    result['context_switches'] = _context_switches() - switches
+    server.stdin.write('stop\n')
+    server.stdin.flush()
+    server.wait()
+    return result
+
+
+def main():
+    """Run both modes and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--devices', type=int, default=200,
+                        help='Monitored devices (default 200)')
+    parser.add_argument('--messages', type=int, default=20,
+                        help='Notifications per device (default 20)')
+    parser.add_argument('--mode', choices=('threads', 'hub'))
+    parser.add_argument('--serve', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.devices, args.messages)
+        return
+    if args.mode:
+        print(json.dumps(run_client(args.mode, args.devices, args.messages)))
+        sys.stdout.flush()
+        # Threads of WebSocketApp can't be stopped cleanly
+        os._exit(0)  # pylint: disable=protected-access
+
+    print('%d devices, %d notifications each' % (args.devices,
+                                                 args.messages))
+    print('%-8s %8s %14s %14s %10s %8s' % (
+        'mode', 'threads', 'RSS KB/dev', 'heap KB/dev', 'ctx sw', 'seconds'))
+    for mode in ('threads', 'hub'):
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode,
+             '--devices', str(args.devices), '--messages',
+             str(args.messages)], universal_newlines=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        if not result['connected'] or not result['delivered']:
+            print('%-8s incomplete run: %r' % (mode, result))
+            continue
+        print('%-8s %8d %14.1f %14.1f %10d %8.2f' % (
+            mode, result['threads'], result['rss_kb_per_device'],
+            result['heap_kb_per_device'], result['context_switches'],
+            result['seconds']))
+
+
+if __name__ == '__main__':
+    main()
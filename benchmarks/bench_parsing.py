@@ -0,0 +1,225 @@
+"""Micro-benchmark: ElementTree model parsing vs the former minidom path.
+
+Run from the repository root::
+
+    python benchmarks/bench_parsing.py [--number N]
+
+The legacy functions below reproduce the minidom lookups the models used to
+do (one ``getElementsByTagName`` walk per field) so both paths can be timed
+on the recorded payloads of ``tests/data``.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import timeit
+from xml.dom import minidom
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+from libsoundtouch.device import _parse_config, _parse_status, \
+    _parse_presets, _parse_volume, _parse_zone_status  # noqa: E402
+
+DATA = os.path.join(ROOT, 'tests', 'data')
+
+CONFIG = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<info deviceID="00112233445566">
+    <name>Home</name>
+    <type>SoundTouch 20</type>
+    <margeAccountUUID>AccountUUIDValue</margeAccountUUID>
+    <components>
+        <component>
+            <componentCategory>SCM</componentCategory>
+            <softwareVersion>13.0.9.29919.1889959</softwareVersion>
+            <serialNumber>XXXXX</serialNumber>
+        </component>
+        <component>
+            <componentCategory>PackagedProduct</componentCategory>
+            <serialNumber>YYYYY</serialNumber>
+        </component>
+    </components>
+    <margeURL>https://streaming.bose.com</margeURL>
+    <networkInfo type="SCM">
+        <macAddress>00112233445566</macAddress>
+        <ipAddress>192.168.1.2</ipAddress>
+    </networkInfo>
+    <networkInfo type="SMSC">
+        <macAddress>66554433221100</macAddress>
+        <ipAddress>192.168.1.1</ipAddress>
+    </networkInfo>
+    <moduleType>sm2</moduleType>
+    <variant>spotty</variant>
+    <variantMode>normal</variantMode>
+    <countryCode>GB</countryCode>
+    <regionCode>GB</regionCode>
+</info>"""
+
+VOLUME = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<volume deviceID="11223344">
+    <targetvolume>26</targetvolume>
+    <actualvolume>25</actualvolume>
+    <muteenabled>false</muteenabled>
+</volume>"""
+
+ZONE = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<zone master="1111MASTER" senderIPAddress="192.168.1.1">
+    <member ipaddress="192.168.1.2" role="NORMAL">1111SLAVE</member>
+    <member ipaddress="192.168.1.3" role="NORMAL">2222SLAVE</member>
+</zone>"""
+
+
+def _read(name):
+    with io.open(os.path.join(DATA, name), 'rb') as data_file:
+        return data_file.read()
+
+
+def _presets_payload():
+    """Build a /presets payload from the presets websocket message."""
+    message = _read('ws_presets.xml').decode('utf-8')
+    start = message.index('<presets>')
+    end = message.index('</presets>') + len('</presets>')
+    return message[start:end].encode('utf-8')
+
+
+# Legacy minidom path ------------------------------------------------------
+
+def _legacy_value(dom, element):
+    elements = dom.getElementsByTagName(element)
+    if elements and elements[0].firstChild is not None:
+        return elements[0].firstChild.nodeValue.strip()
+    return None
+
+
+def _legacy_element_attribute(dom, element, attribute):
+    elements = dom.getElementsByTagName(element)
+    if elements and attribute in elements[0].attributes.keys():
+        return elements[0].attributes[attribute].value
+    return None
+
+
+def _legacy_attribute(dom, attribute):
+    if attribute in dom.attributes.keys():
+        return dom.attributes[attribute].value
+    return None
+
+
+def _legacy_content_item(dom):
+    return [_legacy_value(dom, "itemName")] + [
+        _legacy_attribute(dom, name) for name in
+        ("source", "type", "location", "sourceAccount", "isPresetable")]
+
+
+def legacy_status(payload):
+    """Parse /now_playing the way Status used to."""
+    dom = minidom.parseString(payload)
+    fields = [_legacy_element_attribute(dom, "nowPlaying", "source"),
+              _legacy_content_item(
+                  dom.getElementsByTagName("ContentItem")[0]),
+              _legacy_element_attribute(dom, "art", "artImageStatus"),
+              _legacy_element_attribute(dom, "time", "total")]
+    for name in ("track", "artist", "album", "art", "time", "playStatus",
+                 "shuffleSetting", "repeatSetting", "streamType", "trackID",
+                 "stationName", "description", "stationLocation"):
+        fields.append(_legacy_value(dom, name))
+    return fields
+
+
+def legacy_config(payload):
+    """Parse /info the way Config used to."""
+    dom = minidom.parseString(payload)
+    fields = [_legacy_element_attribute(dom, "info", "deviceID")]
+    for name in ("name", "type", "margeAccountUUID", "moduleType", "variant",
+                 "variantMode", "countryCode", "regionCode"):
+        fields.append(_legacy_value(dom, name))
+    for network in dom.getElementsByTagName("networkInfo"):
+        fields.append((network.attributes["type"].value,
+                       _legacy_value(network, "macAddress"),
+                       _legacy_value(network, "ipAddress")))
+    for components in dom.getElementsByTagName("components"):
+        for component in components.getElementsByTagName("component"):
+            fields.append((_legacy_value(component, "componentCategory"),
+                           _legacy_value(component, "softwareVersion"),
+                           _legacy_value(component, "serialNumber")))
+    return fields
+
+
+def legacy_volume(payload):
+    """Parse /volume the way Volume used to."""
+    dom = minidom.parseString(payload)
+    return (int(_legacy_value(dom, "actualvolume")),
+            int(_legacy_value(dom, "targetvolume")),
+            _legacy_value(dom, "muteenabled") == "true")
+
+
+def legacy_presets(payload):
+    """Parse /presets the way Preset used to."""
+    dom = minidom.parseString(payload)
+    presets = []
+    for preset in dom.getElementsByTagName("preset"):
+        fields = [_legacy_value(preset, "itemName"),
+                  _legacy_attribute(preset, "id")]
+        for name in ("source", "type", "location", "sourceAccount",
+                     "isPresetable"):
+            fields.append(_legacy_element_attribute(preset, "ContentItem",
+                                                    name))
+        fields.append(preset.getElementsByTagName("ContentItem")[0].toxml())
+        presets.append(fields)
+    return presets
+
+
+def legacy_zone_status(payload):
+    """Parse /getZone the way ZoneStatus used to."""
+    dom = minidom.parseString(payload)
+    if not dom.getElementsByTagName("member"):
+        return None
+    return ([_legacy_element_attribute(dom, "zone", "master"),
+             _legacy_element_attribute(dom, "zone", "senderIPAddress")] +
+            [(_legacy_attribute(member, "ipaddress"),
+              _legacy_attribute(member, "role"))
+             for member in dom.getElementsByTagName("member")])
+
+
+def cases():
+    """Return (name, payload, legacy parser, new parser) benchmark cases."""
+    result = []
+    for name in ('spotify.xml', 'spotify_utf8.xml', 'radio.xml',
+                 'radio_utf8.xml', 'stored_music.xml'):
+        result.append(('status ' + name, _read(name), legacy_status,
+                       _parse_status))
+    result.append(('config', CONFIG, legacy_config, _parse_config))
+    result.append(('volume', VOLUME, legacy_volume, _parse_volume))
+    result.append(('presets', _presets_payload(), legacy_presets,
+                   _parse_presets))
+    result.append(('zone', ZONE, legacy_zone_status, _parse_zone_status))
+    return result
+
+
+def main():
+    """Run the benchmark and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=2000,
+                        help='Parses per measure (default 2000)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Measures per case, best is kept (default 5)')
+    args = parser.parse_args()
+
+    print('%-26s %12s %12s %8s' % ('payload', 'minidom us', 'etree us',
+                                   'speedup'))
+    for name, payload, legacy, current in cases():
+        timings = []
+        for function in (legacy, current):
+            best = min(timeit.repeat(lambda f=function: f(payload),
+                                     number=args.number,
+                                     repeat=args.repeat))
+            timings.append(best / args.number * 1e6)
+        print('%-26s %12.1f %12.1f %7.1fx' % (name, timings[0], timings[1],
+                                              timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Benchmark suite of the hot paths, compared with stored baselines.
+
+Run from the repository root::
+
+    python benchmarks/bench_suite.py              # run, compare to baseline
+    python benchmarks/bench_suite.py --save       # run, store the baseline
+    python benchmarks/bench_suite.py -k http      # only the matching cases
+
+Cases:
+
+* ``parse *``: model parsing (Status, Config, Volume, Preset, ZoneStatus)
+  of the recorded payloads, in microseconds per payload,
+* ``on_message *``: websocket messages handled by ``_on_message`` (parsing,
+  model update, listeners), in messages per second; ``unchanged`` cases
+  repeat the same message, whose parsed model is reused,
+* ``dispatch *``: delay between ``ListenerDispatcher.dispatch`` and the
+  listener call, in microseconds (median and 99th percentile),
+* ``http *``: command round-trips of a ``SoundTouchDevice`` against a local
+  ``SoundTouchEmulator`` without emulated latency, in microseconds (median).
+
+Baselines (``benchmarks/baseline.json`` by default) depend on the machine:
+store them on the machine used for the comparisons. The run exits with
+status 1 when a case is slower than its baseline by more than the tolerance.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import timeit
+from collections import OrderedDict
+from threading import Event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import bench_parsing  # noqa: E402
+
+from libsoundtouch.device import SoundTouchDevice  # noqa: E402
+from libsoundtouch.emulator import SoundTouchEmulator  # noqa: E402
+from libsoundtouch.notification import ListenerDispatcher  # noqa: E402
+
+try:
+    from time import perf_counter as _clock
+except ImportError:
+    from time import time as _clock
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Units, and whether a higher value is better
+US = 'us'
+MSG_PER_S = 'msg/s'
+_HIGHER_IS_BETTER = {US: False, MSG_PER_S: True}
+
+
+def _read(name):
+    with io.open(os.path.join(bench_parsing.DATA, name), 'r',
+                 encoding='utf-8') as data_file:
+        return data_file.read().strip()
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def bench_parsing_cases(scale, selected):
+    """Yield (name, value, unit) of the model parsing cases."""
+    number = max(1, int(2000 * scale))
+    for name, payload, _, parse in bench_parsing.cases():
+        if not selected('parse ' + name):
+            continue
+        best = min(timeit.repeat(lambda p=payload, f=parse: f(p),
+                                 number=number, repeat=7))
+        yield 'parse ' + name, best / number * 1e6, US
+
+
+def bench_on_message(scale, selected):
+    """Yield (name, value, unit) of the websocket message cases."""
+    device = SoundTouchDevice('127.0.0.1', lazy=True)
+    received = []
+    device.add_volume_listener(received.append)
+    device.add_status_listener(received.append)
+    device.add_presets_listener(received.append)
+    number = max(1, int(5000 * scale))
+    for name, message_file in (('volume', 'ws_volume.xml'),
+                               ('status', 'ws_status.xml'),
+                               ('presets', 'ws_presets.xml')):
+        if not selected('on_message ' + name):
+            continue
+        message = _read(message_file)
+        # Alternate two payloads of the same value: each one is parsed
+        messages = itertools.cycle((message, message + '\n'))
+        best = min(timeit.repeat(
+            lambda m=messages: device._on_message(None, next(m)),
+            number=number, repeat=7))
+        yield 'on_message ' + name, number / best, MSG_PER_S
+    if selected('on_message status unchanged'):
+        message = _read('ws_status.xml')
+        best = min(timeit.repeat(
+            lambda: device._on_message(None, message),
+            number=number, repeat=7))
+        yield 'on_message status unchanged', number / best, MSG_PER_S
+    device.close()
+
+
+def bench_dispatch(scale, selected):
+    """Yield (name, value, unit) of the listener dispatch latency cases."""
+    if not selected('dispatch latency'):
+        return
+    dispatcher = ListenerDispatcher()
+    delivered = Event()
+    latencies = []
+
+    def listener(sent_at):
+        latencies.append(_clock() - sent_at)
+        delivered.set()
+
+    device = object()
+    for _ in range(max(10, int(2000 * scale))):
+        delivered.clear()
+        dispatcher.dispatch(device, listener, _clock())
+        delivered.wait(5)
+    dispatcher.close()
+    yield 'dispatch latency p50', _median(latencies) * 1e6, US
+    yield 'dispatch latency p99', _percentile(latencies, 99) * 1e6, US
+
+
+def bench_http(scale, selected):
+    """Yield (name, value, unit) of the HTTP round-trip cases."""
+    if not selected('http'):
+        return
+    emulator = SoundTouchEmulator()
+    emulated = emulator.add_device()
+    emulator.start()
+    device = SoundTouchDevice(emulated.host, emulated.port, emulated.ws_port)
+    device.power_on()
+    releasing = SoundTouchDevice(emulated.host, emulated.port,
+                                 emulated.ws_port, config=device.config,
+                                 async_key_release=True)
+    number = max(10, int(500 * scale))
+    try:
+        # Wait for the background key release, out of the measure
+        released = lambda: releasing._get_key_executor().submit(  # noqa
+            lambda: None).result()
+        for name, command, settle in (
+                ('volume', device.volume, None),
+                ('status', device.status, None),
+                ('set_volume', lambda: device.set_volume(20), None),
+                ('key', device.play, None),
+                ('key async release', releasing.play, released)):
+            if not selected('http ' + name):
+                continue
+            command()
+            timings = []
+            for _ in range(number):
+                if settle is not None:
+                    settle()
+                start = _clock()
+                command()
+                timings.append(_clock() - start)
+            yield 'http ' + name, _median(timings) * 1e6, US
+    finally:
+        device.close()
+        releasing.close()
+        emulator.close()
+
+
+SUITES = (bench_parsing_cases, bench_on_message, bench_dispatch, bench_http)
+
+
+def _regression(value, baseline, unit):
+    """Return the relative slowdown versus the baseline (0.1 = 10%)."""
+    if _HIGHER_IS_BETTER[unit]:
+        return baseline / value - 1
+    return value / baseline - 1
+
+
+def _best(value, other, unit):
+    if _HIGHER_IS_BETTER[unit]:
+        return max(value, other)
+    return min(value, other)
+
+
+def run(selected, scale, results):
+    """Run the selected cases, keep the best values in results."""
+    for suite in SUITES:
+        for name, value, unit in suite(scale, selected):
+            if name in results:
+                value = _best(value, results[name]['value'], unit)
+            results[name] = {'value': value, 'unit': unit}
+
+
+def _regressions(results, baseline, tolerance):
+    return [name for name, result in sorted(results.items())
+            if name in baseline
+            and baseline[name]['unit'] == result['unit']
+            and _regression(result['value'], baseline[name]['value'],
+                            result['unit']) > tolerance]
+
+
+def main():
+    """Run the suite, print the results and compare them."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-k', dest='keyword', default='',
+                        help='Only run the cases containing this text')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Iterations multiplier (default 1)')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='Baseline file (default benchmarks/'
+                             'baseline.json)')
+    parser.add_argument('--save', action='store_true',
+                        help='Store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown before failing (default 0.25)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='Runs of the slower cases to confirm a '
+                             'regression, best value kept (default 2)')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with io.open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file).get('cases', {})
+
+    def selected(name):
+        # Prefixes of case names are selected too, to skip whole suites
+        return args.keyword in name or name in args.keyword
+
+    results = OrderedDict()
+    run(selected, args.scale, results)
+    regressions = [] if args.save else _regressions(results, baseline,
+                                                    args.tolerance)
+    for _ in range(args.retries):
+        if not regressions:
+            break
+        # Noise (other processes, CPU frequency) makes single runs slower
+        run(lambda name, names=regressions: any(
+            case.startswith(name) for case in names), args.scale, results)
+        regressions = _regressions(results, baseline, args.tolerance)
+
+    print('%-30s %14s %14s %9s' % ('case', 'value', 'baseline', 'change'))
+    for name in results:
+        value, unit = results[name]['value'], results[name]['unit']
+        reference = baseline.get(name)
+        if reference is None or reference['unit'] != unit:
+            print('%-30s %10.1f %-5s %14s' % (name, value, unit, '-'))
+            continue
+        print('%-30s %10.1f %-5s %10.1f %-5s %+8.1f%%%s' % (
+            name, value, unit, reference['value'], unit,
+            _regression(value, reference['value'], unit) * 100,
+            ' REGRESSION' if name in regressions else ''))
+
+    if args.save:
+        if args.keyword and baseline:
+            baseline.update(results)
+            results = baseline
+        with io.open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            baseline_file.write(u'' + json.dumps(
+                {'python': platform.python_version(),
+                 'machine': platform.machine(), 'cases': results},
+                indent=2, sort_keys=True) + u'\n')
+        print('Baseline saved to %s' % args.baseline)
+    elif regressions:
+        print('%d regression(s) above %d%%: %s' % (
+            len(regressions), args.tolerance * 100, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,14 @@
 """libsoundtouch."""
 
 import logging
+import time
 
 try:
     from queue import Queue, Empty
 except ImportError:
     from Queue import Queue, Empty  # type: ignore
 from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.fleet import SoundTouchFleet  # noqa: F401
 from libsoundtouch.utils import SoundtouchDeviceListener
 from zeroconf import Zeroconf, ServiceBrowser
 
@@ -24,26 +26,75 @@ def soundtouch_device(host, port=8090):
     return s_device
 
 
-def discover_devices(timeout=5):
-    """Discover devices on the local network.
+def iter_devices(timeout=5, expected_count=None, expected_ids=None):
+    """Discover devices on the local network and yield them when found.
+
+    Stop after timeout, or as soon as the expected devices are found.
 
     :param timeout: Max time to wait in seconds. Default 5
+    :param expected_count: Stop when this number of devices is found.
+        Default None
+    :param expected_ids: Stop when the devices with these IDs are found.
+        Default None
     """
-    devices = []
-    # Using Queue as a timeout timer
-    add_devices_queue = Queue()
+    found_devices = Queue()
+    expected_ids = set(expected_ids) if expected_ids is not None else None
+    device_ids = set()
 
     def add_device_function(name, host, port):
         """Add device callback."""
         _LOGGER.info("%s discovered (host: %s, port: %i)", name, host, port)
-        devices.append(soundtouch_device(host, port))
+        try:
+            found_devices.put(soundtouch_device(host, port))
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.warning("%s (%s) not reachable: %s", name, host,
+                            exception)
+
+    def completed():
+        """Return True if all the expected devices are found."""
+        if expected_count is not None and len(device_ids) >= expected_count:
+            return True
+        return expected_ids is not None and expected_ids <= device_ids
 
     zeroconf = Zeroconf()
     listener = SoundtouchDeviceListener(add_device_function)
-    _LOGGER.debug("Starting discovery...")
-    ServiceBrowser(zeroconf, "_soundtouch._tcp.local.", listener)
     try:
-        add_devices_queue.get(timeout=timeout)
-    except Empty:
+        _LOGGER.debug("Starting discovery...")
+        ServiceBrowser(zeroconf, "_soundtouch._tcp.local.", listener)
+        deadline = time.time() + timeout
+        while not completed():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                device = found_devices.get(timeout=remaining)
+            except Empty:
+                break
+            if device.config.device_id in device_ids:
+                continue
+            device_ids.add(device.config.device_id)
+            yield device
         _LOGGER.debug("End of discovery...")
+    finally:
+        zeroconf.close()
+        listener.close()
+
+
+def discover_devices(timeout=5, expected_count=None, expected_ids=None,
+                     callback=None):
+    """Discover devices on the local network.
+
+    :param timeout: Max time to wait in seconds. Default 5
+    :param expected_count: Return as soon as this number of devices is
+        found. Default None (wait for the timeout)
+    :param expected_ids: Return as soon as the devices with these IDs are
+        found. Default None (wait for the timeout)
+    :param callback: Function called with each device as soon as it is
+        found. Default None
+    """
+    devices = []
+    for device in iter_devices(timeout, expected_count, expected_ids):
+        if callback is not None:
+            callback(device)
+        devices.append(device)
     return devices
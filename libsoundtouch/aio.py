@@ -0,0 +1,402 @@
+"""Asyncio Bose Soundtouch Device.
+
+Requires Python 3.5+ and aiohttp (``pip install libsoundtouch[aio]``).
+"""
+
+# pylint: disable=too-many-public-methods
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .device import BaseSoundTouchDevice, NoExistingZoneException, \
+    STATE_STANDBY, DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT, _parse_config, \
+    _parse_status, _parse_volume, _parse_presets, _parse_zone_status, \
+    _key_request_bodies, _volume_request_body, _play_media_request_body
+from .utils import Key, Type
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_soundtouch_device(host, port=8090, ws_port=8080,
+                                  session=None, **kwargs):
+    """Create a new asyncio Soundtouch device.
+
+    :param host: Host of the device
+    :param port: Port of the device. Default 8090
+    :param ws_port: Web socket port. Default 8080
+    :param session: aiohttp ClientSession used for all HTTP calls
+    :param kwargs: Other AsyncSoundTouchDevice arguments (metrics, ...)
+    """
+    return await AsyncSoundTouchDevice.create(host, port, ws_port, session,
+                                              **kwargs)
+
+
+class AsyncSoundTouchDevice(BaseSoundTouchDevice):
+    """Bose SoundTouch Device using asyncio.
+
+    Mirror the :class:`libsoundtouch.device.SoundTouchDevice` API with
+    coroutines. Use :meth:`create` (or :func:`async_soundtouch_device`) to
+    get a device with its configuration loaded.
+    """
+
+    def __init__(self, host, port=8090, ws_port=8080, session=None,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, cache_max_age=None,
+                 dispatcher=None, config=None, metrics=None):
+        """Create a new asyncio Soundtouch device.
+
+        The configuration is not loaded: call :meth:`refresh_config` or use
+        :meth:`create`.
+
+        :param host: Host of the device
+        :param port: Port of the device. Default 8090
+        :param ws_port: Web socket port. Default 8080
+        :param session: aiohttp ClientSession used for all HTTP calls.
+            Default a new keep-alive session owned by the device
+        :param pool_size: Max number of keep-alive connections to the device
+            when the session is created by the device. Default 4
+        :param idle_timeout: Keep-alive timeout (seconds) of pooled
+            connections when the session is created by the device. Default 30
+        :param cache_max_age: Enable the notification cache (see
+            :class:`libsoundtouch.device.SoundTouchDevice`). Default None
+        :param dispatcher: ListenerDispatcher calling the listeners on
+            worker threads instead of the event loop. Default None
+        :param config: Config of the device, for instance saved from a
+            previous run. Default None
+        :param metrics: DeviceMetrics recording the requests and the
+            notifications. Default None
+
+        """
+        BaseSoundTouchDevice.__init__(self, host, port, ws_port,
+                                      cache_max_age, dispatcher, metrics)
+        self._session = session
+        self._owns_session = session is None
+        self._pool_size = pool_size
+        self._idle_timeout = idle_timeout
+        self._ws_task = None
+        self._config = config
+
+    @classmethod
+    async def create(cls, host, port=8090, ws_port=8080, session=None,
+                     **kwargs):
+        """Create a new asyncio Soundtouch device and load its config.
+
+        The config is not loaded when given with the ``config`` argument.
+
+        :param host: Host of the device
+        :param port: Port of the device. Default 8090
+        :param ws_port: Web socket port. Default 8080
+        :param session: aiohttp ClientSession used for all HTTP calls
+        """
+        device = cls(host, port, ws_port, session, **kwargs)
+        if device.config is None:
+            await device.refresh_config()
+        return device
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self._pool_size,
+                keepalive_timeout=self._idle_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _get(self, action):
+        return await self._request('GET', action)
+
+    async def _post(self, action, body):
+        return await self._request('POST', action, body)
+
+    async def _request(self, method, action, body=None):
+        start = time.perf_counter()
+        try:
+            async with self._get_session().request(
+                    method, "http://" + self._host + ":" + str(self._port) +
+                    action, data=body) as response:
+                content = await response.read()
+        except Exception as exception:
+            if self._metrics is not None:
+                self._record_request(method, action, start,
+                                     exception=exception)
+            raise
+        if self._metrics is not None:
+            self._record_request(method, action, start, content,
+                                 response.status)
+        return content
+
+    async def close(self):
+        """Stop notifications and close the owned HTTP session."""
+        try:
+            await self.stop_notification()
+        finally:
+            if self._owns_session and self._session is not None:
+                await self._session.close()
+                self._session = None
+
+    async def _on_message(self, message):
+        """Call when web socket is received."""
+        self._record_frame(message)
+        if self._on_known_message(message):
+            return
+        action_node = self._parse_notification(message)
+        if action_node is None or self._on_update(action_node, message):
+            return
+        action = action_node.tag
+        if action == "zoneUpdated":
+            await self.refresh_zone_status()
+            self._run_listener(self._zone_status_updated_listeners,
+                               self._zone_status)
+        if action == "infoUpdated":
+            await self.refresh_config()
+            self._run_listener(self._device_info_updated_listeners,
+                               self._config)
+
+    async def _listen(self):
+        try:
+            async with self._get_session().ws_connect(
+                    "ws://{0}:{1}/".format(self._host, self._ws_port),
+                    protocols=('gabbo',)) as web_socket:
+                self._on_open()
+                try:
+                    async for msg in web_socket:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            await self._on_message(msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            _LOGGER.warning("Websocket error on %s: %s",
+                                            self._host,
+                                            web_socket.exception())
+                            break
+                finally:
+                    self._on_close()
+        except (aiohttp.ClientError, OSError) as exception:
+            _LOGGER.warning("Websocket of %s stopped: %s", self._host,
+                            exception)
+
+    async def start_notification(self):
+        """Start Websocket connection in a new task."""
+        if self._ws_task is None or self._ws_task.done():
+            self._ws_task = asyncio.ensure_future(self._listen())
+
+    async def stop_notification(self):
+        """Stop Websocket connection."""
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+            try:
+                await self._ws_task
+            except asyncio.CancelledError:
+                pass
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Websocket of %s failed", self._host)
+            self._ws_task = None
+
+    async def refresh_config(self):
+        """Refresh device configuration."""
+        self._config = self._parse_response("/info", _parse_config,
+                                            await self._get("/info"))
+
+    async def refresh_status(self):
+        """Refresh status state."""
+        self._status = self._parse_response(
+            "/now_playing", _parse_status, await self._get("/now_playing"))
+        self._set_updated('status')
+
+    async def refresh_volume(self):
+        """Refresh volume state."""
+        self._volume = self._parse_response("/volume", _parse_volume,
+                                            await self._get("/volume"))
+        self._set_updated('volume')
+
+    async def refresh_presets(self):
+        """Refresh presets."""
+        self._presets = self._parse_response("/presets", _parse_presets,
+                                             await self._get("/presets"))
+        self._set_updated('presets')
+
+    async def refresh_zone_status(self):
+        """Refresh Zone Status."""
+        self._zone_status = self._parse_response(
+            "/getZone", _parse_zone_status, await self._get("/getZone"))
+        self._set_updated('zone_status')
+
+    async def select_preset(self, preset):
+        """Play selected preset.
+
+        :param preset Selected preset.
+        """
+        await self._post('/select', preset.source_xml)
+
+    async def create_zone(self, slaves):
+        """Create a zone (multi-room) on a master and play on specified slaves.
+
+        :param slaves: List of slaves. Can not be empty
+
+        """
+        request_body = self._create_zone(slaves)
+        _LOGGER.info("Creating multi-room zone with master device %s",
+                     self.config.name)
+        await self._post("/setZone", request_body)
+
+    async def add_zone_slave(self, slaves):
+        """
+        Add slave(s) to and existing zone (multi-room).
+
+        Zone must already exist and slaves array can not be empty.
+
+        :param slaves: List of slaves. Can not be empty
+        """
+        if await self.zone_status() is None:
+            raise NoExistingZoneException()
+        request_body = self._get_zone_request_body(slaves)
+        _LOGGER.info("Adding slaves to multi-room zone with master device %s",
+                     self.config.name)
+        await self._post("/addZoneSlave", request_body)
+
+    async def remove_zone_slave(self, slaves):
+        """
+        Remove slave(s) from and existing zone (multi-room).
+
+        Zone must already exist and slaves list can not be empty.
+
+        :param slaves: List of slaves to remove
+
+        """
+        if await self.zone_status() is None:
+            raise NoExistingZoneException()
+        request_body = self._get_zone_request_body(slaves)
+        _LOGGER.info("Removing slaves from multi-room zone with master " +
+                     "device %s", self.config.name)
+        await self._post("/removeZoneSlave", request_body)
+
+    async def _send_key(self, key):
+        action = '/key'
+        press, release = _key_request_bodies(key)
+        await self._post(action, press)
+        await self._post(action, release)
+
+    async def play_media(self, source, location, source_acc=None,
+                         media_type=Type.URI):
+        """
+        Start music playback from a chosen source.
+
+        :param source: Source from which to play. Elements of Source enum.
+        :param location: A unique uri or identifier. Represents the
+            requested music from the source.
+        :param source_acc: Source account. Imperative for some sources.
+        :param media_type: Type of the requested music. Typical values are:
+            "uri", "track", "album", "playlist".
+        """
+        await self._post("/select", _play_media_request_body(
+            source, location, source_acc, media_type))
+
+    async def status(self, refresh=True):
+        """Get status object.
+
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
+        """
+        if not self._is_cached('status') and (self._status is None or refresh):
+            await self.refresh_status()
+        return self._status
+
+    async def volume(self, refresh=True):
+        """Get volume object.
+
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
+        """
+        if not self._is_cached('volume') and (self._volume is None or refresh):
+            await self.refresh_volume()
+        return self._volume
+
+    async def zone_status(self, refresh=True):
+        """Get Zone Status.
+
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
+        """
+        if not self._is_cached('zone_status') and \
+                (self._zone_status is None or refresh):
+            await self.refresh_zone_status()
+        return self._zone_status
+
+    async def presets(self, refresh=True):
+        """Presets.
+
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
+        """
+        if not self._is_cached('presets') and \
+                (self._presets is None or refresh):
+            await self.refresh_presets()
+        return self._presets
+
+    async def set_volume(self, level):
+        """Set volume level: from 0 to 100."""
+        await self._post('/volume', _volume_request_body(level))
+
+    async def mute(self):
+        """Mute/Un-mute volume."""
+        await self._send_key(Key.MUTE.value)
+
+    async def volume_up(self):
+        """Volume up."""
+        await self._send_key(Key.VOLUME_UP.value)
+
+    async def volume_down(self):
+        """Volume down."""
+        await self._send_key(Key.VOLUME_DOWN.value)
+
+    async def next_track(self):
+        """Switch to next track."""
+        await self._send_key(Key.NEXT_TRACK.value)
+
+    async def previous_track(self):
+        """Switch to previous track."""
+        await self._send_key(Key.PREV_TRACK.value)
+
+    async def pause(self):
+        """Pause."""
+        await self._send_key(Key.PAUSE.value)
+
+    async def play(self):
+        """Play."""
+        await self._send_key(Key.PLAY.value)
+
+    async def play_pause(self):
+        """Toggle play status."""
+        await self._send_key(Key.PLAY_PAUSE.value)
+
+    async def repeat_off(self):
+        """Turn off repeat."""
+        await self._send_key(Key.REPEAT_OFF.value)
+
+    async def repeat_one(self):
+        """Repeat one. Doesn't work."""
+        await self._send_key(Key.REPEAT_ONE.value)
+
+    async def repeat_all(self):
+        """Repeat all."""
+        await self._send_key(Key.REPEAT_ALL.value)
+
+    async def shuffle(self, shuffle):
+        """Shuffle on/off.
+
+        :param shuffle: Boolean on/off
+        """
+        if shuffle:
+            await self._send_key(Key.SHUFFLE_ON.value)
+        else:
+            await self._send_key(Key.SHUFFLE_OFF.value)
+
+    async def power_on(self):
+        """Power on device."""
+        if (await self.status()).source == STATE_STANDBY:
+            await self._send_key(Key.POWER.value)
+
+    async def power_off(self):
+        """Power off device."""
+        if (await self.status()).source != STATE_STANDBY:
+            await self._send_key(Key.POWER.value)
@@ -4,52 +4,349 @@
 # pylint: disable=useless-super-delegation,too-many-lines
 
 import logging
-from threading import Thread
-from xml.dom import minidom
+import re
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+
+try:
+    from time import perf_counter as _clock
+except ImportError:
+    from time import time as _clock
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree  # type: ignore
 
 import requests
 import websocket
+from requests.adapters import HTTPAdapter
 
 from .utils import Key, Type
 
 STATE_STANDBY = 'STANDBY'
 
+# Max number of keep-alive connections kept open to a device
+DEFAULT_POOL_SIZE = 4
+# Idle delay (seconds) after which pooled connections are considered stale
+DEFAULT_IDLE_TIMEOUT = 30
+
+# First update of a websocket message, found without parsing it
+_UPDATE_ACTION = re.compile(
+    r'\s*(?:<\?xml[^>]*\?>\s*)?<updates[^>]*>\s*<([A-Za-z]+)')
+
 _LOGGER = logging.getLogger(__name__)
 
+# Update notifications carrying a model: attribute, resource and listeners
+_MODEL_UPDATES = {
+    'volumeUpdated': ('_volume', 'volume', '_volume_updated_listeners'),
+    'nowPlayingUpdated': ('_status', 'status', '_status_updated_listeners'),
+    'presetsUpdated': ('_presets', 'presets', '_presets_updated_listeners'),
+}
 
-def _get_dom_attribute(xml_dom, attribute, default_value=None):
-    if attribute in xml_dom.attributes.keys():
-        return xml_dom.attributes[attribute].value
-    return default_value
+# No value parsed from an identical payload
+_UNKNOWN = object()
+
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern  # noqa: F821 pylint: disable=undefined-variable
 
 
-def _get_dom_element_attribute(xml_dom, element, attribute,
-                               default_value=None):
-    element = _get_dom_element(xml_dom, element)
-    if element is not None:
-        if attribute in element.attributes.keys():
-            return element.attributes[attribute].value
+def _interned(value):
+    """Return the shared copy of a low-cardinality string.
+
+    Sources ('SPOTIFY', ...), play statuses, types and device IDs repeat in
+    every parsed model: a history of models keeps one copy of each.
+    """
+    if value is None:
         return None
-    else:
-        return default_value
+    try:
+        return _intern(value)
+    except TypeError:
+        # Python 2 only interns byte strings
+        return value
+
+
+def _element_value(element, default_value=None):
+    if element is not None and element.text is not None:
+        return element.text.strip()
+    return default_value
 
 
-def _get_dom_elements(xml_dom, element):
-    return xml_dom.getElementsByTagName(element)
+def _element_xml(element):
+    """Serialize an element without its trailing text."""
+    tail = element.tail
+    element.tail = None
+    try:
+        return ElementTree.tostring(element, encoding='utf-8').decode('utf-8')
+    finally:
+        element.tail = tail
 
 
-def _get_dom_element(xml_dom, element):
-    elements = _get_dom_elements(xml_dom, element)
-    if elements:
-        return elements[0]
+def _presets_from_element(presets_element):
+    return [Preset(preset) for preset in presets_element
+            if preset.tag == "preset"]
+
+
+def _zone_status_from_element(zone_element):
+    for member in zone_element:
+        if member.tag == "member":
+            return ZoneStatus(zone_element)
     return None
 
 
-def _get_dom_element_value(xml_dom, element, default_value=None):
-    element = _get_dom_element(xml_dom, element)
-    if element is not None and element.firstChild is not None:
-        return element.firstChild.nodeValue.strip()
-    return default_value
+def _message_action(message):
+    """Return the update type of a websocket message, None if unknown."""
+    match = _UPDATE_ACTION.match(message)
+    return match.group(1) if match else None
+
+
+def _is_complete_info(info_element):
+    """Return True if the info element holds a full configuration."""
+    return info_element is not None and \
+        info_element.get("deviceID") is not None and \
+        info_element.find("name") is not None and \
+        info_element.find("networkInfo") is not None
+
+
+def _parse_config(payload):
+    return Config(ElementTree.fromstring(payload))
+
+
+def _parse_status(payload):
+    return Status(ElementTree.fromstring(payload))
+
+
+def _parse_volume(payload):
+    return Volume(ElementTree.fromstring(payload))
+
+
+def _parse_presets(payload):
+    return _presets_from_element(ElementTree.fromstring(payload))
+
+
+def _parse_zone_status(payload):
+    return _zone_status_from_element(ElementTree.fromstring(payload))
+
+
+def _build_key_request_bodies(key):
+    return ('<key state="press" sender="Gabbo">%s</key>' % key,
+            '<key state="release" sender="Gabbo">%s</key>' % key)
+
+
+# Press and release request bodies of the known keys, built once
+_KEY_REQUEST_BODIES = dict((key.value, _build_key_request_bodies(key.value))
+                           for key in Key)
+
+
+def _key_request_bodies(key):
+    bodies = _KEY_REQUEST_BODIES.get(key)
+    return bodies if bodies is not None else _build_key_request_bodies(key)
+
+
+def _volume_request_body(level):
+    return '<volume>%s</volume>' % level
+
+
+def _play_media_request_body(source, location, source_acc, media_type):
+    return '<ContentItem source="%s" type="%s" sourceAccount="%s" ' \
+           'location="%s"><itemName>Select using API</itemName>' \
+           '</ContentItem>' % (source.value, media_type.value,
+                               source_acc if source_acc else '', location)
+
+
+def _create_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    return session
+
+
+def _remove_listener(listeners, listener):
+    """Remove a registration of listener.
+
+    A plain registration is removed before a changes only one.
+    """
+    for plain in (True, False):
+        for index, registered in enumerate(listeners):
+            if not plain:
+                registered = getattr(registered, '_listener', None)
+            if registered is not None and registered == listener:
+                del listeners[index]
+                return
+
+
+def _changes(previous, value):
+    """Return the changes between two values sent to a listener.
+
+    :return: dict field name (preset id for presets) -> (previous value,
+        value)
+    """
+    if isinstance(value, list) or isinstance(previous, list):
+        previous = dict((preset.preset_id, preset)
+                        for preset in previous or [])
+        value = dict((preset.preset_id, preset) for preset in value or [])
+        return dict((preset_id, (previous.get(preset_id),
+                                 value.get(preset_id)))
+                    for preset_id in set(previous) | set(value)
+                    if previous.get(preset_id) != value.get(preset_id))
+    if value is not None:
+        return value.diff(previous)
+    if previous is not None:
+        return dict((field, (old, None))
+                    for field, (_, old) in previous.diff(None).items())
+    return {}
+
+
+class _LatestValueWriter:
+    """Write values with at most one request in flight, last write wins.
+
+    Values submitted while a write is in flight replace each other: only
+    the latest one is written next. The caller finding no write in flight
+    writes its value itself, the following values are written by a worker
+    thread.
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._condition = Condition()
+        self._executor = None
+        self._pending = None
+        self._has_pending = False
+        # Sequence number of the last submitted value
+        self._submitted = 0
+        # [sequence, done, error] of the waiting callers
+        self._waiters = []
+        self._writing = False
+
+    def submit(self, value, wait=True):
+        """Write value, or let a newer value replace it.
+
+        :param wait: Return once value, or a newer one, is written. Raise
+            the error of that write if it failed
+        """
+        with self._condition:
+            self._submitted += 1
+            waiter = [self._submitted, False, None]
+            if wait:
+                self._waiters.append(waiter)
+            self._pending = value
+            self._has_pending = True
+            leader = not self._writing
+            self._writing = True
+        if leader:
+            if wait:
+                self._drain(waiter)
+            else:
+                self._get_executor().submit(self._drain)
+        if wait:
+            with self._condition:
+                while not waiter[1]:
+                    self._condition.wait()
+            if waiter[2] is not None:
+                raise waiter[2]
+
+    def _get_executor(self):
+        with self._condition:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            return self._executor
+
+    def _drain(self, until=None):
+        """Write the pending values until none is left.
+
+        :param until: Hand the next values over to the worker once the value
+            of this waiter is written. Default None (write them all)
+        """
+        while True:
+            with self._condition:
+                if not self._has_pending:
+                    self._writing = False
+                    return
+                if until is not None and until[1]:
+                    break
+                value, sequence = self._pending, self._submitted
+                self._pending = None
+                self._has_pending = False
+            error = None
+            try:
+                self._write(value)
+            except Exception as exception:  # pylint: disable=broad-except
+                error = exception
+                _LOGGER.warning("Write of %s failed: %s", value, exception)
+            with self._condition:
+                # The callers waiting for this value or an older one are done
+                waiters = []
+                for waiter in self._waiters:
+                    if waiter[0] <= sequence:
+                        waiter[1] = True
+                        waiter[2] = error
+                    else:
+                        waiters.append(waiter)
+                self._waiters = waiters
+                self._condition.notify_all()
+        self._get_executor().submit(self._drain)
+
+    def close(self):
+        """Wait for the pending values to be written."""
+        with self._condition:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class _SingleFlight:
+    """Share an in-flight call with the identical concurrent calls."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Call function, or wait for the running call with the same key.
+
+        :return: The result of the call, shared by the concurrent callers
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = function()
+        except BaseException as exception:
+            # Also KeyboardInterrupt: the waiting callers must not hang
+            future.set_exception(exception)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _ChangeListener:
+    """Listener only called when the value changes.
+
+    Called with the new value and its changes (see :func:`_changes`).
+    """
+
+    def __init__(self, listener, value):
+        self._listener = listener
+        self._value = value
+
+    def __call__(self, value):
+        changes = _changes(self._value, value)
+        self._value = value
+        if changes:
+            self._listener(value, changes)
 
 
 class WebSocketThread(Thread):
@@ -65,96 +362,289 @@ class WebSocketThread(Thread):
         self._ws.run_forever()
 
 
-class SoundTouchDevice:
-    """Bose SoundTouch Device."""
+class BaseSoundTouchDevice:
+    """Bose SoundTouch Device state, independent of the transport.
 
-    @staticmethod
-    def __run_listener(listeners, value):
-        """Run Listener with value."""
-        for listener in listeners:
-            listener(value)
+    Hold the cached models, the listeners and the request bodies shared by
+    the blocking :class:`SoundTouchDevice` and the asyncio client.
+    """
 
-    def _on_message(self, web_socket, message):
-        # pylint: disable=unused-argument
-        """Call when web socket is received."""
-        dom = minidom.parseString(message.encode('utf-8'))
-        if dom.firstChild.nodeName == "updates":
-            action_node = dom.firstChild.firstChild
-            action = action_node.nodeName
-            if action == "volumeUpdated":
-                self._volume = Volume(action_node.firstChild)
-                self.__run_listener(self._volume_updated_listeners,
-                                    self._volume)
-            if action == "nowPlayingUpdated":
-                self._status = Status(action_node.firstChild)
-                self.__run_listener(self._status_updated_listeners,
-                                    self._status)
-            if action == "presetsUpdated" and action_node.hasChildNodes():
-                self._presets = []
-                for preset in _get_dom_elements(dom, "preset"):
-                    self._presets.append(Preset(preset))
-                self.__run_listener(self._presets_updated_listeners,
-                                    self._presets)
-            if action == "zoneUpdated":
-                self.__run_listener(self._zone_status_updated_listeners,
-                                    self.zone_status(True))
-            if action == "infoUpdated":
-                self.__init_config()
-                self.__run_listener(self._device_info_updated_listeners,
-                                    self._config)
-
-    def __init__(self, host, port=8090, ws_port=8080):
-        """Create a new Soundtouch device.
+    def __init__(self, host, port=8090, ws_port=8080, cache_max_age=None,
+                 dispatcher=None, metrics=None):
+        """Create a new Soundtouch device state.
 
         :param host: Host of the device
         :param port: Port of the device. Default 8090
         :param ws_port: Web socket port. Default 8080
+        :param cache_max_age: Enable the notification cache: while the
+            notification websocket is connected, status(), volume(),
+            zone_status() and presets() return the values kept up to date by
+            the notifications when they are younger than this delay
+            (seconds), without HTTP request. Default None (disabled)
+        :param dispatcher: ListenerDispatcher calling the listeners on
+            worker threads. Default None (listeners called on the
+            notification thread)
+        :param metrics: DeviceMetrics recording the requests and the
+            notifications. Default None
 
         """
         self._host = host
         self._port = port
         self._ws_port = ws_port
-        self.__init_config()
+        self._cache_max_age = cache_max_age
+        self._dispatcher = dispatcher
+        self._metrics = metrics
+        self._updated_at = {}
+        self._ws_connected_at = None
+        self._config = None
         self._status = None
         self._volume = None
         self._zone_status = None
         self._presets = None
-        self._ws_client = None
         self._volume_updated_listeners = []
         self._status_updated_listeners = []
         self._presets_updated_listeners = []
         self._zone_status_updated_listeners = []
         self._device_info_updated_listeners = []
+        # Last payload of each resource and its parsed value
+        self._payloads = {}
+        self._payload_hits = 0
+        self._payload_misses = 0
 
-    def __init_config(self):
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/info")
-        dom = minidom.parseString(response.text)
-        self._config = Config(dom)
+    def _run_listener(self, listeners, value):
+        """Run Listener with value."""
+        for listener in listeners:
+            if self._dispatcher is not None:
+                # One queue per registration: the same function can listen
+                # to several events
+                self._dispatcher.dispatch(self, listener, value,
+                                          (id(listeners), id(listener)))
+            else:
+                listener(value)
+
+    def _set_updated(self, resource):
+        """Record that the resource value has just been refreshed."""
+        self._updated_at[resource] = time.time()
+
+    def _is_cached(self, resource):
+        """Return True if the resource value is kept fresh by notifications.
+
+        The value must have been refreshed while the websocket is connected
+        and less than cache_max_age seconds ago.
+        """
+        if self._cache_max_age is None or self._ws_connected_at is None:
+            return False
+        updated_at = self._updated_at.get(resource)
+        return updated_at is not None and \
+            updated_at >= self._ws_connected_at and \
+            time.time() - updated_at <= self._cache_max_age
+
+    def _on_open(self, *args):
+        # pylint: disable=unused-argument
+        """Call when the web socket is connected."""
+        _LOGGER.debug("Notifications connected on %s", self._host)
+        self._ws_connected_at = time.time()
 
-    def start_notification(self):
-        """Start Websocket connection."""
-        self._ws_client = websocket.WebSocketApp(
-            "ws://{0}:{1}/".format(self._host, self._ws_port),
-            on_message=self._on_message,
-            subprotocols=['gabbo'])
-        ws_thread = WebSocketThread(self._ws_client)
-        ws_thread.start()
+    def _on_close(self, *args):
+        # pylint: disable=unused-argument
+        """Call when the web socket is disconnected or failed."""
+        _LOGGER.debug("Notifications disconnected on %s", self._host)
+        self._ws_connected_at = None
 
-    def add_volume_listener(self, listener):
-        """Add a new volume updated listener."""
+    @property
+    def notification_connected(self):
+        """Return True if the notification websocket is connected."""
+        return self._ws_connected_at is not None
+
+    @staticmethod
+    def _parse_message(message):
+        """Parse a websocket message.
+
+        :return: Update element (None if the message is not an update)
+        """
+        root = ElementTree.fromstring(message.encode('utf-8'))
+        if root.tag == "updates" and len(root):
+            return root[0]
+        return None
+
+    def _record_frame(self, message):
+        """Record a received websocket message in the metrics."""
+        if self._metrics is not None:
+            self._metrics.record_frame(_message_action(message),
+                                       len(message))
+
+    def _parse_notification(self, message):
+        """Parse a websocket message, timed by the metrics."""
+        if self._metrics is None:
+            return self._parse_message(message)
+        start = _clock()
+        action_node = self._parse_message(message)
+        self._metrics.record_frame_parse(_clock() - start)
+        return action_node
+
+    def _reused(self, key, payload):
+        """Return the value parsed from the same payload last time.
+
+        :return: _UNKNOWN if the last payload of key was different
+        """
+        last = self._payloads.get(key)
+        if last is not None and last[0] == payload:
+            self._payload_hits += 1
+            # Presets are kept as a tuple: each caller gets its own list
+            if isinstance(last[1], tuple):
+                return list(last[1])
+            return last[1]
+        self._payload_misses += 1
+        return _UNKNOWN
+
+    def _keep_payload(self, key, payload, value):
+        """Keep the value parsed from a payload, to be reused."""
+        if isinstance(value, list):
+            value = tuple(value)
+        self._payloads[key] = (payload, value)
+
+    @property
+    def payload_cache_info(self):
+        """Return the counts of reused and parsed payloads.
+
+        Responses and notifications identical to the previous ones of the
+        same resource (paused or standby devices, ...) are not parsed again:
+        their previous value is reused.
+        """
+        return {'hits': self._payload_hits, 'misses': self._payload_misses}
+
+    def _parse_response(self, action, parser, payload):
+        """Parse the response of a GET request, timed by the metrics."""
+        value = self._reused(action, payload)
+        if value is not _UNKNOWN:
+            return value
+        if self._metrics is None:
+            value = parser(payload)
+        else:
+            start = _clock()
+            value = parser(payload)
+            self._metrics.record_parse(action, _clock() - start)
+        self._keep_payload(action, payload, value)
+        return value
+
+    def _on_known_message(self, message):
+        """Apply a message identical to the previous one of its type.
+
+        :return: False if the message must be parsed
+        """
+        action = _message_action(message)
+        if action not in _MODEL_UPDATES:
+            return False
+        value = self._reused(action, message)
+        if value is _UNKNOWN:
+            return False
+        self._set_model(action, value)
+        return True
+
+    def _set_model(self, action, value, message=None):
+        """Set the model of an update notification and run the listeners.
+
+        :param message: Message of the model, kept to be reused
+        """
+        attribute, resource, listeners = _MODEL_UPDATES[action]
+        if message is not None:
+            self._keep_payload(action, message, value)
+        setattr(self, attribute, value)
+        self._set_updated(resource)
+        self._run_listener(getattr(self, listeners), value)
+
+    def _record_request(self, method, action, start, content=None,
+                        status=None, exception=None):
+        """Record a finished HTTP request in the metrics."""
+        error = None
+        if exception is not None:
+            error = type(exception).__name__
+        elif status is not None and status >= 400:
+            error = 'HTTP %d' % status
+        self._metrics.record_request(
+            method, action, _clock() - start,
+            len(content) if content is not None else None, error)
+
+    def _on_update(self, action_node, message=None):
+        """Apply an update notification carrying its own payload.
+
+        :param message: Websocket message of the notification, kept to reuse
+            the parsed model when the same message is received again
+        :return: False if the notification payload is missing or incomplete
+            and the value must be fetched with an HTTP request
+        """
+        action = action_node.tag
+        if action == "volumeUpdated":
+            self._set_model(action, Volume(action_node[0]), message)
+        elif action == "nowPlayingUpdated":
+            self._set_model(action, Status(action_node[0]), message)
+        elif action == "presetsUpdated" and len(action_node):
+            self._set_model(action, _presets_from_element(action_node[0]),
+                            message)
+        elif action == "zoneUpdated":
+            zone = action_node.find("zone")
+            if zone is None:
+                return False
+            self._zone_status = _zone_status_from_element(zone)
+            self._set_updated('zone_status')
+            self._run_listener(self._zone_status_updated_listeners,
+                               self._zone_status)
+        elif action == "infoUpdated":
+            info = action_node.find("info")
+            if not _is_complete_info(info):
+                return False
+            self._config = Config(info)
+            self._run_listener(self._device_info_updated_listeners,
+                               self._config)
+        return True
+
+    def add_volume_listener(self, listener, changes_only=False):
+        """Add a new volume updated listener.
+
+        :param listener: Function called with the new volume
+        :param changes_only: Only call the listener when the volume changes,
+            with the changes as second argument: dict field name ->
+            (previous value, new value). Default False
+        """
+        if changes_only:
+            listener = _ChangeListener(listener, self._volume)
         self._volume_updated_listeners.append(listener)
 
-    def add_status_listener(self, listener):
-        """Add a new status updated listener."""
+    def add_status_listener(self, listener, changes_only=False):
+        """Add a new status updated listener.
+
+        :param listener: Function called with the new status
+        :param changes_only: Only call the listener when the status changes,
+            with the changes as second argument: dict field name ->
+            (previous value, new value). Default False
+        """
+        if changes_only:
+            listener = _ChangeListener(listener, self._status)
         self._status_updated_listeners.append(listener)
 
-    def add_presets_listener(self, listener):
-        """Add a new presets updated listener."""
+    def add_presets_listener(self, listener, changes_only=False):
+        """Add a new presets updated listener.
+
+        :param listener: Function called with the new presets
+        :param changes_only: Only call the listener when the presets
+            change, with the changes as second argument: dict preset id ->
+            (previous preset, new preset), None when added or removed.
+            Default False
+        """
+        if changes_only:
+            listener = _ChangeListener(listener, self._presets)
         self._presets_updated_listeners.append(listener)
 
-    def add_zone_status_listener(self, listener):
-        """Add a new zone status updated listener."""
+    def add_zone_status_listener(self, listener, changes_only=False):
+        """Add a new zone status updated listener.
+
+        :param listener: Function called with the new zone status
+        :param changes_only: Only call the listener when the zone status
+            changes, with the changes as second argument: dict field name ->
+            (previous value, new value). Default False
+        """
+        if changes_only:
+            listener = _ChangeListener(listener, self._zone_status)
         self._zone_status_updated_listeners.append(listener)
 
     def add_device_info_listener(self, listener):
@@ -163,28 +653,23 @@ class SoundTouchDevice:
 
     def remove_volume_listener(self, listener):
         """Remove a new volume updated listener."""
-        if listener in self._volume_updated_listeners:
-            self._volume_updated_listeners.remove(listener)
+        _remove_listener(self._volume_updated_listeners, listener)
 
     def remove_status_listener(self, listener):
         """Remove a new status updated listener."""
-        if listener in self._status_updated_listeners:
-            self._status_updated_listeners.remove(listener)
+        _remove_listener(self._status_updated_listeners, listener)
 
     def remove_presets_listener(self, listener):
         """Remove a new presets updated listener."""
-        if listener in self._presets_updated_listeners:
-            self._presets_updated_listeners.remove(listener)
+        _remove_listener(self._presets_updated_listeners, listener)
 
     def remove_zone_status_listener(self, listener):
         """Remove a new zone status updated listener."""
-        if listener in self._zone_status_updated_listeners:
-            self._zone_status_updated_listeners.remove(listener)
+        _remove_listener(self._zone_status_updated_listeners, listener)
 
     def remove_device_info_listener(self, listener):
         """Remove a new device info updated listener."""
-        if listener in self._device_info_updated_listeners:
-            self._device_info_updated_listeners.remove(listener)
+        _remove_listener(self._device_info_updated_listeners, listener)
 
     def clear_volume_listeners(self):
         """Clear volume updated listeners."""
@@ -231,48 +716,25 @@ class SoundTouchDevice:
         """Return Device Info Updated listeners."""
         return self._device_info_updated_listeners
 
-    def refresh_status(self):
-        """Refresh status state."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/now_playing")
-        response.encoding = 'UTF-8'
-        dom = minidom.parseString(response.text.encode('utf-8'))
-        self._status = Status(dom)
-
-    def refresh_volume(self):
-        """Refresh volume state."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/volume")
-        dom = minidom.parseString(response.text)
-        self._volume = Volume(dom)
-
-    def refresh_presets(self):
-        """Refresh presets."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/presets")
-        dom = minidom.parseString(response.text)
-        self._presets = []
-        for preset in _get_dom_elements(dom, "preset"):
-            self._presets.append(Preset(preset))
+    @property
+    def host(self):
+        """Host of the device."""
+        return self._host
 
-    def refresh_zone_status(self):
-        """Refresh Zone Status."""
-        response = requests.get(
-            "http://" + self._host + ":" + str(self._port) + "/getZone")
-        dom = minidom.parseString(response.text)
-        if _get_dom_elements(dom, "member"):
-            self._zone_status = ZoneStatus(dom)
-        else:
-            self._zone_status = None
+    @property
+    def port(self):
+        """Return API port of the device."""
+        return self._port
 
-    def select_preset(self, preset):
-        """Play selected preset.
+    @property
+    def ws_port(self):
+        """Return web socket port of the device."""
+        return self._ws_port
 
-        :param preset Selected preset.
-        """
-        requests.post(
-            'http://' + self._host + ":" + str(self._port) + '/select',
-            preset.source_xml)
+    @property
+    def config(self):
+        """Get config object."""
+        return self._config
 
     def _create_zone(self, slaves):
         if len(slaves) <= 0:
@@ -296,6 +758,259 @@ class SoundTouchDevice:
         request_body += '</zone>'
         return request_body
 
+
+class SoundTouchDevice(BaseSoundTouchDevice):
+    """Bose SoundTouch Device."""
+
+    def _on_message(self, web_socket, message):
+        # pylint: disable=unused-argument
+        """Call when web socket is received."""
+        self._record_frame(message)
+        if self._coalescer is not None:
+            action = _message_action(message)
+            if action is not None:
+                self._coalescer.submit(self, action, message,
+                                       self._handle_message)
+                return
+        self._handle_message(message)
+
+    def _handle_message(self, message):
+        """Apply a websocket message and run the listeners."""
+        if self._on_known_message(message):
+            return
+        action_node = self._parse_notification(message)
+        if action_node is None or self._on_update(action_node, message):
+            return
+        action = action_node.tag
+        if action == "zoneUpdated":
+            self.refresh_zone_status()
+            self._run_listener(self._zone_status_updated_listeners,
+                               self._zone_status)
+        if action == "infoUpdated":
+            self.refresh_config()
+            self._run_listener(self._device_info_updated_listeners,
+                               self._config)
+
+    def __init__(self, host, port=8090, ws_port=8080, session=None,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, timeout=None,
+                 cache_max_age=None, dispatcher=None, coalescer=None,
+                 config=None, lazy=False, metrics=None,
+                 async_key_release=False):
+        """Create a new Soundtouch device.
+
+        :param host: Host of the device
+        :param port: Port of the device. Default 8090
+        :param ws_port: Web socket port. Default 8080
+        :param session: requests Session used for all HTTP calls, for
+            instance shared by many devices. Its connections are not closed
+            by the device. Default a new keep-alive session owned by the
+            device
+        :param pool_size: Max number of keep-alive connections to the device
+            when the session is created by the device. Default 4
+        :param idle_timeout: Close pooled connections idle for more than
+            this delay (seconds) before the next request. None to keep them
+            forever. Default 30
+        :param timeout: Timeout (seconds) of HTTP requests. Default None
+            (wait forever)
+        :param cache_max_age: Enable the notification cache: while the
+            notification websocket is connected, status(), volume(),
+            zone_status() and presets() return the values kept up to date by
+            the notifications when they are younger than this delay
+            (seconds), without HTTP request. Default None (disabled)
+        :param dispatcher: ListenerDispatcher calling the listeners on
+            worker threads, so slow listeners don't delay the notifications.
+            Can be shared by many devices. Default None (listeners called on
+            the notification thread)
+        :param coalescer: EventCoalescer keeping only the latest update of
+            each type received during a short window. Default None (every
+            update handled)
+        :param config: Config of the device, for instance saved from a
+            previous run. Default None (loaded from the device)
+        :param lazy: Don't load the config in the constructor but on the
+            first access to :attr:`config`. Default False
+        :param metrics: DeviceMetrics recording per endpoint request counts,
+            latencies, response sizes, parse times and errors, and the
+            websocket frames. Can be shared by many devices. Default None
+        :param async_key_release: Key commands (play, pause, volume_up, ...)
+            return once the key press is sent, the key release is sent in
+            the background by a worker of the device. Default False (both
+            sent before returning)
+
+        """
+        BaseSoundTouchDevice.__init__(self, host, port, ws_port,
+                                      cache_max_age, dispatcher, metrics)
+        self._owns_session = session is None
+        self._session = session if session is not None else _create_session(
+            pool_size)
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._last_request = None
+        self._ws_client = None
+        self._hub = None
+        self._coalescer = coalescer
+        self._async_key_release = async_key_release
+        self._key_executor = None
+        self._key_lock = Lock()
+        self._volume_writer = _LatestValueWriter(self._write_volume)
+        self._refreshes = _SingleFlight()
+        self._config = config
+        if config is None and not lazy:
+            self.refresh_config()
+
+    @property
+    def config(self):
+        """Get config object. Loaded on first access if not known yet."""
+        if self._config is None:
+            self.refresh_config()
+        return self._config
+
+    def refresh_config(self):
+        """Refresh device configuration."""
+        self._refresh("/info", _parse_config, '_config')
+
+    def _refresh(self, action, parser, attribute, resource=None):
+        """Load a resource into attribute.
+
+        Concurrent refreshes of the same resource share one request and its
+        parsed value.
+        """
+        def load():
+            response = self._get(action)
+            setattr(self, attribute,
+                    self._parse_response(action, parser, response.content))
+            if resource is not None:
+                self._set_updated(resource)
+
+        self._refreshes.do(action, load)
+
+    def _check_idle_connections(self):
+        """Drop pooled connections the device has probably closed."""
+        now = time.time()
+        if self._idle_timeout is not None and \
+                self._last_request is not None and \
+                now - self._last_request > self._idle_timeout:
+            _LOGGER.debug("Connections to %s idle for too long, closing",
+                          self._host)
+            self._close_connections()
+        self._last_request = now
+
+    def _close_connections(self):
+        """Close the pooled connections if the session is owned."""
+        if self._owns_session:
+            self._session.close()
+
+    def _get(self, action):
+        self._check_idle_connections()
+        return self._measure('GET', action, self._session.get,
+                             "http://" + self._host + ":" +
+                             str(self._port) + action, timeout=self._timeout)
+
+    def _post(self, action, body):
+        self._check_idle_connections()
+        return self._measure('POST', action, self._session.post,
+                             "http://" + self._host + ":" +
+                             str(self._port) + action, body,
+                             timeout=self._timeout)
+
+    def _measure(self, method, action, send, *args, **kwargs):
+        """Send a request, recorded by the metrics."""
+        if self._metrics is None:
+            return send(*args, **kwargs)
+        start = _clock()
+        try:
+            response = send(*args, **kwargs)
+        except Exception as exception:
+            self._record_request(method, action, start, exception=exception)
+            raise
+        # Mocked requests may return None or incomplete responses
+        self._record_request(method, action, start,
+                             getattr(response, 'content', None),
+                             getattr(response, 'status_code', None))
+        return response
+
+    def close(self):
+        """Close keep-alive connections to the device.
+
+        Pending key releases and volume levels are sent before.
+        """
+        with self._key_lock:
+            executor, self._key_executor = self._key_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self._volume_writer.close()
+        self._close_connections()
+
+    def _set_address(self, host, port):
+        """Use the new address of the device (IP change).
+
+        The notification websocket is reconnected to the new address.
+        """
+        self._host = host
+        self._port = port
+        self._close_connections()
+        if self._hub is not None:
+            # The hub would keep a half-open socket to the old address
+            self._hub.unregister(self)
+            self._hub.register(self)
+        elif self._ws_client is not None:
+            self.stop_notification()
+            self.start_notification()
+
+    def start_notification(self, hub=None):
+        """Start Websocket connection.
+
+        :param hub: NotificationHub reading the websocket with the ones of
+            other devices. Default None (a dedicated thread for this device)
+
+        """
+        if hub is not None:
+            self._hub = hub
+            hub.register(self)
+            return
+        self._ws_client = websocket.WebSocketApp(
+            "ws://{0}:{1}/".format(self._host, self._ws_port),
+            on_message=self._on_message,
+            on_open=self._on_open,
+            on_close=self._on_close,
+            on_error=self._on_close,
+            subprotocols=['gabbo'])
+        ws_thread = WebSocketThread(self._ws_client)
+        ws_thread.start()
+
+    def stop_notification(self):
+        """Stop Websocket connection."""
+        if self._hub is not None:
+            self._hub.unregister(self)
+            self._hub = None
+        elif self._ws_client is not None:
+            self._ws_client.close()
+            self._ws_client = None
+
+    def refresh_status(self):
+        """Refresh status state."""
+        self._refresh("/now_playing", _parse_status, '_status', 'status')
+
+    def refresh_volume(self):
+        """Refresh volume state."""
+        self._refresh("/volume", _parse_volume, '_volume', 'volume')
+
+    def refresh_presets(self):
+        """Refresh presets."""
+        self._refresh("/presets", _parse_presets, '_presets', 'presets')
+
+    def refresh_zone_status(self):
+        """Refresh Zone Status."""
+        self._refresh("/getZone", _parse_zone_status, '_zone_status',
+                      'zone_status')
+
+    def select_preset(self, preset):
+        """Play selected preset.
+
+        :param preset Selected preset.
+        """
+        self._post('/select', preset.source_xml)
+
     def create_zone(self, slaves):
         """Create a zone (multi-room) on a master and play on specified slaves.
 
@@ -305,9 +1020,7 @@ class SoundTouchDevice:
         request_body = self._create_zone(slaves)
         _LOGGER.info("Creating multi-room zone with master device %s",
                      self.config.name)
-        requests.post("http://" + self.host + ":" + str(
-            self.port) + "/setZone",
-                      request_body)
+        self._post("/setZone", request_body)
 
     def add_zone_slave(self, slaves):
         """
@@ -322,10 +1035,7 @@ class SoundTouchDevice:
         request_body = self._get_zone_request_body(slaves)
         _LOGGER.info("Adding slaves to multi-room zone with master device %s",
                      self.config.name)
-        requests.post(
-            "http://" + self.host + ":" + str(
-                self.port) + "/addZoneSlave",
-            request_body)
+        self._post("/addZoneSlave", request_body)
 
     def remove_zone_slave(self, slaves):
         """
@@ -343,18 +1053,33 @@ class SoundTouchDevice:
         request_body = self._get_zone_request_body(slaves)
         _LOGGER.info("Removing slaves from multi-room zone with master " +
                      "device %s", self.config.name)
-        requests.post(
-            "http://" + self.host + ":" + str(
-                self.port) + "/removeZoneSlave", request_body)
+        self._post("/removeZoneSlave", request_body)
 
     def _send_key(self, key):
         action = '/key'
-        press = '<key state="press" sender="Gabbo">%s</key>' % key
-        release = '<key state="release" sender="Gabbo">%s</key>' % key
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, press)
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, release)
+        press, release = _key_request_bodies(key)
+        if not self._async_key_release:
+            self._post(action, press)
+            self._post(action, release)
+            return
+        # A single worker sends the presses and the releases: a key is never
+        # pressed before the release of the previous one
+        executor = self._get_key_executor()
+        executor.submit(self._post, action, press).result()
+        executor.submit(self._release_key, action, release)
+
+    def _get_key_executor(self):
+        with self._key_lock:
+            if self._key_executor is None:
+                self._key_executor = ThreadPoolExecutor(max_workers=1)
+            return self._key_executor
+
+    def _release_key(self, action, release):
+        try:
+            self._post(action, release)
+        except requests.RequestException as exception:
+            _LOGGER.warning("Key release failed on %s: %s", self._host,
+                            exception)
 
     def play_media(self, source, location, source_acc=None,
                    media_type=Type.URI):
@@ -373,71 +1098,87 @@ class SoundTouchDevice:
             device.status().content_item.type
         """
         action = "/select"
-        play = '<ContentItem source="%s" type="%s" sourceAccount="%s" ' \
-               'location="%s"><itemName>Select using API</itemName>' \
-               '</ContentItem>' % (
-                   source.value, media_type.value,
-                   source_acc if source_acc else '', location)
-        requests.post('http://' + self._host + ":" +
-                      str(self._port) + action, play)
-
-    @property
-    def host(self):
-        """Host of the device."""
-        return self._host
-
-    @property
-    def port(self):
-        """Return API port of the device."""
-        return self._port
-
-    @property
-    def config(self):
-        """Get config object."""
-        return self._config
+        play = _play_media_request_body(source, location, source_acc,
+                                        media_type)
+        self._post(action, play)
 
     def status(self, refresh=True):
         """Get status object.
 
-        :param refresh: Force refresh, else return old data.
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
         """
-        if self._status is None or refresh:
+        if not self._is_cached('status') and (self._status is None or refresh):
             self.refresh_status()
         return self._status
 
+    def estimated_position(self, max_age=None):
+        """Return the playback position (seconds), interpolated locally.
+
+        The position is estimated from the last status, kept up to date by
+        the notifications or the polls, without HTTP request: a progress bar
+        doesn't need to poll the device every second.
+
+        :param max_age: Refresh the status when it was received more than
+            this delay (seconds) ago. Default None (refreshed only when
+            unknown)
+        :return: None if the position is unknown (radio, standby, ...)
+        """
+        if self._status is None or max_age is not None and \
+                time.time() - self._updated_at.get('status', 0) > max_age:
+            self.refresh_status()
+        return self._status.estimated_position()
+
     def volume(self, refresh=True):
         """Get volume object.
 
-        :param refresh: Force refresh, else return old data.
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
         """
-        if self._volume is None or refresh:
+        if not self._is_cached('volume') and (self._volume is None or refresh):
             self.refresh_volume()
         return self._volume
 
     def zone_status(self, refresh=True):
         """Get Zone Status.
 
-        :param refresh: Force refresh, else return old data.
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
         """
-        if self._zone_status is None or refresh:
+        if not self._is_cached('zone_status') and \
+                (self._zone_status is None or refresh):
             self.refresh_zone_status()
         return self._zone_status
 
     def presets(self, refresh=True):
         """Presets.
 
-        :param refresh: Force refresh, else return old data.
+        :param refresh: Force refresh, else return old data. Not done if
+            the notification cache holds a fresh value.
         """
-        if self._presets is None or refresh:
+        if not self._is_cached('presets') and \
+                (self._presets is None or refresh):
             self.refresh_presets()
         return self._presets
 
-    def set_volume(self, level):
-        """Set volume level: from 0 to 100."""
+    def set_volume(self, level, wait=True):
+        """Set volume level: from 0 to 100.
+
+        At most one volume request is in flight: levels set meanwhile, for
+        instance by a slider, replace each other and only the latest one is
+        sent next. The last level set always reaches the device.
+
+        :param level: Volume level
+        :param wait: Return once this level, or a newer one, is set.
+            Default True. If False, return immediately: the level is set in
+            the background
+        """
+        self._volume_writer.submit(level, wait)
+
+    def _write_volume(self, level):
         action = '/volume'
-        volume = '<volume>%s</volume>' % level
-        requests.post('http://' + self._host + ":" + str(self._port) + action,
-                      volume)
+        volume = _volume_request_body(level)
+        self._post(action, volume)
 
     def mute(self):
         """Mute/Un-mute volume."""
@@ -504,31 +1245,74 @@ class SoundTouchDevice:
             self._send_key(Key.POWER.value)
 
 
-class Config:
+# Config fields stored in a dict -> info XML tag
+_CONFIG_TAGS = (('name', 'name'), ('type', 'type'),
+                ('account_uuid', 'margeAccountUUID'),
+                ('module_type', 'moduleType'), ('variant', 'variant'),
+                ('variant_mode', 'variantMode'),
+                ('country_code', 'countryCode'),
+                ('region_code', 'regionCode'))
+_NETWORK_TAGS = (('mac_address', 'macAddress'), ('ip_address', 'ipAddress'))
+_COMPONENT_TAGS = (('category', 'componentCategory'),
+                   ('software_version', 'softwareVersion'),
+                   ('serial_number', 'serialNumber'))
+
+
+def _sub_elements(parent, data, tags):
+    for key, tag in tags:
+        if data.get(key) is not None:
+            ElementTree.SubElement(parent, tag).text = data[key]
+
+
+class Config(object):
     """Soundtouch device configuration."""
 
-    def __init__(self, xml_dom):
+    __slots__ = ('_id', '_name', '_type', '_account_uuid', '_module_type',
+                 '_variant', '_variant_mode', '_country_code', '_region_code',
+                 '_networks', '_components')
+
+    def __init__(self, info_element):
         """Create a new configuration.
 
-        :param xml_dom: Configuration XML DOM
-        """
-        self._id = _get_dom_element_attribute(xml_dom, "info", "deviceID")
-        self._name = _get_dom_element_value(xml_dom, "name")
-        self._type = _get_dom_element_value(xml_dom, "type")
-        self._account_uuid = _get_dom_element_value(xml_dom,
-                                                    "margeAccountUUID")
-        self._module_type = _get_dom_element_value(xml_dom, "moduleType")
-        self._variant = _get_dom_element_value(xml_dom, "variant")
-        self._variant_mode = _get_dom_element_value(xml_dom, "variantMode")
-        self._country_code = _get_dom_element_value(xml_dom, "countryCode")
-        self._region_code = _get_dom_element_value(xml_dom, "regionCode")
-        self._networks = []
-        for network in xml_dom.getElementsByTagName("networkInfo"):
-            self._networks.append(Network(network))
-        self._components = []
-        for components in _get_dom_elements(xml_dom, "components"):
-            for component in _get_dom_elements(components, "component"):
-                self._components.append(Component(component))
+        :param info_element: Configuration (info) XML element
+        """
+        self._id = _interned(info_element.get("deviceID"))
+        self._name = None
+        self._type = None
+        self._account_uuid = None
+        self._module_type = None
+        self._variant = None
+        self._variant_mode = None
+        self._country_code = None
+        self._region_code = None
+        networks = []
+        components = []
+        for child in info_element:
+            tag = child.tag
+            if tag == "name":
+                self._name = _element_value(child)
+            elif tag == "type":
+                self._type = _interned(_element_value(child))
+            elif tag == "margeAccountUUID":
+                self._account_uuid = _element_value(child)
+            elif tag == "moduleType":
+                self._module_type = _interned(_element_value(child))
+            elif tag == "variant":
+                self._variant = _interned(_element_value(child))
+            elif tag == "variantMode":
+                self._variant_mode = _interned(_element_value(child))
+            elif tag == "countryCode":
+                self._country_code = _interned(_element_value(child))
+            elif tag == "regionCode":
+                self._region_code = _interned(_element_value(child))
+            elif tag == "networkInfo":
+                networks.append(Network(child))
+            elif tag == "components":
+                for component in child:
+                    if component.tag == "component":
+                        components.append(Component(component))
+        self._networks = tuple(networks)
+        self._components = tuple(components)
 
     @property
     def device_id(self):
@@ -547,12 +1331,12 @@ class Config:
 
     @property
     def networks(self):
-        """Network."""
+        """Networks (tuple)."""
         return self._networks
 
     @property
     def components(self):
-        """Components."""
+        """Components (tuple)."""
         return self._components
 
     @property
@@ -601,18 +1385,57 @@ class Config:
             next((network for network in self._networks), None))
         return network.mac_address if network else None
 
-
-class Network:
+    def to_dict(self):
+        """Return the configuration as a dict of JSON serializable values."""
+        data = {'device_id': self._id}
+        for key, _ in _CONFIG_TAGS:
+            data[key] = getattr(self, key)
+        data['networks'] = [
+            dict([('type', network.type)] +
+                 [(key, getattr(network, key)) for key, _ in _NETWORK_TAGS])
+            for network in self._networks]
+        data['components'] = [
+            dict((key, getattr(component, key)) for key, _ in _COMPONENT_TAGS)
+            for component in self._components]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a configuration from a dict returned by :meth:`to_dict`."""
+        info = ElementTree.Element("info")
+        if data.get('device_id') is not None:
+            info.set("deviceID", data['device_id'])
+        _sub_elements(info, data, _CONFIG_TAGS)
+        for network in data.get('networks', []):
+            network_element = ElementTree.SubElement(info, "networkInfo")
+            if network.get('type') is not None:
+                network_element.set("type", network['type'])
+            _sub_elements(network_element, network, _NETWORK_TAGS)
+        components = ElementTree.SubElement(info, "components")
+        for component in data.get('components', []):
+            _sub_elements(ElementTree.SubElement(components, "component"),
+                          component, _COMPONENT_TAGS)
+        return cls(info)
+
+
+class Network(object):
     """Soundtouch network configuration."""
 
-    def __init__(self, network_dom):
+    __slots__ = ('_type', '_mac_address', '_ip_address')
+
+    def __init__(self, network_element):
         """Create a new Network.
 
-        :param network_dom: Network configuration XML DOM
+        :param network_element: Network configuration XML element
         """
-        self._type = network_dom.attributes["type"].value
-        self._mac_address = _get_dom_element_value(network_dom, "macAddress")
-        self._ip_address = _get_dom_element_value(network_dom, "ipAddress")
+        self._type = _interned(network_element.get("type"))
+        self._mac_address = None
+        self._ip_address = None
+        for child in network_element:
+            if child.tag == "macAddress":
+                self._mac_address = _element_value(child)
+            elif child.tag == "ipAddress":
+                self._ip_address = _element_value(child)
 
     @property
     def type(self):
@@ -630,20 +1453,26 @@ class Network:
         return self._ip_address
 
 
-class Component:
+class Component(object):
     """Soundtouch component."""
 
-    def __init__(self, component_dom):
+    __slots__ = ('_category', '_software_version', '_serial_number')
+
+    def __init__(self, component_element):
         """Create a new Component.
 
-        :param component_dom: Component XML DOM
+        :param component_element: Component XML element
         """
-        self._category = _get_dom_element_value(component_dom,
-                                                "componentCategory")
-        self._software_version = _get_dom_element_value(component_dom,
-                                                        "softwareVersion")
-        self._serial_number = _get_dom_element_value(component_dom,
-                                                     "serialNumber")
+        self._category = None
+        self._software_version = None
+        self._serial_number = None
+        for child in component_element:
+            if child.tag == "componentCategory":
+                self._category = _interned(_element_value(child))
+            elif child.tag == "softwareVersion":
+                self._software_version = _interned(_element_value(child))
+            elif child.tag == "serialNumber":
+                self._serial_number = _element_value(child)
 
     @property
     def category(self):
@@ -661,42 +1490,117 @@ class Component:
         return self._serial_number
 
 
-class Status:
+class _Model(object):
+    """Value semantics of a model: equality and diff of its public fields.
+
+    Models are immutable: their fields are read-only properties, their
+    collections are tuples and their values are stored in slots, without
+    instance dict.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    def __eq__(self, other):
+        """Return True if all the fields are equal."""
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __ne__(self, other):
+        """Return True if a field differs."""
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        """Hash of the fields: models are immutable."""
+        return hash(self._values())
+
+    def diff(self, other):
+        """Return the fields which differ from another model.
+
+        :param other: Previous model of the same type, or None
+        :return: dict field name -> (other value, value)
+        """
+        changes = {}
+        for field in self._fields:
+            old = getattr(other, field) if other is not None else None
+            new = getattr(self, field)
+            if old != new:
+                changes[field] = (old, new)
+        return changes
+
+
+class Status(_Model):
     """Soundtouch device status."""
 
-    def __init__(self, xml_dom):
+    _fields = ('source', 'content_item', 'track', 'artist', 'album', 'image',
+               'duration', 'position', 'play_status', 'shuffle_setting',
+               'repeat_setting', 'stream_type', 'track_id', 'station_name',
+               'description', 'station_location')
+    __slots__ = tuple('_' + field for field in _fields) + ('_captured_at',)
+
+    def __init__(self, now_playing_element):
         """Create a new device status.
 
-        :param xml_dom: Status XML DOM
-        """
-        self._source = _get_dom_element_attribute(xml_dom, "nowPlaying",
-                                                  "source")
-        self._content_item = ContentItem(
-            _get_dom_element(xml_dom, "ContentItem"))
-        self._track = _get_dom_element_value(xml_dom, "track")
-        self._artist = _get_dom_element_value(xml_dom, "artist")
-        self._album = _get_dom_element_value(xml_dom, "album")
-        image_status = _get_dom_element_attribute(xml_dom, "art",
-                                                  "artImageStatus")
-        if image_status == "IMAGE_PRESENT":
-            self._image = _get_dom_element_value(xml_dom, "art")
-        else:
-            self._image = None
-
-        duration = _get_dom_element_attribute(xml_dom, "time", "total")
-        self._duration = int(duration) if duration is not None else None
-        position = _get_dom_element_value(xml_dom, "time")
-        self._position = int(position) if position is not None else None
-        self._play_status = _get_dom_element_value(xml_dom, "playStatus")
-        self._shuffle_setting = _get_dom_element_value(xml_dom,
-                                                       "shuffleSetting")
-        self._repeat_setting = _get_dom_element_value(xml_dom, "repeatSetting")
-        self._stream_type = _get_dom_element_value(xml_dom, "streamType")
-        self._track_id = _get_dom_element_value(xml_dom, "trackID")
-        self._station_name = _get_dom_element_value(xml_dom, "stationName")
-        self._description = _get_dom_element_value(xml_dom, "description")
-        self._station_location = _get_dom_element_value(xml_dom,
-                                                        "stationLocation")
+        :param now_playing_element: Status (nowPlaying) XML element
+        """
+        self._captured_at = time.time()
+        self._source = _interned(now_playing_element.get("source"))
+        self._content_item = None
+        self._track = None
+        self._artist = None
+        self._album = None
+        self._image = None
+        self._duration = None
+        self._position = None
+        self._play_status = None
+        self._shuffle_setting = None
+        self._repeat_setting = None
+        self._stream_type = None
+        self._track_id = None
+        self._station_name = None
+        self._description = None
+        self._station_location = None
+        for child in now_playing_element:
+            tag = child.tag
+            if tag == "ContentItem":
+                self._content_item = ContentItem(child)
+            elif tag == "track":
+                self._track = _element_value(child)
+            elif tag == "artist":
+                self._artist = _element_value(child)
+            elif tag == "album":
+                self._album = _element_value(child)
+            elif tag == "art":
+                if child.get("artImageStatus") == "IMAGE_PRESENT":
+                    self._image = _element_value(child)
+            elif tag == "time":
+                duration = child.get("total")
+                self._duration = int(duration) if duration is not None \
+                    else None
+                position = _element_value(child)
+                self._position = int(position) if position is not None \
+                    else None
+            elif tag == "playStatus":
+                self._play_status = _interned(_element_value(child))
+            elif tag == "shuffleSetting":
+                self._shuffle_setting = _interned(_element_value(child))
+            elif tag == "repeatSetting":
+                self._repeat_setting = _interned(_element_value(child))
+            elif tag == "streamType":
+                self._stream_type = _interned(_element_value(child))
+            elif tag == "trackID":
+                self._track_id = _element_value(child)
+            elif tag == "stationName":
+                self._station_name = _element_value(child)
+            elif tag == "description":
+                self._description = _element_value(child)
+            elif tag == "stationLocation":
+                self._station_location = _element_value(child)
 
     @property
     def source(self):
@@ -778,22 +1682,52 @@ class Status:
         """Station location."""
         return self._station_location
 
+    @property
+    def captured_at(self):
+        """Time (time.time()) when the status was received."""
+        return self._captured_at
+
+    def estimated_position(self, now=None):
+        """Return the playback position (seconds) interpolated to now.
+
+        While playing, the position advances from the received one, up to
+        the duration.
 
-class ContentItem:
+        :param now: Time (time.time()) of the estimate. Default now
+        :return: None if the position is unknown (radio, standby, ...)
+        """
+        if self._position is None:
+            return None
+        if self._play_status != 'PLAY_STATE':
+            return self._position
+        if now is None:
+            now = time.time()
+        position = self._position + max(now - self._captured_at, 0)
+        if self._duration:
+            position = min(position, self._duration)
+        return position
+
+
+class ContentItem(_Model):
     """Content item."""
 
-    def __init__(self, xml_dom):
+    _fields = ('name', 'source', 'type', 'location', 'source_account',
+               'is_presetable')
+    __slots__ = tuple('_' + field for field in _fields)
+
+    def __init__(self, content_item_element):
         """Create a new content item.
 
-        :param xml_dom: Content item XML DOM
+        :param content_item_element: Content item XML element
         """
-        self._name = _get_dom_element_value(xml_dom, "itemName")
-        self._source = _get_dom_attribute(xml_dom, "source")
-        self._type = _get_dom_attribute(xml_dom, "type")
-        self._location = _get_dom_attribute(xml_dom, "location")
-        self._source_account = _get_dom_attribute(xml_dom, "sourceAccount")
-        self._is_presetable = _get_dom_attribute(xml_dom,
-                                                 "isPresetable") == 'true'
+        self._name = _element_value(content_item_element.find("itemName"))
+        self._source = _interned(content_item_element.get("source"))
+        self._type = _interned(content_item_element.get("type"))
+        self._location = content_item_element.get("location")
+        self._source_account = \
+            _interned(content_item_element.get("sourceAccount"))
+        self._is_presetable = \
+            content_item_element.get("isPresetable") == 'true'
 
     @property
     def name(self):
@@ -826,17 +1760,27 @@ class ContentItem:
         return self._is_presetable
 
 
-class Volume:
+class Volume(_Model):
     """Volume configuration."""
 
-    def __init__(self, xml_dom):
+    _fields = ('actual', 'target', 'muted')
+    __slots__ = ('_actual', '_target', '_muted')
+
+    def __init__(self, volume_element):
         """Create a new volume configuration.
 
-        :param xml_dom: Volume configuration XML DOM
+        :param volume_element: Volume configuration XML element
         """
-        self._actual = int(_get_dom_element_value(xml_dom, "actualvolume"))
-        self._target = int(_get_dom_element_value(xml_dom, "targetvolume"))
-        self._muted = _get_dom_element_value(xml_dom, "muteenabled") == "true"
+        self._actual = None
+        self._target = None
+        self._muted = False
+        for child in volume_element:
+            if child.tag == "actualvolume":
+                self._actual = int(_element_value(child))
+            elif child.tag == "targetvolume":
+                self._target = int(_element_value(child))
+            elif child.tag == "muteenabled":
+                self._muted = _element_value(child) == "true"
 
     @property
     def actual(self):
@@ -854,30 +1798,32 @@ class Volume:
         return self._muted
 
 
-class Preset:
+class Preset(_Model):
     """Preset."""
 
-    def __init__(self, preset_dom):
+    _fields = ('preset_id', 'name', 'source', 'type', 'location',
+               'source_account', 'is_presetable', 'source_xml')
+    __slots__ = ('_id', '_name', '_source', '_type', '_location',
+                 '_source_account', '_is_presetable', '_source_xml')
+
+    def __init__(self, preset_element):
         """Create a preset configuration.
 
-        :param preset_dom: Preset configuration XML DOM
-        """
-        self._name = _get_dom_element_value(preset_dom, "itemName")
-        self._id = _get_dom_attribute(preset_dom, "id")
-        self._source = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                  "source")
-        self._type = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                "type")
-        self._location = _get_dom_element_attribute(preset_dom, "ContentItem",
-                                                    "location")
-        self._source_account = _get_dom_element_attribute(preset_dom,
-                                                          "ContentItem",
-                                                          "sourceAccount")
-        self._is_presetable = \
-            _get_dom_element_attribute(preset_dom,
-                                       "ContentItem",
-                                       "isPresetable") == "true"
-        self._source_xml = _get_dom_element(preset_dom, "ContentItem").toxml()
+        :param preset_element: Preset configuration XML element
+        """
+        self._id = preset_element.get("id")
+        content_item = preset_element.find("ContentItem")
+        if content_item is None:
+            content_item = ElementTree.Element("ContentItem")
+            self._source_xml = None
+        else:
+            self._source_xml = _element_xml(content_item)
+        self._name = _element_value(content_item.find("itemName"))
+        self._source = _interned(content_item.get("source"))
+        self._type = _interned(content_item.get("type"))
+        self._location = content_item.get("location")
+        self._source_account = _interned(content_item.get("sourceAccount"))
+        self._is_presetable = content_item.get("isPresetable") == "true"
 
     @property
     def name(self):
@@ -920,23 +1866,22 @@ class Preset:
         return self._source_xml
 
 
-class ZoneStatus:
+class ZoneStatus(_Model):
     """Zone Status."""
 
-    def __init__(self, zone_dom):
+    _fields = ('master_id', 'master_ip', 'is_master', 'slaves')
+    __slots__ = ('_master_id', '_master_ip', '_is_master', '_slaves')
+
+    def __init__(self, zone_element):
         """Create a new Zone status configuration.
 
-        :param zone_dom: Zone status configuration XML DOM
+        :param zone_element: Zone status configuration XML element
         """
-        self._master_id = _get_dom_element_attribute(zone_dom, "zone",
-                                                     "master")
-        self._master_ip = _get_dom_element_attribute(zone_dom, "zone",
-                                                     "senderIPAddress")
+        self._master_id = _interned(zone_element.get("master"))
+        self._master_ip = _interned(zone_element.get("senderIPAddress"))
         self._is_master = self._master_ip is None
-        members = _get_dom_elements(zone_dom, "member")
-        self._slaves = []
-        for member in members:
-            self._slaves.append(ZoneSlave(member))
+        self._slaves = tuple(ZoneSlave(member) for member in zone_element
+                             if member.tag == "member")
 
     @property
     def master_id(self):
@@ -955,20 +1900,23 @@ class ZoneStatus:
 
     @property
     def slaves(self):
-        """Zone slaves."""
+        """Zone slaves (tuple)."""
         return self._slaves
 
 
-class ZoneSlave:
+class ZoneSlave(_Model):
     """Zone Slave."""
 
-    def __init__(self, member_dom):
+    _fields = ('device_ip', 'role')
+    __slots__ = ('_ip', '_role')
+
+    def __init__(self, member_element):
         """Create a new Zone slave configuration.
 
-        :param member_dom: Slave XML DOM
+        :param member_element: Slave XML element
         """
-        self._ip = _get_dom_attribute(member_dom, "ipaddress")
-        self._role = _get_dom_attribute(member_dom, "role")
+        self._ip = _interned(member_element.get("ipaddress"))
+        self._role = _interned(member_element.get("role"))
 
     @property
     def device_ip(self):
@@ -1003,3 +1951,19 @@ class NoSlavesException(SoundtouchException):
     def __init__(self):
         """NoSlavesException."""
         super(NoSlavesException, self).__init__()
+
+
+class NoExistingPresetException(SoundtouchException):
+    """Exception while selecting a preset which doesn't exist."""
+
+    def __init__(self):
+        """NoExistingPresetException."""
+        super(NoExistingPresetException, self).__init__()
+
+
+class DeviceTimeoutException(SoundtouchException):
+    """Exception when a device didn't complete an operation in time."""
+
+    def __init__(self):
+        """DeviceTimeoutException."""
+        super(DeviceTimeoutException, self).__init__()
@@ -0,0 +1,184 @@
+"""Continuous discovery of Bose Soundtouch devices."""
+
+# pylint: disable=protected-access
+
+import logging
+from threading import Lock
+
+from zeroconf import Zeroconf, ServiceBrowser
+
+from .device import SoundTouchDevice
+from .utils import SoundtouchDeviceListener, DEFAULT_RESOLVE_WORKERS
+
+_SERVICE_TYPE = "_soundtouch._tcp.local."
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DiscoveryService:
+    """Live registry of the devices announced on the local network.
+
+    The service keeps browsing mDNS announcements and maintains the
+    available devices by device ID:
+
+    * a new device is added and the added listeners are called,
+    * a device announced with a new address (IP change) or a new
+      configuration keeps its :class:`SoundTouchDevice` object, which is
+      updated, and the updated listeners are called,
+    * a device whose service is removed is removed and the removed
+      listeners are called. If it comes back, the same object is reused.
+
+    Listeners are called with the device, from the resolution threads::
+
+        service = DiscoveryService()
+        service.add_device_added_listener(lambda device: print(device.host))
+        service.start()
+    """
+
+    def __init__(self, zeroconf=None, max_workers=DEFAULT_RESOLVE_WORKERS,
+                 registry=None, **device_kwargs):
+        """Create a new discovery service.
+
+        :param zeroconf: Zeroconf instance. Default a new one owned by the
+            service
+        :param max_workers: Max number of devices resolved at the same time.
+            Default 8
+        :param registry: DeviceRegistry updated with the found devices. Its
+            devices are reused when announced. Default None
+        :param device_kwargs: Arguments given to the SoundTouchDevice
+            constructor (timeout, dispatcher, ...)
+        """
+        self._zeroconf = zeroconf
+        self._owns_zeroconf = zeroconf is None
+        self._max_workers = max_workers
+        self._registry = registry
+        self._device_kwargs = device_kwargs
+        self._browser = None
+        self._listener = None
+        self._lock = Lock()
+        # Available devices, by device ID
+        self._devices = {}
+        # All the devices ever seen, by device ID
+        self._known_devices = {}
+        # Device ID, by service name
+        self._device_ids = {}
+        self._device_added_listeners = []
+        self._device_updated_listeners = []
+        self._device_removed_listeners = []
+        if registry is not None:
+            for device in registry.devices():
+                self._known_devices[device.config.device_id] = device
+
+    @property
+    def devices(self):
+        """Return the available devices."""
+        with self._lock:
+            return list(self._devices.values())
+
+    def device(self, device_id):
+        """Return the available device with this ID, None if unknown."""
+        with self._lock:
+            return self._devices.get(device_id)
+
+    def start(self):
+        """Start browsing the announcements."""
+        if self._browser is not None:
+            return
+        if self._zeroconf is None:
+            self._zeroconf = Zeroconf()
+        self._listener = SoundtouchDeviceListener(
+            self._on_service_found, self._max_workers,
+            self._on_service_removed)
+        _LOGGER.debug("Starting discovery service...")
+        self._browser = ServiceBrowser(self._zeroconf, _SERVICE_TYPE,
+                                       self._listener)
+
+    def stop(self):
+        """Stop browsing the announcements. Devices are kept."""
+        if self._browser is None:
+            return
+        self._browser.cancel()
+        self._browser = None
+        self._listener.close()
+        self._listener = None
+        if self._owns_zeroconf:
+            self._zeroconf.close()
+            self._zeroconf = None
+
+    def _on_service_found(self, name, host, port):
+        """Add or update the device of a resolved service."""
+        with self._lock:
+            device = self._known_devices.get(self._device_ids.get(name))
+        found = None
+        if device is None:
+            # Unknown service: /info gives the device ID
+            found = SoundTouchDevice(host, port, **self._device_kwargs)
+            with self._lock:
+                device = self._known_devices.setdefault(
+                    found.config.device_id, found)
+        previous = device.config.to_dict()
+        moved = (device.host, device.port) != (host, port)
+        if moved:
+            device._set_address(host, port)
+        if found is None:
+            device.refresh_config()
+        elif found is not device:
+            device._config = found.config
+            found.close()
+        device_id = device.config.device_id
+        with self._lock:
+            self._device_ids[name] = device_id
+            added = device_id not in self._devices
+            self._devices[device_id] = device
+        if self._registry is not None:
+            self._registry.update([device])
+        if added:
+            _LOGGER.info("Device %s added (host: %s)", device_id, host)
+            self._run_listener(self._device_added_listeners, device)
+        elif moved or previous != device.config.to_dict():
+            _LOGGER.info("Device %s updated (host: %s)", device_id, host)
+            self._run_listener(self._device_updated_listeners, device)
+
+    def _on_service_removed(self, name):
+        """Remove the device of a removed service."""
+        with self._lock:
+            device = self._devices.pop(self._device_ids.get(name), None)
+        if device is not None:
+            _LOGGER.info("Device %s removed", device.config.device_id)
+            self._run_listener(self._device_removed_listeners, device)
+
+    @staticmethod
+    def _run_listener(listeners, device):
+        """Run Listener with device."""
+        for listener in list(listeners):
+            try:
+                listener(device)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Discovery listener failed")
+
+    def add_device_added_listener(self, listener):
+        """Add a new device added listener."""
+        self._device_added_listeners.append(listener)
+
+    def add_device_updated_listener(self, listener):
+        """Add a new device updated (address or config) listener."""
+        self._device_updated_listeners.append(listener)
+
+    def add_device_removed_listener(self, listener):
+        """Add a new device removed listener."""
+        self._device_removed_listeners.append(listener)
+
+    def remove_device_added_listener(self, listener):
+        """Remove a device added listener."""
+        if listener in self._device_added_listeners:
+            self._device_added_listeners.remove(listener)
+
+    def remove_device_updated_listener(self, listener):
+        """Remove a device updated listener."""
+        if listener in self._device_updated_listeners:
+            self._device_updated_listeners.remove(listener)
+
+    def remove_device_removed_listener(self, listener):
+        """Remove a device removed listener."""
+        if listener in self._device_removed_listeners:
+            self._device_removed_listeners.remove(listener)
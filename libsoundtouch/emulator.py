@@ -0,0 +1,916 @@
+"""Emulator of Bose Soundtouch devices, for tests and benchmarks.
+
+The emulator serves the HTTP API (port 8090 on a real device) and the
+``gabbo`` websocket notifications (port 8080) of any number of devices from
+one process::
+
+    emulator = SoundTouchEmulator(latency=0.02, jitter=0.01)
+    emulator.add_devices(100)
+    emulator.start()
+    devices = [SoundTouchDevice(emulated.host, emulated.port,
+                                emulated.ws_port)
+               for emulated in emulator.devices]
+
+It can also be started from the command line::
+
+    python -m libsoundtouch.emulator --devices 100 --event-interval 1
+
+Each emulated device listens on its own ports (random ones by default). On
+Linux, the whole 127.0.0.0/8 network is local: devices can get their own
+address and the default ports (``host='127.0.0.2', port=8090,
+ws_port=8080``).
+"""
+
+# pylint: disable=protected-access
+
+from __future__ import print_function
+
+import argparse
+import base64
+import hashlib
+import logging
+import random
+import socket
+import struct
+import time
+from threading import Lock, Thread
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    import selectors
+except ImportError:
+    import selectors2 as selectors  # type: ignore
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, \
+        HTTPServer  # type: ignore
+    from SocketServer import ThreadingMixIn  # type: ignore
+
+# Websocket handshake GUID (RFC 6455)
+_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Max duration (seconds) of a websocket handshake
+_HANDSHAKE_TIMEOUT = 5
+# Period (seconds) of the emulator loop checks (new devices, stop)
+_SELECT_TIMEOUT = 0.2
+
+_PLAY_STATES = {'PLAY': 'PLAY_STATE', 'PAUSE': 'PAUSE_STATE',
+                'STOP': 'STOP_STATE'}
+
+_DEFAULT_PRESETS = [
+    ('INTERNET_RADIO', 'stationurl', '4712', 'Radio %d'),
+    ('SPOTIFY', 'uri', 'spotify:playlist:%d', 'Playlist %d'),
+    ('TUNEIN', 'stationurl', '/v1/playback/station/s%d', 'Station %d'),
+]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _websocket_frame(message):
+    """Return an unmasked text frame (server to client)."""
+    payload = message.encode('utf-8')
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    return header + payload
+
+
+def _websocket_handshake(client):
+    """Answer the websocket upgrade request of a client."""
+    request = b""
+    while b"\r\n\r\n" not in request:
+        data = client.recv(1024)
+        if not data:
+            raise socket.error("Connection closed during handshake")
+        request += data
+    key = [line.split(b":", 1)[1].strip() for line in request.split(b"\r\n")
+           if line.lower().startswith(b"sec-websocket-key:")][0]
+    accept = base64.b64encode(hashlib.sha1(key + _GUID).digest())
+    client.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                   b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                   b"Sec-WebSocket-Protocol: gabbo\r\n"
+                   b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+
+def _status_xml(action):
+    return '<?xml version="1.0" encoding="UTF-8" ?><status>%s</status>' % \
+        action
+
+
+def _error_xml(device_id, code, name, message):
+    return '<?xml version="1.0" encoding="UTF-8" ?><errors deviceID=%s>' \
+           '<error value="%d" name=%s severity="Unknown">%s</error>' \
+           '</errors>' % (quoteattr(device_id), code, quoteattr(name),
+                          escape(message))
+
+
+class EmulatedDevice:
+    """State of an emulated Soundtouch device.
+
+    The state is changed by the HTTP commands, or directly with
+    :meth:`set_volume`, :meth:`set_now_playing`, ... Each change is notified
+    to the connected websocket clients, like a real device does.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, device_id, name, host, port=0, ws_port=0,
+                 device_type='SoundTouch 20', presets=6):
+        """Create a new emulated device.
+
+        :param device_id: Device ID
+        :param name: Device name
+        :param host: IP address the device listens on
+        :param port: HTTP API port. Default 0 (random port)
+        :param ws_port: Websocket port. Default 0 (random port)
+        :param device_type: Device type. Default 'SoundTouch 20'
+        :param presets: Number of presets. Default 6
+        """
+        self._id = device_id
+        self._name = name
+        self._type = device_type
+        self._host = host
+        self._port = port
+        self._ws_port = ws_port
+        self._lock = Lock()
+        self._clients = []
+        self._requests = 0
+        self._events = 0
+        self._volume = 20
+        self._muted = False
+        self._source = 'STANDBY'
+        self._last_source = None
+        self._play_status = None
+        self._track = None
+        self._artist = None
+        self._album = None
+        self._duration = None
+        self._position = None
+        self._content = None
+        self._presets = [self._default_preset(preset_id)
+                         for preset_id in range(1, presets + 1)]
+        self._zone_master = None
+        self._zone_sender = None
+        self._zone_members = []
+        self._http_server = None
+        self._ws_server = None
+
+    @staticmethod
+    def _default_preset(preset_id):
+        source, media_type, location, name = _DEFAULT_PRESETS[
+            (preset_id - 1) % len(_DEFAULT_PRESETS)]
+        if '%d' in location:
+            location = location % preset_id
+        return {'id': str(preset_id), 'source': source, 'type': media_type,
+                'location': location, 'source_account': '',
+                'name': name % preset_id}
+
+    @property
+    def device_id(self):
+        """Device ID."""
+        return self._id
+
+    @property
+    def name(self):
+        """Device name."""
+        return self._name
+
+    @property
+    def host(self):
+        """IP address of the device."""
+        return self._host
+
+    @property
+    def port(self):
+        """Return the HTTP API port."""
+        return self._port
+
+    @property
+    def ws_port(self):
+        """Return the websocket port."""
+        return self._ws_port
+
+    @property
+    def requests(self):
+        """Number of HTTP requests received."""
+        return self._requests
+
+    @property
+    def events(self):
+        """Number of websocket notifications sent."""
+        return self._events
+
+    @property
+    def clients(self):
+        """Number of connected websocket clients."""
+        with self._lock:
+            return len(self._clients)
+
+    @property
+    def volume(self):
+        """Current volume level."""
+        return self._volume
+
+    @property
+    def source(self):
+        """Return the current source, 'STANDBY' when powered off."""
+        return self._source
+
+    @property
+    def play_status(self):
+        """Return the current play status: 'PLAY_STATE', ..."""
+        return self._play_status
+
+    # XML documents ---------------------------------------------------------
+
+    def info_xml(self):
+        """Return the /info document."""
+        return '<?xml version="1.0" encoding="UTF-8" ?>' + \
+            self._info_element()
+
+    def _info_element(self):
+        return '<info deviceID=%s><name>%s</name><type>%s</type>' \
+               '<components><component>' \
+               '<componentCategory>SCM</componentCategory>' \
+               '<softwareVersion>13.0.9.29919.1889959</softwareVersion>' \
+               '<serialNumber>%s</serialNumber></component></components>' \
+               '<networkInfo type="SMSC"><macAddress>%s</macAddress>' \
+               '<ipAddress>%s</ipAddress></networkInfo></info>' % (
+                   quoteattr(self._id), escape(self._name),
+                   escape(self._type), escape(self._id), escape(self._id),
+                   escape(self._host))
+
+    def now_playing_xml(self):
+        """Return the /now_playing document."""
+        return '<?xml version="1.0" encoding="UTF-8" ?>' + \
+            self._now_playing_element()
+
+    def _now_playing_element(self):
+        if self._source == 'STANDBY':
+            return '<nowPlaying deviceID=%s source="STANDBY">' \
+                   '<ContentItem source="STANDBY" isPresetable="true" />' \
+                   '</nowPlaying>' % quoteattr(self._id)
+        content = self._content
+        element = '<nowPlaying deviceID=%s source=%s sourceAccount=%s>' \
+                  '<ContentItem source=%s type=%s location=%s ' \
+                  'sourceAccount=%s isPresetable="true">' \
+                  '<itemName>%s</itemName></ContentItem>' % (
+                      quoteattr(self._id), quoteattr(self._source),
+                      quoteattr(content['source_account']),
+                      quoteattr(content['source']),
+                      quoteattr(content['type']),
+                      quoteattr(content['location']),
+                      quoteattr(content['source_account']),
+                      escape(content['name']))
+        for tag, value in (('track', self._track), ('artist', self._artist),
+                           ('album', self._album)):
+            if value is not None:
+                element += '<%s>%s</%s>' % (tag, escape(value), tag)
+        if self._duration is not None:
+            element += '<time total="%d">%d</time>' % (self._duration,
+                                                       self._position)
+        element += '<playStatus>%s</playStatus>' \
+                   '<shuffleSetting>SHUFFLE_OFF</shuffleSetting>' \
+                   '<repeatSetting>REPEAT_OFF</repeatSetting>' \
+                   '<streamType>TRACK_ONDEMAND</streamType>' \
+                   '</nowPlaying>' % self._play_status
+        return element
+
+    def volume_xml(self):
+        """Return the /volume document."""
+        return '<?xml version="1.0" encoding="UTF-8" ?>' + \
+            self._volume_element()
+
+    def _volume_element(self):
+        return '<volume deviceID=%s><targetvolume>%d</targetvolume>' \
+               '<actualvolume>%d</actualvolume>' \
+               '<muteenabled>%s</muteenabled></volume>' % (
+                   quoteattr(self._id), self._volume, self._volume,
+                   'true' if self._muted else 'false')
+
+    def presets_xml(self):
+        """Return the /presets document."""
+        return '<?xml version="1.0" encoding="UTF-8" ?>' + \
+            self._presets_element()
+
+    def _presets_element(self):
+        element = '<presets>'
+        for preset in self._presets:
+            element += '<preset id=%s createdOn="1476034359" ' \
+                       'updatedOn="1476034359">%s</preset>' % (
+                           quoteattr(preset['id']),
+                           self._content_item_element(preset))
+        return element + '</presets>'
+
+    @staticmethod
+    def _content_item_element(content):
+        return '<ContentItem source=%s type=%s location=%s ' \
+               'sourceAccount=%s isPresetable="true">' \
+               '<itemName>%s</itemName></ContentItem>' % (
+                   quoteattr(content['source']), quoteattr(content['type']),
+                   quoteattr(content['location']),
+                   quoteattr(content['source_account']),
+                   escape(content['name']))
+
+    def zone_xml(self):
+        """Return the /getZone document."""
+        return '<?xml version="1.0" encoding="UTF-8" ?>' + \
+            self._zone_element()
+
+    def _zone_element(self):
+        if self._zone_master is None:
+            return '<zone />'
+        element = '<zone master=%s' % quoteattr(self._zone_master)
+        if self._zone_sender is not None:
+            element += ' senderIPAddress=%s' % quoteattr(self._zone_sender)
+        element += '>'
+        for member_ip, member_id in self._zone_members:
+            element += '<member ipaddress=%s>%s</member>' % (
+                quoteattr(member_ip), escape(member_id))
+        return element + '</zone>'
+
+    # State changes ---------------------------------------------------------
+
+    def set_volume(self, level):
+        """Set the volume level and notify it."""
+        with self._lock:
+            self._volume = max(0, min(100, int(level)))
+        self._notify('volumeUpdated', self._volume_element())
+
+    def set_muted(self, muted):
+        """Mute or unmute the device and notify it."""
+        with self._lock:
+            self._muted = bool(muted)
+        self._notify('volumeUpdated', self._volume_element())
+
+    def set_now_playing(self, content, track=None, artist=None, album=None,
+                        duration=None, play_status='PLAY_STATE'):
+        """Play a content and notify it.
+
+        :param content: Content item: dict with the keys source, type,
+            location, source_account and name
+        :param track: Track name
+        :param artist: Artist name
+        :param album: Album name
+        :param duration: Track duration in seconds, None for a stream
+        :param play_status: Play status. Default 'PLAY_STATE'
+        """
+        with self._lock:
+            self._content = dict(content)
+            self._source = content['source']
+            self._track = track
+            self._artist = artist
+            self._album = album
+            self._duration = duration
+            self._position = 0 if duration is not None else None
+            self._play_status = play_status
+        self._notify('nowPlayingUpdated', self._now_playing_element())
+
+    def set_play_status(self, play_status):
+        """Change the play status ('PLAY_STATE', ...) and notify it."""
+        with self._lock:
+            if self._source == 'STANDBY':
+                return
+            self._play_status = play_status
+        self._notify('nowPlayingUpdated', self._now_playing_element())
+
+    def power(self, power_on):
+        """Power the device on (last source) or off and notify it."""
+        with self._lock:
+            if power_on == (self._source != 'STANDBY'):
+                return
+        if power_on:
+            self.set_now_playing(self._last_source or self._presets[0],
+                                 track='Track 1', artist='Artist',
+                                 album='Album', duration=240)
+            return
+        with self._lock:
+            self._last_source = self._content
+            self._source = 'STANDBY'
+            self._play_status = None
+        self._notify('nowPlayingUpdated', self._now_playing_element())
+
+    def set_zone(self, master_id, sender_ip, members):
+        """Change the zone of the device and notify it.
+
+        :param master_id: ID of the zone master, None for no zone
+        :param sender_ip: IP of the master, None for the master itself
+        :param members: (ip, device ID) list of the zone slaves
+        """
+        with self._lock:
+            self._zone_master = master_id
+            self._zone_sender = sender_ip
+            self._zone_members = list(members) if master_id else []
+        self._notify('zoneUpdated', self._zone_element())
+
+    def random_event(self, rng=random):
+        """Apply a random state change: volume, play status or position."""
+        choice = rng.random()
+        if choice < 0.5:
+            self.set_volume(self._volume + rng.choice((-1, 1)))
+        elif choice < 0.7 and self._source != 'STANDBY':
+            self.set_play_status('PAUSE_STATE' if self._play_status ==
+                                 'PLAY_STATE' else 'PLAY_STATE')
+        else:
+            if self._source == 'STANDBY':
+                self.power(True)
+                return
+            with self._lock:
+                if self._duration is not None:
+                    self._position = (self._position + 1) % self._duration
+            self._notify('nowPlayingUpdated', self._now_playing_element())
+
+    def push(self, message):
+        """Send a raw notification to the connected websocket clients."""
+        frame = _websocket_frame(message)
+        with self._lock:
+            clients = list(self._clients)
+            self._events += 1
+        for client in clients:
+            try:
+                client.sendall(frame)
+            except socket.error:
+                self._remove_client(client)
+
+    def _notify(self, update, element):
+        self.push('<updates deviceID=%s><%s>%s</%s></updates>' % (
+            quoteattr(self._id), update, element, update))
+
+    def _add_client(self, client):
+        with self._lock:
+            self._clients.append(client)
+
+    def _remove_client(self, client):
+        with self._lock:
+            if client not in self._clients:
+                return
+            self._clients.remove(client)
+        try:
+            client.close()
+        except socket.error:
+            pass
+
+    # HTTP API --------------------------------------------------------------
+
+    def handle(self, method, path, body, emulator=None):
+        """Run an HTTP request.
+
+        :param method: 'GET' or 'POST'
+        :param path: Request path ('/volume', ...)
+        :param body: Request body (bytes) of a POST request
+        :param emulator: SoundTouchEmulator of the device, used to update
+            the other zone members
+        :return: (HTTP status, XML document)
+        """
+        with self._lock:
+            self._requests += 1
+        if method == 'GET':
+            document = {
+                '/info': self.info_xml,
+                '/now_playing': self.now_playing_xml,
+                '/volume': self.volume_xml,
+                '/presets': self.presets_xml,
+                '/getZone': self.zone_xml,
+            }.get(path)
+            if document is not None:
+                return 200, document()
+        elif method == 'POST':
+            command = {
+                '/key': self._post_key,
+                '/volume': self._post_volume,
+                '/select': self._post_select,
+                '/setZone': self._post_set_zone,
+                '/addZoneSlave': self._post_add_zone_slave,
+                '/removeZoneSlave': self._post_remove_zone_slave,
+            }.get(path)
+            if command is not None:
+                try:
+                    element = ElementTree.fromstring(body)
+                except ElementTree.ParseError:
+                    return 400, _error_xml(
+                        self._id, 1019, 'CLIENT_XML_ERROR', 'Invalid XML')
+                try:
+                    command(element, emulator)
+                except (TypeError, ValueError):
+                    return 400, _error_xml(
+                        self._id, 1019, 'CLIENT_XML_ERROR', 'Invalid value')
+                return 200, _status_xml(path)
+        return 404, _error_xml(self._id, 404, 'HTTP_STATUS_NOT_FOUND',
+                               'Unknown request %s %s' % (method, path))
+
+    def _post_key(self, element, emulator):
+        # pylint: disable=unused-argument
+        if element.get('state') != 'release':
+            return
+        key = element.text or ''
+        if key in _PLAY_STATES:
+            self.set_play_status(_PLAY_STATES[key])
+        elif key == 'PLAY_PAUSE':
+            self.set_play_status('PAUSE_STATE' if self._play_status ==
+                                 'PLAY_STATE' else 'PLAY_STATE')
+        elif key == 'POWER':
+            self.power(self._source == 'STANDBY')
+        elif key == 'MUTE':
+            self.set_muted(not self._muted)
+        elif key == 'VOLUME_UP':
+            self.set_volume(self._volume + 1)
+        elif key == 'VOLUME_DOWN':
+            self.set_volume(self._volume - 1)
+        elif key in ('NEXT_TRACK', 'PREV_TRACK') and \
+                self._source != 'STANDBY':
+            number = int((self._track or 'Track 1').split()[-1])
+            number = max(1, number + (1 if key == 'NEXT_TRACK' else -1))
+            self.set_now_playing(self._content, 'Track %d' % number,
+                                 self._artist, self._album, self._duration)
+        elif key.startswith('PRESET_'):
+            preset_id = int(key[len('PRESET_'):])
+            if preset_id <= len(self._presets):
+                preset = self._presets[preset_id - 1]
+                self.set_now_playing(preset, track=preset['name'])
+
+    def _post_volume(self, element, emulator):
+        # pylint: disable=unused-argument
+        self.set_volume(element.text)
+
+    def _post_select(self, element, emulator):
+        # pylint: disable=unused-argument
+        item_name = element.find('itemName')
+        content = {'source': element.get('source', ''),
+                   'type': element.get('type', ''),
+                   'location': element.get('location', ''),
+                   'source_account': element.get('sourceAccount', ''),
+                   'name': item_name.text if item_name is not None else ''}
+        self.set_now_playing(content, track=content['name'])
+
+    @staticmethod
+    def _members(element):
+        return [(member.get('ipaddress'), member.text)
+                for member in element if member.tag == 'member']
+
+    def _post_set_zone(self, element, emulator):
+        self._update_zone(self._members(element), emulator)
+
+    def _post_add_zone_slave(self, element, emulator):
+        members = list(self._zone_members)
+        for member in self._members(element):
+            if member not in members:
+                members.append(member)
+        self._update_zone(members, emulator)
+
+    def _post_remove_zone_slave(self, element, emulator):
+        removed = self._members(element)
+        members = [member for member in self._zone_members
+                   if member not in removed]
+        for _, member_id in removed:
+            slave = emulator.device(member_id) if emulator else None
+            if slave is not None:
+                slave.set_zone(None, None, [])
+        self._update_zone(members, emulator)
+
+    def _update_zone(self, members, emulator):
+        if not members:
+            self.set_zone(None, None, [])
+            return
+        self.set_zone(self._id, None, members)
+        for _, member_id in members:
+            slave = emulator.device(member_id) if emulator else None
+            if slave is not None:
+                slave.set_zone(self._id, self._host, members)
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server of an emulated device: a thread per connection."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, device, emulator):
+        HTTPServer.__init__(self, address, _RequestHandler)
+        self.device = device
+        self.emulator = emulator
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Keep-alive HTTP handler running the requests on the device."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately: don't wait for the ACK of
+    # the headers (delayed ACK) before sending the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Run a GET request."""
+        self._run('GET')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Run a POST request."""
+        self._run('POST')
+
+    def _run(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        emulator = self.server.emulator
+        delay = emulator._delay()
+        if delay > 0:
+            time.sleep(delay)
+        if emulator._fails():
+            # Like an unreachable device: no answer
+            self.close_connection = True
+            return
+        status, document = self.server.device.handle(
+            method, self.path.split('?')[0], body, emulator)
+        content = document.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # pylint: disable=redefined-builtin
+        _LOGGER.debug("%s: " + format, self.server.device.device_id, *args)
+
+
+class SoundTouchEmulator:
+    """Emulator of many Soundtouch devices in one process.
+
+    All the listening and websocket sockets are watched by a single thread.
+    HTTP connections are handled by a thread each, so slow (emulated
+    latency) requests of a device don't delay the other devices.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, host='127.0.0.1', latency=0, jitter=0,
+                 failure_rate=0, event_interval=None, seed=None):
+        """Create a new emulator.
+
+        :param host: Default IP address of the devices. Default '127.0.0.1'
+        :param latency: Delay (seconds) before answering an HTTP request.
+            Default 0
+        :param jitter: Random variation (seconds) of the latency, up to
+            +/- jitter. Default 0
+        :param failure_rate: Probability (0 to 1) that an HTTP request fails:
+            the connection is closed without answer. Default 0
+        :param event_interval: Average delay (seconds) between 2 random state
+            changes (notifications) of each device. Default None (no random
+            events)
+        :param seed: Seed of the random generator, for reproducible runs
+        """
+        self._host = host
+        self._latency = latency
+        self._jitter = jitter
+        self._failure_rate = failure_rate
+        self._event_interval = event_interval
+        self._random = random.Random(seed)
+        self._random_lock = Lock()
+        self._lock = Lock()
+        self._devices = []
+        self._devices_by_id = {}
+        self._pending = []
+        self._selector = None
+        self._threads = []
+        self._running = False
+
+    @property
+    def devices(self):
+        """Return the emulated devices."""
+        with self._lock:
+            return list(self._devices)
+
+    def device(self, device_id):
+        """Return the emulated device with this ID, None if unknown."""
+        with self._lock:
+            return self._devices_by_id.get(device_id)
+
+    def add_device(self, name=None, device_id=None, host=None, port=0,
+                   ws_port=0, **kwargs):
+        """Add an emulated device.
+
+        Its sockets are opened now, so its ports are known, and served once
+        the emulator is started.
+
+        :param name: Device name. Default 'Emulated <n>'
+        :param device_id: Device ID. Default a MAC-like ID
+        :param host: IP address of the device. Default the emulator host
+        :param port: HTTP API port. Default 0 (random port)
+        :param ws_port: Websocket port. Default 0 (random port)
+        :param kwargs: Other EmulatedDevice arguments (device_type, presets)
+        :return: The EmulatedDevice
+        """
+        with self._lock:
+            index = len(self._devices) + 1
+        host = host or self._host
+        device_id = device_id or '%012X' % (0xA0B1C2000000 + index)
+        device = EmulatedDevice(device_id, name or 'Emulated %d' % index,
+                                host, port, ws_port, **kwargs)
+        device._http_server = _HTTPServer((host, port), device, self)
+        device._port = device._http_server.server_address[1]
+        ws_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        ws_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        ws_server.bind((host, ws_port))
+        ws_server.listen(128)
+        device._ws_server = ws_server
+        device._ws_port = ws_server.getsockname()[1]
+        with self._lock:
+            self._devices.append(device)
+            self._devices_by_id[device.device_id] = device
+            self._pending.append(device)
+        return device
+
+    def add_devices(self, count, **kwargs):
+        """Add count emulated devices, see :meth:`add_device`.
+
+        :return: The EmulatedDevice list
+        """
+        return [self.add_device(**kwargs) for _ in range(count)]
+
+    def start(self):
+        """Serve the devices in background threads."""
+        if self._running:
+            return
+        self._running = True
+        self._selector = selectors.DefaultSelector()
+        threads = [Thread(target=self._serve, name='SoundTouchEmulator')]
+        if self._event_interval:
+            threads.append(Thread(target=self._generate_events,
+                                  name='SoundTouchEmulatorEvents'))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        self._threads = threads
+
+    def stop(self):
+        """Stop serving and close all the sockets."""
+        if not self._running:
+            return
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        with self._lock:
+            devices = list(self._devices)
+            self._pending = list(self._devices)
+        for device in devices:
+            with device._lock:
+                clients = list(device._clients)
+            for client in clients:
+                device._remove_client(client)
+        self._selector.close()
+        self._selector = None
+
+    def close(self):
+        """Stop the emulator and release the ports of the devices."""
+        self.stop()
+        with self._lock:
+            devices = list(self._devices)
+            self._devices = []
+            self._devices_by_id = {}
+            self._pending = []
+        for device in devices:
+            device._http_server.server_close()
+            device._ws_server.close()
+
+    def __enter__(self):
+        """Start the emulator."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the emulator."""
+        self.close()
+
+    def _delay(self):
+        """Return the emulated latency of a request."""
+        if not self._jitter:
+            return self._latency
+        with self._random_lock:
+            return self._latency + self._random.uniform(-self._jitter,
+                                                        self._jitter)
+
+    def _fails(self):
+        """Return True if a request must fail."""
+        if not self._failure_rate:
+            return False
+        with self._random_lock:
+            return self._random.random() < self._failure_rate
+
+    def _serve(self):
+        """Accept and read the sockets of all the devices."""
+        while self._running:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for device in pending:
+                self._selector.register(device._http_server,
+                                        selectors.EVENT_READ,
+                                        (self._accept_http, device))
+                self._selector.register(device._ws_server,
+                                        selectors.EVENT_READ,
+                                        (self._accept_websocket, device))
+            for key, _ in self._selector.select(_SELECT_TIMEOUT):
+                callback, device = key.data
+                try:
+                    callback(key.fileobj, device)
+                except (socket.error, IndexError) as exception:
+                    _LOGGER.debug("%s: socket error: %s", device.device_id,
+                                  exception)
+
+    def _accept_http(self, server, device):
+        # pylint: disable=unused-argument
+        server.handle_request()
+
+    def _accept_websocket(self, server, device):
+        client = server.accept()[0]
+        client.settimeout(_HANDSHAKE_TIMEOUT)
+        try:
+            _websocket_handshake(client)
+        except Exception:  # pylint: disable=broad-except
+            client.close()
+            raise
+        client.settimeout(None)
+        device._add_client(client)
+        self._selector.register(client, selectors.EVENT_READ,
+                                (self._read_websocket, device))
+
+    def _read_websocket(self, client, device):
+        """Read (and ignore) the frames of a client, until it closes."""
+        try:
+            data = client.recv(4096)
+        except socket.error:
+            data = b''
+        # Opcode 8: close frame
+        if not data or (bytearray(data[:1])[0] & 0x0f) == 8:
+            self._selector.unregister(client)
+            device._remove_client(client)
+
+    def _generate_events(self):
+        """Apply random state changes to the devices, round robin."""
+        index = 0
+        while self._running:
+            devices = self.devices
+            if not devices:
+                time.sleep(_SELECT_TIMEOUT)
+                continue
+            time.sleep(self._event_interval / float(len(devices)))
+            device = devices[index % len(devices)]
+            index += 1
+            with self._random_lock:
+                rng = random.Random(self._random.random())
+            device.random_event(rng)
+
+
+def main():
+    """Run an emulator from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Emulate Bose Soundtouch devices.')
+    parser.add_argument('--devices', type=int, default=1,
+                        help='Number of devices (default 1)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='IP address of the devices (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=0,
+                        help='HTTP port of a single device (default random)')
+    parser.add_argument('--ws-port', type=int, default=0,
+                        help='Websocket port of a single device '
+                             '(default random)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='HTTP latency in seconds (default 0)')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='HTTP latency jitter in seconds (default 0)')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='Probability of a failed request (default 0)')
+    parser.add_argument('--event-interval', type=float, default=None,
+                        help='Seconds between random events of a device '
+                             '(default none)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed')
+    args = parser.parse_args()
+
+    emulator = SoundTouchEmulator(args.host, args.latency, args.jitter,
+                                  args.failure_rate, args.event_interval,
+                                  args.seed)
+    if args.devices == 1:
+        emulator.add_device(port=args.port, ws_port=args.ws_port)
+    else:
+        emulator.add_devices(args.devices)
+    emulator.start()
+    for device in emulator.devices:
+        print('%s %s %d %d' % (device.device_id, device.host, device.port,
+                               device.ws_port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.close()
+
+
+if __name__ == '__main__':
+    main()
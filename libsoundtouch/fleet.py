@@ -0,0 +1,227 @@
+"""Manage many Bose Soundtouch devices at once."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+
+from .device import DeviceTimeoutException, NoExistingPresetException
+
+# Max number of devices handled at the same time
+DEFAULT_MAX_WORKERS = 16
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _refresh_config(device):
+    device.refresh_config()
+    return device.config
+
+
+def _select_preset(device, preset_id):
+    preset_id = str(preset_id)
+    for preset in device.presets(refresh=False):
+        if preset.preset_id == preset_id:
+            device.select_preset(preset)
+            return
+    raise NoExistingPresetException()
+
+
+class FleetResult:
+    """Result of an operation run on several devices.
+
+    Devices which completed the operation are in :attr:`results`, the other
+    ones in :attr:`errors` with the raised exception
+    (:class:`libsoundtouch.device.DeviceTimeoutException` if the device
+    didn't answer in time).
+    """
+
+    def __init__(self):
+        """Create a new empty fleet result."""
+        self._results = {}
+        self._errors = {}
+
+    @property
+    def results(self):
+        """Values returned by the devices, by device."""
+        return self._results
+
+    @property
+    def errors(self):
+        """Exceptions raised by the devices, by device."""
+        return self._errors
+
+    @property
+    def succeeded(self):
+        """Return True if the operation succeeded on all devices."""
+        return not self._errors
+
+
+class SoundTouchFleet:
+    """Group of Bose SoundTouch devices.
+
+    Run refreshes and commands on all the devices concurrently, using at
+    most ``max_workers`` threads. Each call returns a :class:`FleetResult`
+    with the partial results and the errors per device.
+    """
+
+    def __init__(self, devices=None, max_workers=DEFAULT_MAX_WORKERS,
+                 timeout=None):
+        """Create a new fleet.
+
+        :param devices: Devices of the fleet. Default empty
+        :param max_workers: Max number of devices handled at the same time.
+            Default 16
+        :param timeout: Max time (seconds) given to each device to complete
+            an operation, counted from the moment its operation starts.
+            Default None (wait forever). Set a timeout on the devices too, so
+            stuck HTTP calls release their worker
+        """
+        self._devices = list(devices) if devices else []
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def devices(self):
+        """Devices of the fleet."""
+        return self._devices
+
+    @property
+    def timeout(self):
+        """Max time (seconds) given to each device per operation."""
+        return self._timeout
+
+    def add_device(self, device):
+        """Add a device to the fleet."""
+        self._devices.append(device)
+
+    def remove_device(self, device):
+        """Remove a device from the fleet."""
+        if device in self._devices:
+            self._devices.remove(device)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_workers)
+            return self._executor
+
+    def close(self):
+        """Stop the worker threads. Running operations are not interrupted."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def execute(self, function, devices=None):
+        """Call function(device) on each device concurrently.
+
+        :param function: Function called with each device
+        :param devices: Devices to use. Default all the fleet devices
+        :return: FleetResult with the returned values and the errors
+        """
+        devices = list(self._devices if devices is None else devices)
+        executor = self._get_executor()
+        result = FleetResult()
+        started = {}
+
+        def run(device):
+            """Run the operation and record when it started."""
+            started[device] = time.time()
+            return function(device)
+
+        futures = dict((executor.submit(run, device), device)
+                       for device in devices)
+        pending = set(futures)
+        while pending:
+            wait_timeout = None
+            if self._timeout is not None:
+                now = time.time()
+                for future in list(pending):
+                    start = started.get(futures[future])
+                    if start is not None and now - start >= self._timeout \
+                            and not future.done():
+                        _LOGGER.warning("%s didn't answer in time",
+                                        futures[future].host)
+                        pending.remove(future)
+                        result.errors[futures[future]] = \
+                            DeviceTimeoutException()
+                deadlines = [started[futures[future]] + self._timeout - now
+                             for future in pending
+                             if futures[future] in started]
+                wait_timeout = max(min(deadlines), 0) if deadlines \
+                    else self._timeout
+            done, pending = wait(pending, timeout=wait_timeout,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                device = futures[future]
+                try:
+                    result.results[device] = future.result()
+                except Exception as exception:  # pylint: disable=broad-except
+                    _LOGGER.debug("Operation failed on %s: %s", device.host,
+                                  exception)
+                    result.errors[device] = exception
+        return result
+
+    def refresh_config(self, devices=None):
+        """Load the configuration of the devices.
+
+        Load the configs of devices created with ``lazy=True`` in one
+        concurrent batch instead of one by one on first access.
+
+        :return: FleetResult with the Config objects
+        """
+        return self.execute(_refresh_config, devices)
+
+    def refresh_status(self, devices=None):
+        """Refresh the status of the devices.
+
+        :return: FleetResult with the Status objects
+        """
+        return self.execute(lambda device: device.status(), devices)
+
+    def refresh_volume(self, devices=None):
+        """Refresh the volume of the devices.
+
+        :return: FleetResult with the Volume objects
+        """
+        return self.execute(lambda device: device.volume(), devices)
+
+    def refresh_presets(self, devices=None):
+        """Refresh the presets of the devices.
+
+        :return: FleetResult with the lists of Preset objects
+        """
+        return self.execute(lambda device: device.presets(), devices)
+
+    def refresh_zone_status(self, devices=None):
+        """Refresh the zone status of the devices.
+
+        :return: FleetResult with the ZoneStatus objects (None if no zone)
+        """
+        return self.execute(lambda device: device.zone_status(), devices)
+
+    def set_volume(self, level, devices=None):
+        """Set the volume level of the devices: from 0 to 100."""
+        return self.execute(lambda device: device.set_volume(level), devices)
+
+    def power_on(self, devices=None):
+        """Power on the devices."""
+        return self.execute(lambda device: device.power_on(), devices)
+
+    def power_off(self, devices=None):
+        """Power off the devices."""
+        return self.execute(lambda device: device.power_off(), devices)
+
+    def select_preset(self, preset_id, devices=None):
+        """Play the preset with this id on the devices.
+
+        Devices without this preset fail with
+        :class:`libsoundtouch.device.NoExistingPresetException`.
+
+        :param preset_id: Preset id (1 to 6)
+        """
+        return self.execute(
+            lambda device: _select_preset(device, preset_id), devices)
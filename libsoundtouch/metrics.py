@@ -0,0 +1,168 @@
+"""Request and notification metrics of Bose Soundtouch devices."""
+
+from threading import Lock
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Histogram:
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self, buckets):
+        self._bounds = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def add(self, seconds):
+        index = 0
+        for bound in self._bounds:
+            if seconds <= bound:
+                break
+            index += 1
+        self._counts[index] += 1
+        self._count += 1
+        self._sum += seconds
+        if self._min is None or seconds < self._min:
+            self._min = seconds
+        if self._max is None or seconds > self._max:
+            self._max = seconds
+
+    def to_dict(self):
+        """Return count, sum, min, max and cumulative bucket counts."""
+        buckets = {}
+        total = 0
+        for bound, count in zip(self._bounds, self._counts):
+            total += count
+            buckets['%g' % bound] = total
+        buckets['+Inf'] = self._count
+        return {'count': self._count, 'sum': self._sum, 'min': self._min,
+                'max': self._max, 'buckets': buckets}
+
+
+class _EndpointMetrics:
+    """Metrics of an endpoint ('GET /volume', ...)."""
+
+    def __init__(self, buckets):
+        self.count = 0
+        self.errors = {}
+        self.response_bytes = 0
+        self.latency = _Histogram(buckets)
+        self.parse = _Histogram(buckets)
+
+    def to_dict(self):
+        return {'count': self.count,
+                'errors': sum(self.errors.values()),
+                'error_types': dict(self.errors),
+                'response_bytes': self.response_bytes,
+                'latency': self.latency.to_dict(),
+                'parse': self.parse.to_dict()}
+
+
+class DeviceMetrics:
+    """Metrics of the HTTP requests and websocket notifications of devices.
+
+    Give it to :class:`SoundTouchDevice` (``metrics=``) to record:
+
+    * per endpoint (``'GET /now_playing'``, ``'POST /key'``, ...): request
+      count, latency histogram, response sizes, parse time histogram and
+      errors by type (exception class or ``'HTTP <status>'``),
+    * websocket frames: count and characters, by update type, and the parse
+      time histogram of the handled ones.
+
+    One instance can be shared by many devices: their values are added up.
+    :meth:`snapshot` returns the values as a plain dict, ready to be exported
+    to a monitoring system. Subclasses can override the ``record_*`` hooks
+    to forward the values somewhere else.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Create new metrics.
+
+        :param buckets: Upper bounds (seconds) of the histogram buckets
+        """
+        self._buckets = tuple(buckets)
+        self._lock = Lock()
+        self._endpoints = {}
+        self._frames = 0
+        self._frame_characters = 0
+        self._actions = {}
+        self._frame_parse = _Histogram(self._buckets)
+
+    def _endpoint(self, key):
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = _EndpointMetrics(self._buckets)
+        return endpoint
+
+    def record_request(self, method, action, seconds, size=None,
+                       error=None):
+        """Record an HTTP request.
+
+        :param method: 'GET' or 'POST'
+        :param action: Endpoint ('/volume', ...)
+        :param seconds: Duration of the request
+        :param size: Size (bytes) of the response body, None if unknown
+        :param error: Error type, None if the request succeeded
+        """
+        with self._lock:
+            endpoint = self._endpoint(method + ' ' + action)
+            endpoint.count += 1
+            endpoint.latency.add(seconds)
+            if size is not None:
+                endpoint.response_bytes += size
+            if error is not None:
+                endpoint.errors[error] = endpoint.errors.get(error, 0) + 1
+
+    def record_parse(self, action, seconds):
+        """Record the parse time of a GET response.
+
+        :param action: Endpoint ('/volume', ...)
+        :param seconds: Duration of the parsing
+        """
+        with self._lock:
+            self._endpoint('GET ' + action).parse.add(seconds)
+
+    def record_frame(self, action, size):
+        """Record a received websocket frame.
+
+        :param action: Update type ('volumeUpdated', ...), None if unknown
+        :param size: Length (characters) of the message
+        """
+        with self._lock:
+            self._frames += 1
+            self._frame_characters += size
+            action = action or 'unknown'
+            self._actions[action] = self._actions.get(action, 0) + 1
+
+    def record_frame_parse(self, seconds):
+        """Record the parse time of a handled websocket message."""
+        with self._lock:
+            self._frame_parse.add(seconds)
+
+    def snapshot(self):
+        """Return all the values as a dict of plain values."""
+        with self._lock:
+            return {
+                'requests': dict((key, endpoint.to_dict()) for key, endpoint
+                                 in self._endpoints.items()),
+                'websocket': {
+                    'frames': self._frames,
+                    'characters': self._frame_characters,
+                    'actions': dict(self._actions),
+                    'parse': self._frame_parse.to_dict(),
+                },
+            }
+
+    def reset(self):
+        """Reset all the values."""
+        with self._lock:
+            self._endpoints = {}
+            self._frames = 0
+            self._frame_characters = 0
+            self._actions = {}
+            self._frame_parse = _Histogram(self._buckets)
@@ -0,0 +1,562 @@
+"""Websocket notifications of many Bose Soundtouch devices."""
+
+# pylint: disable=protected-access
+
+import heapq
+import itertools
+import logging
+import socket
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+
+try:
+    import selectors
+except ImportError:
+    import selectors2 as selectors  # type: ignore
+
+import websocket
+
+# Max number of websocket handshakes done at the same time
+DEFAULT_CONNECT_WORKERS = 4
+# Timeout (seconds) of a websocket handshake
+DEFAULT_CONNECT_TIMEOUT = 10
+# Delay (seconds) before reconnecting a lost or failed websocket
+DEFAULT_RECONNECT_DELAY = 10
+
+# Max number of worker threads of a listener dispatcher
+DEFAULT_DISPATCH_WORKERS = 4
+# Max number of events waiting for a listener
+DEFAULT_MAX_PENDING = 100
+
+# Policies of a listener dispatcher when a listener queue is full
+# Keep the queued events, discard the new one
+DROP_NEWEST = 'drop_newest'
+# Discard the oldest queued event, queue the new one
+DROP_OLDEST = 'drop_oldest'
+# Replace the newest queued event by the new one: listeners receive full
+# states, so the latest value supersedes the previous ones
+COALESCE = 'coalesce'
+
+# Window (seconds) during which updates of the same type are coalesced
+DEFAULT_COALESCE_WINDOW = 0.05
+
+# Max wait (seconds) for the end of a frame once its first bytes are read.
+# The frame buffer of websocket-client keeps partial frames, so a timeout
+# only postpones the end of the read to the next select.
+_FRAME_TIMEOUT = 0.05
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _socketpair():
+    """Return a pair of connected sockets, used to wake up the hub."""
+    if hasattr(socket, 'socketpair'):
+        return socket.socketpair()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        client = socket.create_connection(server.getsockname())
+        connection = server.accept()[0]
+    finally:
+        server.close()
+    return connection, client
+
+
+class _Registration:
+    """State of a device registered in a hub."""
+
+    def __init__(self, device):
+        self.device = device
+        self.web_socket = None
+        self.sock = None
+        self.retry_at = None
+
+
+class NotificationHub:
+    """Websocket notifications of many devices on a single thread.
+
+    All the websockets are read by one thread waiting on a selector, instead
+    of one thread per device. Handshakes are done by a small pool of
+    ``connect_workers`` threads so an unreachable device doesn't delay the
+    notifications of the other ones. Lost or failed websockets are
+    reconnected after ``reconnect_delay`` seconds.
+
+    Devices are registered with
+    :meth:`libsoundtouch.device.SoundTouchDevice.start_notification`::
+
+        hub = NotificationHub()
+        for device in devices:
+            device.start_notification(hub=hub)
+
+    Listeners are called from the hub thread: they should not block.
+    """
+
+    def __init__(self, connect_workers=DEFAULT_CONNECT_WORKERS,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 reconnect_delay=DEFAULT_RECONNECT_DELAY):
+        """Create a new notification hub.
+
+        :param connect_workers: Max number of handshakes done at the same
+            time. Default 4
+        :param connect_timeout: Timeout (seconds) of a handshake. Default 10
+        :param reconnect_delay: Delay (seconds) before reconnecting a lost
+            or failed websocket. None to not reconnect. Default 10
+        """
+        self._connect_workers = connect_workers
+        self._connect_timeout = connect_timeout
+        self._reconnect_delay = reconnect_delay
+        self._registrations = {}
+        self._commands = deque()
+        self._lock = Lock()
+        self._closed = False
+        self._selector = None
+        self._executor = None
+        self._thread = None
+        self._wakeup_reader = None
+        self._wakeup_writer = None
+
+    @property
+    def devices(self):
+        """Devices registered in the hub."""
+        with self._lock:
+            return [registration.device for registration
+                    in self._registrations.values()]
+
+    def _start(self):
+        """Start the hub thread. Must be called with the lock held."""
+        if self._thread is not None:
+            return
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = _socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._executor = ThreadPoolExecutor(self._connect_workers)
+        self._thread = Thread(target=self._run, name='NotificationHub')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _send_command(self, command, registration, web_socket):
+        """Queue a command for the hub thread and wake it up."""
+        self._commands.append((command, registration, web_socket))
+        try:
+            self._wakeup_writer.send(b'\0')
+        except socket.error:
+            # Wake up buffer full: the hub thread is already woken up
+            pass
+
+    def register(self, device):
+        """Connect the websocket of a device and dispatch its notifications.
+
+        :param device: SoundTouchDevice. Registering it twice does nothing
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Notification hub is closed")
+            if device in self._registrations:
+                return
+            self._start()
+            registration = _Registration(device)
+            self._registrations[device] = registration
+            self._executor.submit(self._connect, registration)
+
+    def unregister(self, device):
+        """Close the websocket of a device."""
+        with self._lock:
+            registration = self._registrations.pop(device, None)
+            if registration is not None:
+                self._send_command('remove', registration, None)
+
+    def close(self):
+        """Close all the websockets and stop the hub thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._registrations.clear()
+            if self._thread is None:
+                return
+            self._executor.shutdown(wait=False)
+            self._send_command('close', None, None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _connect(self, registration):
+        """Do the websocket handshake of a device (connect worker)."""
+        device = registration.device
+        url = "ws://{0}:{1}/".format(device.host, device.ws_port)
+        try:
+            web_socket = websocket.create_connection(
+                url, timeout=self._connect_timeout, subprotocols=['gabbo'])
+            web_socket.settimeout(_FRAME_TIMEOUT)
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.debug("Notifications connection to %s failed: %s",
+                          device.host, exception)
+            web_socket = None
+        with self._lock:
+            if not self._closed:
+                self._send_command(
+                    'connected' if web_socket else 'failed', registration,
+                    web_socket)
+                return
+        if web_socket is not None:
+            web_socket.close()
+
+    def _is_registered(self, registration):
+        with self._lock:
+            return self._registrations.get(
+                registration.device) is registration
+
+    def _run(self):
+        """Read the websockets (hub thread)."""
+        while True:
+            for key, _ in self._selector.select(self._select_timeout()):
+                if key.fileobj is self._wakeup_reader:
+                    self._drain_wakeup()
+                else:
+                    self._read(key.data)
+            if not self._process_commands():
+                break
+            self._reconnect()
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                self._disconnect(key.data)
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _select_timeout(self):
+        retry_times = [registration.retry_at for registration
+                       in list(self._registrations.values())
+                       if registration.retry_at is not None]
+        if not retry_times:
+            return None
+        return max(min(retry_times) - time.time(), 0)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def _process_commands(self):
+        """Apply the queued commands.
+
+        :return: False if the hub is closed
+        """
+        while self._commands:
+            command, registration, web_socket = self._commands.popleft()
+            if command == 'close':
+                return False
+            elif command == 'remove':
+                self._disconnect(registration)
+                registration.retry_at = None
+            elif command == 'failed':
+                self._schedule_reconnect(registration)
+            elif command == 'connected':
+                if self._is_registered(registration):
+                    registration.web_socket = web_socket
+                    # websocket-client drops its socket when it fails
+                    registration.sock = web_socket.sock
+                    self._selector.register(registration.sock,
+                                            selectors.EVENT_READ,
+                                            registration)
+                    registration.device._on_open()
+                else:
+                    web_socket.close()
+        return True
+
+    def _schedule_reconnect(self, registration):
+        if self._reconnect_delay is not None and \
+                self._is_registered(registration):
+            registration.retry_at = time.time() + self._reconnect_delay
+
+    def _reconnect(self):
+        """Submit the reconnections which are due."""
+        now = time.time()
+        for registration in list(self._registrations.values()):
+            if registration.retry_at is not None and \
+                    registration.retry_at <= now:
+                registration.retry_at = None
+                with self._lock:
+                    if not self._closed:
+                        self._executor.submit(self._connect, registration)
+
+    def _disconnect(self, registration):
+        """Close the websocket of a device, if connected."""
+        web_socket = registration.web_socket
+        if web_socket is None:
+            return
+        registration.web_socket = None
+        self._selector.unregister(registration.sock)
+        registration.sock = None
+        try:
+            web_socket.close(timeout=0)
+        except Exception:  # pylint: disable=broad-except
+            pass
+        registration.device._on_close()
+
+    def _read(self, registration):
+        """Read a frame of a readable websocket and dispatch it."""
+        device = registration.device
+        try:
+            opcode, frame = registration.web_socket.recv_data_frame(True)
+        except websocket.WebSocketTimeoutException:
+            # Partial frame, the end is read on the next select
+            return
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.debug("Notifications lost on %s: %s", device.host,
+                          exception)
+            self._disconnect(registration)
+            self._schedule_reconnect(registration)
+            return
+        if opcode == websocket.ABNF.OPCODE_CLOSE:
+            self._disconnect(registration)
+            self._schedule_reconnect(registration)
+        elif opcode == websocket.ABNF.OPCODE_TEXT:
+            try:
+                device._on_message(None, frame.data.decode('utf-8'))
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Notification of %s failed", device.host)
+
+
+class ListenerDispatcher:
+    """Call the device listeners on worker threads.
+
+    Without dispatcher, listeners are called on the notification thread and
+    a slow listener delays the next notifications. Devices created with
+    ``dispatcher=ListenerDispatcher()`` queue the events instead, and the
+    dispatcher delivers them from an executor.
+
+    Each listener of each device has its own queue, bounded to
+    ``max_pending`` events, and receives its events in order, one at a time.
+    When a queue is full, ``policy`` decides which event is lost:
+    :data:`DROP_NEWEST`, :data:`DROP_OLDEST` or :data:`COALESCE` (default).
+    A dispatcher can be shared by many devices.
+    """
+
+    def __init__(self, executor=None, max_workers=DEFAULT_DISPATCH_WORKERS,
+                 max_pending=DEFAULT_MAX_PENDING, policy=COALESCE):
+        """Create a new listener dispatcher.
+
+        :param executor: concurrent.futures Executor running the listeners.
+            Default a ThreadPoolExecutor owned by the dispatcher
+        :param max_workers: Max number of worker threads when the executor
+            is created by the dispatcher. Default 4
+        :param max_pending: Max number of events waiting for a listener.
+            Default 100
+        :param policy: DROP_NEWEST, DROP_OLDEST or COALESCE. Default COALESCE
+        """
+        if policy not in (DROP_NEWEST, DROP_OLDEST, COALESCE):
+            raise ValueError("Unknown dispatch policy: %s" % policy)
+        self._owns_executor = executor is None
+        self._executor = ThreadPoolExecutor(max_workers) \
+            if executor is None else executor
+        self._max_pending = max_pending
+        self._policy = policy
+        self._queues = {}
+        self._pending = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._closed = False
+        self._condition = Condition(Lock())
+
+    @property
+    def pending(self):
+        """Number of events waiting for their listener (queue depth)."""
+        return self._pending
+
+    @property
+    def dropped(self):
+        """Number of events discarded because a listener queue was full."""
+        return self._dropped
+
+    @property
+    def coalesced(self):
+        """Number of events replaced by a newer one (COALESCE policy)."""
+        return self._coalesced
+
+    def dispatch(self, device, listener, value, key=None):
+        """Queue a call of listener(value) for a device.
+
+        :param key: Key of the listener registration, so a listener
+            registered for several events has a queue per event. Default
+            the listener
+        """
+        key = (device, listener if key is None else key)
+        with self._condition:
+            if self._closed:
+                return
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._executor.submit(self._deliver, key, listener, queue)
+            if len(queue) >= self._max_pending:
+                if self._policy == DROP_NEWEST:
+                    self._dropped += 1
+                    return
+                elif self._policy == DROP_OLDEST:
+                    self._dropped += 1
+                    queue.popleft()
+                    self._pending -= 1
+                else:
+                    self._coalesced += 1
+                    queue[-1] = value
+                    return
+            queue.append(value)
+            self._pending += 1
+
+    def _deliver(self, key, listener, queue):
+        """Call a listener with its queued events (worker thread).
+
+        The queue of a listener is registered as long as this task runs, so
+        its events are never delivered concurrently.
+        """
+        device = key[0]
+        while True:
+            with self._condition:
+                if not queue:
+                    del self._queues[key]
+                    self._condition.notify_all()
+                    return
+                value = queue.popleft()
+                self._pending -= 1
+            try:
+                listener(value)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Listener of %s failed", device.host)
+
+    def flush(self, timeout=None):
+        """Wait until all the queued events are delivered.
+
+        :param timeout: Max wait (seconds). Default None (wait forever)
+        :return: True if all the events were delivered
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._queues:
+                remaining = None if deadline is None \
+                    else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self):
+        """Stop accepting events and stop the owned worker threads.
+
+        Events already queued are still delivered.
+        """
+        with self._condition:
+            self._closed = True
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+class EventCoalescer:
+    """Keep only the latest notification per type during a short window.
+
+    Devices created with ``coalescer=EventCoalescer(window)`` hand their
+    update notifications to the coalescer instead of handling them. The
+    first update of a type opens a window of ``window`` seconds; updates of
+    the same type received during the window replace the pending one
+    without being parsed, and the latest one is handled when the window
+    ends. Notifications carry full states (volume, now playing, ...), so
+    only the intermediate values are lost, at the cost of up to ``window``
+    seconds of latency.
+
+    The windows of all the devices are handled by one thread, so a
+    coalescer can be shared by many devices.
+    """
+
+    def __init__(self, window=DEFAULT_COALESCE_WINDOW):
+        """Create a new event coalescer.
+
+        :param window: Coalescing window (seconds). Default 0.05
+        """
+        self._window = window
+        self._pending = {}
+        self._deadlines = []
+        self._sequence = itertools.count()
+        self._received = 0
+        self._coalesced = 0
+        self._closed = False
+        self._thread = None
+        self._condition = Condition(Lock())
+
+    @property
+    def window(self):
+        """Return the coalescing delay in seconds."""
+        return self._window
+
+    @property
+    def received(self):
+        """Number of notifications submitted to the coalescer."""
+        return self._received
+
+    @property
+    def coalesced(self):
+        """Number of notifications replaced by a newer one, never parsed."""
+        return self._coalesced
+
+    def submit(self, device, action, message, handler):
+        """Coalesce a notification.
+
+        :param device: Device which received the notification
+        :param action: Update type of the notification (volumeUpdated, ...)
+        :param message: Raw notification
+        :param handler: Function called with the latest raw notification of
+            this type when the window ends
+        """
+        key = (device, action)
+        with self._condition:
+            if self._closed:
+                return
+            self._received += 1
+            if key in self._pending:
+                self._coalesced += 1
+                self._pending[key] = (message, handler)
+                return
+            self._pending[key] = (message, handler)
+            heapq.heappush(self._deadlines,
+                           (time.time() + self._window,
+                            next(self._sequence), key))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='EventCoalescer')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        """Handle the notifications when their window ends."""
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._deadlines:
+                        delay = self._deadlines[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                    else:
+                        delay = None
+                    self._condition.wait(delay)
+                if self._closed:
+                    return
+                key = heapq.heappop(self._deadlines)[2]
+                message, handler = self._pending.pop(key)
+            try:
+                handler(message)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Notification of %s failed", key[0].host)
+
+    def close(self):
+        """Stop the coalescer thread. Pending notifications are discarded."""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            del self._deadlines[:]
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,273 @@
+"""Poll Bose Soundtouch devices which can't receive notifications."""
+
+# pylint: disable=protected-access
+
+import heapq
+import itertools
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+
+from .utils import Source
+
+# Poll interval (seconds) of a playing or recently changed device
+DEFAULT_ACTIVE_INTERVAL = 2
+# Poll interval (seconds) of a paused or stopped device, or after a failure
+DEFAULT_IDLE_INTERVAL = 10
+# Poll interval (seconds) of a device in standby
+DEFAULT_STANDBY_INTERVAL = 30
+# Delay (seconds) after a change during which a device is polled as active
+DEFAULT_ACTIVE_PERIOD = 30
+# Max number of HTTP requests per second of all the polls
+DEFAULT_MAX_RATE = 10
+# Max number of devices polled at the same time
+DEFAULT_POLL_WORKERS = 4
+# Resources refreshed by each poll
+DEFAULT_RESOURCES = ('status', 'volume')
+
+# Polled resources: refresh method, value and listeners of a device
+_RESOURCES = {
+    'status': ('refresh_status', '_status', '_status_updated_listeners'),
+    'volume': ('refresh_volume', '_volume', '_volume_updated_listeners'),
+    'presets': ('refresh_presets', '_presets', '_presets_updated_listeners'),
+    'zone_status': ('refresh_zone_status', '_zone_status',
+                    '_zone_status_updated_listeners'),
+}
+
+# Play statuses of a playing device
+_PLAYING = ('PLAY_STATE', 'BUFFERING_STATE')
+
+# Random variation of the poll intervals, so polls don't align
+_JITTER = 0.1
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Polled:
+    """State of a device registered in a polling scheduler."""
+
+    def __init__(self, device):
+        self.device = device
+        self.interval = None
+        self.changed_at = None
+
+
+class PollingScheduler:
+    """Poll the devices whose websocket notifications are not available.
+
+    Registered devices are refreshed on worker threads and their listeners
+    (:meth:`add_status_listener`, :meth:`add_volume_listener`, ...) are
+    called when a polled value changes, as with the websocket
+    notifications::
+
+        scheduler = PollingScheduler()
+        for device in devices:
+            device.add_status_listener(status_listener)
+            scheduler.register(device)
+
+    The poll interval of each device follows its activity:
+    ``active_interval`` while it plays or during ``active_period`` seconds
+    after a change, ``standby_interval`` in standby and ``idle_interval``
+    otherwise or after a failed poll. Polls are spread with random phases
+    and, for all the devices, limited to ``max_rate`` HTTP requests per
+    second. Devices whose notification websocket is connected are not
+    polled until it is lost.
+    """
+
+    def __init__(self, resources=DEFAULT_RESOURCES,
+                 active_interval=DEFAULT_ACTIVE_INTERVAL,
+                 idle_interval=DEFAULT_IDLE_INTERVAL,
+                 standby_interval=DEFAULT_STANDBY_INTERVAL,
+                 active_period=DEFAULT_ACTIVE_PERIOD,
+                 max_rate=DEFAULT_MAX_RATE,
+                 max_workers=DEFAULT_POLL_WORKERS):
+        """Create a new polling scheduler.
+
+        :param resources: Resources refreshed by each poll, among 'status',
+            'volume', 'presets' and 'zone_status'. Default status and volume
+        :param active_interval: Poll interval (seconds) of a playing or
+            recently changed device. Default 2
+        :param idle_interval: Poll interval (seconds) of a paused or stopped
+            device, and after a failed poll. Default 10
+        :param standby_interval: Poll interval (seconds) of a device in
+            standby. Default 30
+        :param active_period: Delay (seconds) after a change during which a
+            device is polled every active_interval. Default 30
+        :param max_rate: Max number of HTTP requests per second of all the
+            polls. None for no limit. Default 10
+        :param max_workers: Max number of devices polled at the same time.
+            Default 4
+        """
+        for resource in resources:
+            if resource not in _RESOURCES:
+                raise ValueError("Unknown polled resource: %s" % resource)
+        self._resources = tuple(resources)
+        self._active_interval = active_interval
+        self._idle_interval = idle_interval
+        self._standby_interval = standby_interval
+        self._active_period = active_period
+        self._max_rate = max_rate
+        self._max_workers = max_workers
+        self._polled = {}
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._next_slot = 0
+        self._polls = 0
+        self._errors = 0
+        self._closed = False
+        self._executor = None
+        self._thread = None
+        self._condition = Condition(Lock())
+
+    @property
+    def devices(self):
+        """Devices registered in the scheduler."""
+        with self._condition:
+            return list(self._polled)
+
+    @property
+    def polls(self):
+        """Number of finished polls."""
+        return self._polls
+
+    @property
+    def errors(self):
+        """Number of failed polls."""
+        return self._errors
+
+    def interval(self, device):
+        """Return the current delay (seconds) between polls of a device.
+
+        :return: None if the device was not polled yet
+        """
+        polled = self._polled.get(device)
+        return polled.interval if polled is not None else None
+
+    def register(self, device):
+        """Poll a device and call its listeners on changes.
+
+        :param device: SoundTouchDevice. Registering it twice does nothing
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Polling scheduler is closed")
+            if device in self._polled:
+                return
+            polled = _Polled(device)
+            self._polled[device] = polled
+            # Random phases spread the polls of devices registered together
+            self._push(polled, time.time() +
+                       random.uniform(0, self._active_interval))
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self._max_workers)
+                self._thread = Thread(target=self._run,
+                                      name='PollingScheduler')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unregister(self, device):
+        """Stop polling a device. A running poll is not interrupted."""
+        with self._condition:
+            self._polled.pop(device, None)
+
+    def close(self):
+        """Stop polling all the devices. Running polls are not interrupted."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._polled.clear()
+            del self._schedule[:]
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._executor.shutdown(wait=False)
+
+    def _push(self, polled, due):
+        """Schedule the next poll of a device. Lock must be held."""
+        heapq.heappush(self._schedule, (due, next(self._sequence), polled))
+        self._condition.notify()
+
+    def _is_registered(self, polled):
+        return self._polled.get(polled.device) is polled
+
+    def _run(self):
+        """Submit the polls when they are due and the rate allows them."""
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._schedule:
+                        delay = max(self._schedule[0][0], self._next_slot) \
+                            - time.time()
+                        if delay <= 0:
+                            break
+                    else:
+                        delay = None
+                    self._condition.wait(delay)
+                if self._closed:
+                    return
+                polled = heapq.heappop(self._schedule)[2]
+                if not self._is_registered(polled):
+                    continue
+                if self._max_rate is not None:
+                    # Each poll reserves the time of its requests at max rate,
+                    # so the requests are evenly spaced instead of bursting
+                    self._next_slot = max(self._next_slot, time.time()) + \
+                        len(self._resources) / float(self._max_rate)
+            self._executor.submit(self._poll, polled)
+
+    def _poll(self, polled):
+        """Refresh the resources of a device (worker thread)."""
+        device = polled.device
+        changed = False
+        failed = False
+        if not device.notification_connected:
+            try:
+                for resource in self._resources:
+                    changed = self._refresh(device, resource) or changed
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.debug("Poll of %s failed: %s", device.host, exception)
+                failed = True
+        now = time.time()
+        if changed:
+            polled.changed_at = now
+        interval = self._next_interval(polled, now, failed)
+        with self._condition:
+            self._polls += 1
+            if failed:
+                self._errors += 1
+            if self._is_registered(polled) and not self._closed:
+                polled.interval = interval
+                self._push(polled, now + interval *
+                           random.uniform(1 - _JITTER, 1 + _JITTER))
+
+    @staticmethod
+    def _refresh(device, resource):
+        """Refresh a resource and call the listeners if it changed.
+
+        :return: True if the value changed since the previous known one
+        """
+        refresh, attribute, listeners = _RESOURCES[resource]
+        previous = getattr(device, attribute)
+        getattr(device, refresh)()
+        value = getattr(device, attribute)
+        if value is previous or value == previous:
+            return False
+        device._run_listener(getattr(device, listeners), value)
+        # The first value is not an activity of the device
+        return previous is not None
+
+    def _next_interval(self, polled, now, failed):
+        if failed or polled.device.notification_connected:
+            return self._idle_interval
+        status = polled.device._status
+        if status is not None and status.source == Source.STANDBY.value:
+            return self._standby_interval
+        if status is not None and status.play_status in _PLAYING:
+            return self._active_interval
+        if polled.changed_at is not None and \
+                now - polled.changed_at < self._active_period:
+            return self._active_interval
+        return self._idle_interval
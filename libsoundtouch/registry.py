@@ -0,0 +1,200 @@
+"""Persistent registry of known Bose Soundtouch devices."""
+
+import io
+import json
+import logging
+import os
+import time
+from threading import Lock, Thread
+
+from .device import Config, SoundTouchDevice
+from .fleet import SoundTouchFleet
+
+# Version of the registry file format
+_VERSION = 1
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceRegistry:
+    """Devices and configurations saved in a local JSON file.
+
+    The registry keeps the host, ports and :class:`Config` of each known
+    device, by device ID. Devices can be created from it at startup without
+    discovery nor ``/info`` request, then revalidated in the background::
+
+        registry = DeviceRegistry('devices.json')
+        devices = registry.devices()
+        if not devices:
+            registry.update(discover_devices())
+            registry.save()
+            devices = registry.devices()
+        registry.start_revalidation()
+    """
+
+    def __init__(self, path, max_workers=16, **device_kwargs):
+        """Create a new registry and load its file if it exists.
+
+        :param path: Path of the registry file
+        :param max_workers: Max number of devices revalidated at the same
+            time. Default 16
+        :param device_kwargs: Arguments given to the SoundTouchDevice
+            constructor (timeout, dispatcher, ...)
+        """
+        self._path = os.path.expanduser(path)
+        self._max_workers = max_workers
+        self._device_kwargs = device_kwargs
+        self._entries = {}
+        self._devices = {}
+        self._lock = Lock()
+        self.load()
+
+    @property
+    def path(self):
+        """Return the path of the registry file."""
+        return self._path
+
+    @property
+    def device_ids(self):
+        """Return the IDs of the registered devices."""
+        with self._lock:
+            return list(self._entries)
+
+    def load(self):
+        """Load the registry file. A missing or invalid file is ignored."""
+        try:
+            with io.open(self._path, 'r', encoding='utf-8') as registry_file:
+                data = json.load(registry_file)
+        except (IOError, OSError, ValueError) as exception:
+            _LOGGER.debug("Registry %s not loaded: %s", self._path, exception)
+            return
+        try:
+            if data.get('version') != _VERSION:
+                _LOGGER.warning("Registry %s ignored: unknown version %s",
+                                self._path, data.get('version'))
+                return
+            entries = dict((entry['config']['device_id'], entry)
+                           for entry in data.get('devices', []))
+        except (KeyError, TypeError, AttributeError) as exception:
+            _LOGGER.debug("Registry %s not loaded: invalid content %r",
+                          self._path, exception)
+            return
+        with self._lock:
+            self._entries = entries
+            self._devices = {}
+
+    def save(self):
+        """Write the registry file.
+
+        The file is written next to the registry then renamed, so an
+        interrupted write never corrupts the registry.
+        """
+        with self._lock:
+            data = {'version': _VERSION,
+                    'devices': sorted(self._entries.values(),
+                                      key=lambda entry: entry['host'])}
+        directory = os.path.dirname(os.path.abspath(self._path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temporary_path = self._path + '.tmp'
+        content = json.dumps(data, separators=(',', ':'))
+        with io.open(temporary_path, 'w', encoding='utf-8') as registry_file:
+            # json.dumps returns ASCII bytes on Python 2
+            registry_file.write(u'' + content)
+        if hasattr(os, 'replace'):
+            os.replace(temporary_path, self._path)
+        else:
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(temporary_path, self._path)
+
+    def update(self, devices):
+        """Register devices or update their entries.
+
+        :param devices: SoundTouchDevice list. Their config is loaded if
+            needed
+        """
+        now = time.time()
+        with self._lock:
+            for device in devices:
+                config = device.config
+                self._entries[config.device_id] = {
+                    'host': device.host,
+                    'port': device.port,
+                    'ws_port': device.ws_port,
+                    'validated_at': now,
+                    'config': config.to_dict()}
+                self._devices[config.device_id] = device
+
+    def remove(self, device_id):
+        """Unregister a device."""
+        with self._lock:
+            self._entries.pop(device_id, None)
+            self._devices.pop(device_id, None)
+
+    def config(self, device_id):
+        """Return the saved Config of a device, None if unknown."""
+        with self._lock:
+            entry = self._entries.get(device_id)
+        return Config.from_dict(entry['config']) if entry else None
+
+    def validated_at(self, device_id):
+        """Return when the device was last validated (timestamp)."""
+        with self._lock:
+            entry = self._entries.get(device_id)
+        return entry['validated_at'] if entry else None
+
+    def device(self, device_id):
+        """Return the device with this ID, None if unknown.
+
+        The device is created from the saved entry, without HTTP request,
+        and the same instance is returned by the next calls.
+        """
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None and device_id in self._entries:
+                entry = self._entries[device_id]
+                device = SoundTouchDevice(
+                    entry['host'], entry['port'], entry['ws_port'],
+                    config=Config.from_dict(entry['config']),
+                    **self._device_kwargs)
+                self._devices[device_id] = device
+            return device
+
+    def devices(self):
+        """Return all the registered devices, created by :meth:`device`."""
+        return [self.device(device_id) for device_id in self.device_ids]
+
+    def revalidate(self, save=True):
+        """Reload the config of all the registered devices.
+
+        Devices which answer get their entry updated. The other ones are
+        kept: they may be powered off.
+
+        :param save: Save the registry afterwards. Default True
+        :return: FleetResult of the config reloads
+        """
+        devices = self.devices()
+        fleet = SoundTouchFleet(devices, max_workers=self._max_workers)
+        try:
+            result = fleet.refresh_config()
+        finally:
+            fleet.close()
+        self.update(result.results)
+        for device, exception in result.errors.items():
+            _LOGGER.info("Device %s not revalidated: %s", device.host,
+                         exception)
+        if save:
+            self.save()
+        return result
+
+    def start_revalidation(self, save=True):
+        """Run :meth:`revalidate` in a background thread.
+
+        :return: The started thread
+        """
+        thread = Thread(target=self.revalidate, args=(save,),
+                        name='DeviceRegistry')
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -2,9 +2,14 @@
 
 import logging
 import socket
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 from enum import Enum
 
+# Max number of discovered services resolved at the same time
+DEFAULT_RESOLVE_WORKERS = 8
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -75,19 +80,39 @@ class Type(Enum):
 
 
 class SoundtouchDeviceListener(object):
-    """Message listener."""
+    """Message listener.
+
+    Services are resolved, and the callback called, on a pool of worker
+    threads instead of the zeroconf thread. A service announced again while
+    it is known is ignored.
+    """
 
-    def __init__(self, add_device_function):
+    def __init__(self, add_device_function,
+                 max_workers=DEFAULT_RESOLVE_WORKERS,
+                 remove_device_function=None):
         """Create a new message listener.
 
-        :param add_device_function: Callback function
+        :param add_device_function: Callback function, called with the
+            device name, host and port
+        :param max_workers: Max number of services resolved at the same
+            time. Default 8
+        :param remove_device_function: Callback function, called with the
+            device name when its service is removed. Default None
         """
         self.add_device_function = add_device_function
+        self.remove_device_function = remove_device_function
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._names = set()
+        self._lock = Lock()
 
     def remove_service(self, zeroconf, device_type, name):
-        # pylint: disable=unused-argument,no-self-use
+        # pylint: disable=unused-argument
         """Remove listener."""
         _LOGGER.info("Service %s removed", name)
+        with self._lock:
+            self._names.discard(name)
+        if self.remove_device_function is not None:
+            self.remove_device_function(name.split(".")[0])
 
     def add_service(self, zeroconf, device_type, name):
         """Add device.
@@ -96,7 +121,44 @@ class SoundtouchDeviceListener(object):
         :param device_type: Service type
         :param name: Device name
         """
+        with self._lock:
+            if name in self._names:
+                _LOGGER.debug("Service %s already known", name)
+                return
+            self._names.add(name)
+        self._executor.submit(self._resolve, zeroconf, device_type, name)
+
+    def update_service(self, zeroconf, device_type, name):
+        """Resolve again a service which changed (address, ...).
+
+        :param zeroconf: MSDNS object
+        :param device_type: Service type
+        :param name: Device name
+        """
+        with self._lock:
+            self._names.add(name)
+        self._executor.submit(self._resolve, zeroconf, device_type, name)
+
+    def _resolve(self, zeroconf, device_type, name):
+        """Resolve a service and call the callback (worker thread)."""
         device_name = (name.split(".")[0])
-        info = zeroconf.get_service_info(device_type, name)
-        address = socket.inet_ntoa(info.address)
-        self.add_device_function(device_name, address, info.port)
+        try:
+            info = zeroconf.get_service_info(device_type, name)
+            if info is None:
+                raise ValueError("no answer")
+            # zeroconf >= 0.24 lists the addresses, IPv6 ones included
+            addresses = [address for address
+                         in getattr(info, 'addresses', None) or []
+                         if len(address) == 4]
+            address = socket.inet_ntoa(
+                addresses[0] if addresses else info.address)
+            self.add_device_function(device_name, address, info.port)
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.warning("Service %s not resolved: %s", name, exception)
+            # Resolved again on the next announcement
+            with self._lock:
+                self._names.discard(name)
+
+    def close(self):
+        """Stop the worker threads. Running resolutions are not interrupted."""
+        self._executor.shutdown(wait=False)
@@ -7,9 +7,15 @@ REQUIRES = [
     'requests>=2,<3',
     'enum-compat>=0.0.2',
     'websocket-client>=0.40.0',
-    'zeroconf>=0.19.1'
+    'zeroconf>=0.19.1',
+    'futures>=3.0; python_version < "3"',
+    'selectors2>=2.0; python_version < "3.4"'
 ]
 
+EXTRAS_REQUIRE = {
+    'aio': ['aiohttp>=3.0; python_version >= "3.5"'],
+}
+
 PROJECT_CLASSIFIERS = [
     'Intended Audience :: Developers',
     'License :: OSI Approved :: Apache Software License',
@@ -35,6 +41,7 @@ setup(
     zip_safe=True,
     platforms='any',
     install_requires=REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
     test_suite='tests',
     keywords=['bose', 'soundtouch'],
     classifiers=PROJECT_CLASSIFIERS,
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import codecs
+import logging
+import socket
+
+from aiohttp import web
+from aiohttp.test_utils import AioHTTPTestCase
+
+from libsoundtouch.aio import AsyncSoundTouchDevice, async_soundtouch_device
+from libsoundtouch.device import NoExistingZoneException
+from libsoundtouch.metrics import DeviceMetrics
+from libsoundtouch.utils import Source
+
+
+def _read(path):
+    codecs_open = codecs.open(path, "r", "utf-8")
+    try:
+        return codecs_open.read()
+    finally:
+        codecs_open.close()
+
+
+INFO = """<?xml version="1.0" encoding="UTF-8" ?>
+<info deviceID="00112233445566">
+    <name>Home</name>
+    <type>SoundTouch 20</type>
+    <networkInfo type="SMSC">
+        <macAddress>66554433221100</macAddress>
+        <ipAddress>127.0.0.1</ipAddress>
+    </networkInfo>
+</info>"""
+
+VOLUME = """<?xml version="1.0" encoding="UTF-8" ?>
+<volume deviceID="11223344">
+    <targetvolume>26</targetvolume>
+    <actualvolume>25</actualvolume>
+    <muteenabled>false</muteenabled>
+</volume>"""
+
+
+class TestAsyncSoundTouchDevice(AioHTTPTestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.posts = []
+        self.zone = '<zone />'
+        super(TestAsyncSoundTouchDevice, self).setUp()
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        super(TestAsyncSoundTouchDevice, self).tearDown()
+        logging.disable(logging.NOTSET)
+
+    async def get_application(self):
+        async def xml(payload):
+            return web.Response(text=payload, content_type='text/xml')
+
+        async def info(request):
+            return await xml(INFO)
+
+        async def now_playing(request):
+            return await xml(_read("tests/data/spotify_utf8.xml"))
+
+        async def volume(request):
+            return await xml(VOLUME)
+
+        async def get_zone(request):
+            return await xml(self.zone)
+
+        async def post(request):
+            self.posts.append((request.path, await request.text()))
+            return await xml('<status>/key</status>')
+
+        async def notifications(request):
+            web_socket = web.WebSocketResponse(protocols=('gabbo',))
+            await web_socket.prepare(request)
+            await web_socket.send_str(_read("tests/data/ws_volume.xml"))
+            await web_socket.send_str(_read("tests/data/ws_status.xml"))
+            await web_socket.receive()
+            return web_socket
+
+        app = web.Application()
+        app.router.add_get('/', notifications)
+        app.router.add_get('/info', info)
+        app.router.add_get('/now_playing', now_playing)
+        app.router.add_get('/volume', volume)
+        app.router.add_get('/getZone', get_zone)
+        app.router.add_post('/{action}', post)
+        return app
+
+    async def _device(self):
+        return await async_soundtouch_device(
+            '127.0.0.1', self.server.port, self.server.port,
+            session=self.client.session)
+
+    async def test_create(self):
+        device = await self._device()
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(device.config.device_id, "00112233445566")
+
+    async def test_status_and_volume(self):
+        device = await self._device()
+        status = await device.status()
+        self.assertEqual(status.source, "SPOTIFY")
+        self.assertEqual(status.track, u'Música Urbana')
+        self.assertIs(await device.status(refresh=False), status)
+        volume = await device.volume()
+        self.assertEqual(volume.actual, 25)
+        self.assertEqual(volume.target, 26)
+
+    async def test_keys_and_commands(self):
+        device = await self._device()
+        await device.play()
+        await device.set_volume(10)
+        await device.play_media(Source.INTERNET_RADIO, "4712")
+        self.assertEqual(self.posts[:3], [
+            ('/key', '<key state="press" sender="Gabbo">PLAY</key>'),
+            ('/key', '<key state="release" sender="Gabbo">PLAY</key>'),
+            ('/volume', '<volume>10</volume>')])
+        self.assertEqual(self.posts[3][0], '/select')
+
+    async def test_zone(self):
+        device = await self._device()
+        self.assertIsNone(await device.zone_status())
+        with self.assertRaises(NoExistingZoneException):
+            await device.add_zone_slave([device])
+        self.zone = '<zone master="1111MASTER">' \
+                    '<member ipaddress="127.0.0.2">1111SLAVE</member></zone>'
+        await device.add_zone_slave([device])
+        self.assertEqual(self.posts[0][0], '/addZoneSlave')
+
+    async def test_notifications(self):
+        device = await self._device()
+        volumes = []
+        statuses = []
+        device.add_volume_listener(volumes.append)
+        device.add_status_listener(statuses.append)
+        await device.start_notification()
+        for _ in range(100):
+            if statuses:
+                break
+            await asyncio.sleep(0.01)
+        await device.stop_notification()
+        self.assertEqual(volumes[0].actual, 21)
+        self.assertEqual(statuses[0].track, "Devil We Know")
+
+    async def test_close_owned_session(self):
+        device = AsyncSoundTouchDevice('127.0.0.1', self.server.port)
+        await device.refresh_config()
+        self.assertEqual(device.config.name, "Home")
+        await device.close()
+        self.assertIsNone(device._session)
+
+    async def test_close_after_failed_connect(self):
+        unused = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+        device = AsyncSoundTouchDevice('127.0.0.1', self.server.port, port)
+        await device.start_notification()
+        for _ in range(100):
+            if device._ws_task.done():
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(device._ws_task.done())
+        await device.close()
+        self.assertIsNone(device._ws_task)
+        self.assertIsNone(device._session)
+
+    async def test_metrics(self):
+        metrics = DeviceMetrics()
+        device = await async_soundtouch_device(
+            '127.0.0.1', self.server.port, self.server.port,
+            session=self.client.session, metrics=metrics)
+        await device.volume()
+        await device.play()
+        await device._on_message(_read("tests/data/ws_volume.xml"))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['requests']['GET /info']['count'], 1)
+        self.assertEqual(snapshot['requests']['GET /volume']['parse']
+                         ['count'], 1)
+        self.assertEqual(snapshot['requests']['POST /key']['count'], 2)
+        self.assertEqual(snapshot['websocket']['actions'],
+                         {'volumeUpdated': 1})
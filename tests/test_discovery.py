@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import socket
+import unittest
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue  # type: ignore
+
+try:
+    from mock import Mock, mock
+except ImportError:
+    from unittest import mock
+    from unittest.mock import Mock
+
+from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.discovery import DiscoveryService
+
+INFO = """<?xml version="1.0" encoding="UTF-8" ?>
+<info deviceID="%s">
+    <name>%s</name>
+    <networkInfo type="SMSC">
+        <macAddress>%s</macAddress>
+        <ipAddress>%s</ipAddress>
+    </networkInfo>
+</info>"""
+
+# Device answering on each host: (device ID, name)
+DEVICES = {
+    '192.168.1.1': ("0001", "Kitchen"),
+    '192.168.1.2': ("0002", "Bedroom"),
+    '192.168.1.3': ("0001", "Kitchen"),
+}
+
+
+def _mocked_info(*args, **kwargs):
+    host = args[0].split('/')[2].split(':')[0]
+    device_id, name = DEVICES[host]
+    return Mock(content=(INFO % (device_id, name, device_id, host)).encode(
+        'utf-8'))
+
+
+def _service_info(host):
+    info = Mock()
+    info.addresses = [socket.inet_aton(host)]
+    info.port = 8090
+    return info
+
+
+class TestDiscoveryService(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.events = Queue()
+        self.addresses = {}
+        self.zeroconf = Mock()
+        self.zeroconf.get_service_info.side_effect = \
+            lambda device_type, name: _service_info(self.addresses[name])
+        patcher = mock.patch('libsoundtouch.discovery.ServiceBrowser')
+        self.browser = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('requests.Session.get', side_effect=_mocked_info)
+        self.mocked_info = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = DiscoveryService(zeroconf=self.zeroconf)
+        for event in ('added', 'updated', 'removed'):
+            getattr(self.service, 'add_device_%s_listener' % event)(
+                lambda device, event=event: self.events.put((event, device)))
+        self.service.start()
+        self.listener = self.browser.call_args[0][2]
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        self.service.stop()
+        logging.disable(logging.NOTSET)
+
+    def _announce(self, name, host, update=False):
+        self.addresses[name] = host
+        if update:
+            self.listener.update_service(self.zeroconf, '', name)
+        else:
+            self.listener.add_service(self.zeroconf, '', name)
+        return self.events.get(timeout=5)
+
+    def test_added(self):
+        event, device = self._announce('Kitchen._soundtouch', '192.168.1.1')
+        self.assertEqual(event, 'added')
+        self.assertEqual(device.config.device_id, '0001')
+        self.assertEqual(device.host, '192.168.1.1')
+        event, device = self._announce('Bedroom._soundtouch', '192.168.1.2')
+        self.assertEqual(event, 'added')
+        self.assertEqual(len(self.service.devices), 2)
+        self.assertIs(self.service.device('0002'), device)
+        self.assertIsNone(self.service.device('0003'))
+
+    def test_ip_change(self):
+        _, device = self._announce('Kitchen._soundtouch', '192.168.1.1')
+        event, updated = self._announce('Kitchen._soundtouch', '192.168.1.3',
+                                        update=True)
+        self.assertEqual(event, 'updated')
+        self.assertIs(updated, device)
+        self.assertEqual(device.host, '192.168.1.3')
+        self.assertEqual(device.config.device_ip, '192.168.1.3')
+        self.assertEqual(self.service.devices, [device])
+
+    def test_removed_and_back(self):
+        _, device = self._announce('Kitchen._soundtouch', '192.168.1.1')
+        self.listener.remove_service(self.zeroconf, '', 'Kitchen._soundtouch')
+        event, removed = self.events.get(timeout=5)
+        self.assertEqual(event, 'removed')
+        self.assertIs(removed, device)
+        self.assertEqual(self.service.devices, [])
+        event, added = self._announce('Kitchen._soundtouch', '192.168.1.3')
+        self.assertEqual(event, 'added')
+        self.assertIs(added, device)
+        self.assertEqual(device.host, '192.168.1.3')
+
+    def test_renamed_service(self):
+        _, device = self._announce('Kitchen._soundtouch', '192.168.1.1')
+        self.listener.remove_service(self.zeroconf, '', 'Kitchen._soundtouch')
+        self.events.get(timeout=5)
+        event, added = self._announce('Cuisine._soundtouch', '192.168.1.1')
+        self.assertEqual(event, 'added')
+        self.assertIs(added, device)
+
+    def test_unchanged_announcement(self):
+        self._announce('Kitchen._soundtouch', '192.168.1.1')
+        self.listener.update_service(self.zeroconf, '', 'Kitchen._soundtouch')
+        self._announce('Bedroom._soundtouch', '192.168.1.2')
+        self.assertTrue(self.events.empty())
+
+    def test_stop(self):
+        self.service.stop()
+        self.browser.return_value.cancel.assert_called_once_with()
+        self.assertEqual(self.zeroconf.close.call_count, 0)
+
+    def test_registry(self):
+        self.service.stop()
+        registry = Mock()
+        device = SoundTouchDevice('192.168.1.1')
+        registry.devices.return_value = [device]
+        self.service = DiscoveryService(zeroconf=self.zeroconf,
+                                        registry=registry)
+        self.service.add_device_added_listener(
+            lambda added: self.events.put(('added', added)))
+        self.service.start()
+        self.listener = self.browser.call_args[0][2]
+        event, added = self._announce('Kitchen._soundtouch', '192.168.1.3')
+        self.assertIs(added, device)
+        self.assertEqual(device.host, '192.168.1.3')
+        registry.update.assert_called_once_with([device])
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+import requests
+
+from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.emulator import SoundTouchEmulator
+from libsoundtouch.fleet import SoundTouchFleet
+from libsoundtouch.notification import NotificationHub
+from libsoundtouch.utils import Source
+
+
+def _wait(predicate):
+    deadline = time.time() + 5
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSoundTouchEmulator(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        self.emulator = SoundTouchEmulator()
+        self.emulated = self.emulator.add_devices(2)
+        self.emulator.start()
+        self.devices = [SoundTouchDevice(emulated.host, emulated.port,
+                                         emulated.ws_port)
+                        for emulated in self.emulated]
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        for device in self.devices:
+            device.close()
+        self.emulator.close()
+
+    def test_config(self):
+        device = self.devices[0]
+        self.assertEqual(device.config.device_id,
+                         self.emulated[0].device_id)
+        self.assertEqual(device.config.name, 'Emulated 1')
+        self.assertEqual(device.config.device_ip, '127.0.0.1')
+        self.assertEqual(self.emulator.device(device.config.device_id),
+                         self.emulated[0])
+
+    def test_commands(self):
+        device = self.devices[0]
+        self.assertEqual(device.status().source, 'STANDBY')
+        device.power_on()
+        self.assertEqual(device.status().play_status, 'PLAY_STATE')
+        device.pause()
+        self.assertEqual(device.status().play_status, 'PAUSE_STATE')
+        device.set_volume(42)
+        self.assertEqual(device.volume().actual, 42)
+        device.mute()
+        self.assertTrue(device.volume().muted)
+        presets = device.presets()
+        self.assertEqual(len(presets), 6)
+        device.select_preset(presets[1])
+        self.assertEqual(device.status().content_item.name, 'Playlist 2')
+        device.play_media(Source.INTERNET_RADIO, '4712')
+        self.assertEqual(device.status().source, 'INTERNET_RADIO')
+        device.power_off()
+        self.assertEqual(device.status().source, 'STANDBY')
+        self.assertEqual(self.emulated[0].source, 'STANDBY')
+
+    def test_zone(self):
+        master, slave = self.devices
+        self.assertIsNone(master.zone_status())
+        master.create_zone([slave])
+        zone = master.zone_status()
+        self.assertTrue(zone.is_master)
+        self.assertEqual(zone.master_id, master.config.device_id)
+        self.assertEqual(len(zone.slaves), 1)
+        self.assertFalse(slave.zone_status().is_master)
+        master.remove_zone_slave([slave])
+        self.assertIsNone(master.zone_status())
+        self.assertIsNone(slave.zone_status())
+
+    def test_notifications(self):
+        device = self.devices[0]
+        volumes = []
+        device.add_volume_listener(volumes.append)
+        hub = NotificationHub()
+        try:
+            device.start_notification(hub=hub)
+            self.assertTrue(_wait(lambda: self.emulated[0].clients == 1))
+            self.emulated[0].set_volume(33)
+            self.assertTrue(_wait(lambda: volumes))
+            self.assertEqual(volumes[0].actual, 33)
+        finally:
+            hub.close()
+        self.assertTrue(_wait(lambda: self.emulated[0].clients == 0))
+
+    def test_random_events(self):
+        self.emulator.close()
+        self.emulator = SoundTouchEmulator(event_interval=0.01, seed=1)
+        emulated = self.emulator.add_device()
+        self.emulator.start()
+        self.assertTrue(_wait(lambda: emulated.events >= 5))
+
+    def test_latency_and_failures(self):
+        self.emulator.close()
+        self.emulator = SoundTouchEmulator(latency=0.05, failure_rate=0.5,
+                                           seed=3)
+        self.emulator.add_devices(8)
+        self.emulator.start()
+        devices = [SoundTouchDevice(emulated.host, emulated.port,
+                                    emulated.ws_port, lazy=True)
+                   for emulated in self.emulator.devices]
+        self.devices.extend(devices)
+        fleet = SoundTouchFleet(devices, max_workers=8)
+        try:
+            start = time.time()
+            result = fleet.refresh_status()
+            self.assertGreaterEqual(time.time() - start, 0.05)
+        finally:
+            fleet.close()
+        self.assertEqual(len(result.results) + len(result.errors), 8)
+        self.assertTrue(result.errors)
+        for exception in result.errors.values():
+            self.assertIsInstance(exception, requests.ConnectionError)
+
+    def test_unknown_request(self):
+        emulated = self.emulated[0]
+        response = requests.get(
+            'http://%s:%d/unknown' % (emulated.host, emulated.port))
+        self.assertEqual(response.status_code, 404)
+        # /info of the device creation, then /unknown
+        self.assertEqual(emulated.requests, 2)
+
+    def test_invalid_volume(self):
+        emulated = self.emulated[0]
+        url = 'http://%s:%d/volume' % (emulated.host, emulated.port)
+        for body in ('<volume>loud</volume>', '<volume/>'):
+            response = requests.post(url, body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(b'CLIENT_XML_ERROR', response.content)
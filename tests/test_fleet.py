@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+import unittest
+
+try:
+    from mock import Mock
+except ImportError:
+    from unittest.mock import Mock
+
+from libsoundtouch import SoundTouchFleet
+from libsoundtouch.device import DeviceTimeoutException, \
+    NoExistingPresetException
+
+
+def _device(host, status=None, side_effect=None):
+    device = Mock()
+    device.host = host
+    device.status.return_value = status
+    device.status.side_effect = side_effect
+    return device
+
+
+def _preset(preset_id):
+    preset = Mock()
+    preset.preset_id = preset_id
+    return preset
+
+
+class TestSoundTouchFleet(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        logging.disable(logging.NOTSET)
+
+    def test_devices(self):
+        device1 = _device("192.168.1.1")
+        device2 = _device("192.168.1.2")
+        fleet = SoundTouchFleet([device1])
+        fleet.add_device(device2)
+        self.assertEqual(fleet.devices, [device1, device2])
+        fleet.remove_device(device1)
+        fleet.remove_device(device1)
+        self.assertEqual(fleet.devices, [device2])
+
+    def test_refresh_status(self):
+        device1 = _device("192.168.1.1", "status1")
+        device2 = _device("192.168.1.2", side_effect=IOError())
+        fleet = SoundTouchFleet([device1, device2])
+        result = fleet.refresh_status()
+        fleet.close()
+        self.assertFalse(result.succeeded)
+        self.assertEqual(result.results, {device1: "status1"})
+        self.assertEqual(list(result.errors), [device2])
+        self.assertIsInstance(result.errors[device2], IOError)
+
+    def test_refresh_in_parallel(self):
+        barrier = []
+        lock = threading.Lock()
+        all_started = threading.Event()
+
+        def status():
+            with lock:
+                barrier.append(1)
+                if len(barrier) == 4:
+                    all_started.set()
+            # Only completes if the 4 devices are refreshed concurrently
+            self.assertTrue(all_started.wait(2))
+            return "ok"
+
+        devices = [_device("192.168.1.%i" % i, side_effect=status)
+                   for i in range(4)]
+        fleet = SoundTouchFleet(devices, max_workers=4)
+        result = fleet.refresh_status()
+        fleet.close()
+        self.assertTrue(result.succeeded)
+        self.assertEqual(len(result.results), 4)
+
+    def test_bounded_parallelism(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def status():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        devices = [_device("192.168.1.%i" % i, side_effect=status)
+                   for i in range(6)]
+        fleet = SoundTouchFleet(devices, max_workers=2)
+        result = fleet.refresh_status()
+        fleet.close()
+        self.assertEqual(len(result.results), 6)
+        self.assertLessEqual(max(max_running), 2)
+
+    def test_timeout(self):
+        release = threading.Event()
+        device1 = _device("192.168.1.1", "status1")
+        device2 = _device("192.168.1.2",
+                          side_effect=lambda: release.wait(5))
+        fleet = SoundTouchFleet([device1, device2], timeout=0.1)
+        start = time.time()
+        result = fleet.refresh_status()
+        self.assertLess(time.time() - start, 2)
+        release.set()
+        fleet.close()
+        self.assertEqual(result.results, {device1: "status1"})
+        self.assertIsInstance(result.errors[device2], DeviceTimeoutException)
+
+    def test_refresh_config(self):
+        device1 = _device("192.168.1.1")
+        device2 = _device("192.168.1.2")
+        device2.refresh_config.side_effect = IOError()
+        fleet = SoundTouchFleet([device1, device2])
+        result = fleet.refresh_config()
+        fleet.close()
+        self.assertEqual(result.results, {device1: device1.config})
+        self.assertIsInstance(result.errors[device2], IOError)
+        device1.refresh_config.assert_called_once_with()
+
+    def test_commands(self):
+        device1 = _device("192.168.1.1")
+        device2 = _device("192.168.1.2")
+        fleet = SoundTouchFleet([device1, device2])
+        self.assertTrue(fleet.set_volume(20).succeeded)
+        self.assertTrue(fleet.power_off([device2]).succeeded)
+        fleet.close()
+        device1.set_volume.assert_called_once_with(20)
+        device2.set_volume.assert_called_once_with(20)
+        self.assertEqual(device1.power_off.call_count, 0)
+        self.assertEqual(device2.power_off.call_count, 1)
+
+    def test_select_preset(self):
+        device1 = _device("192.168.1.1")
+        device1.presets.return_value = [_preset("1"), _preset("2")]
+        device2 = _device("192.168.1.2")
+        device2.presets.return_value = [_preset("1")]
+        fleet = SoundTouchFleet([device1, device2])
+        result = fleet.select_preset(2)
+        fleet.close()
+        self.assertEqual(list(result.results), [device1])
+        device1.select_preset.assert_called_once_with(
+            device1.presets.return_value[1])
+        self.assertIsInstance(result.errors[device2],
+                              NoExistingPresetException)
@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import threading
 import unittest
 import time
 
 import libsoundtouch
 from libsoundtouch.device import NoSlavesException, NoExistingZoneException, \
-    Preset, Config, SoundTouchDevice
-from libsoundtouch.utils import Source, Type
+    Preset, Config, SoundTouchDevice, _SingleFlight
+from libsoundtouch.utils import Source, Type, SoundtouchDeviceListener
 import logging
 import codecs
 
@@ -16,7 +17,7 @@ except ImportError:
     from unittest import mock
     from unittest.mock import Mock
 
-from xml.dom import minidom
+from xml.etree import ElementTree
 from requests.models import Response
 import zeroconf
 
@@ -32,20 +33,9 @@ class MockResponse(Response):
 
 
 class MockDevice(SoundTouchDevice):
-    def __init__(self, host, port=8090):
-        self._host = host
-        self._port = port
-        self._zone_status = None
-        self._config = None
-        self._status = None
-        self._volume = None
-        self._presets = None
-        self._ws_port = 8080
-        self._volume_updated_listeners = []
-        self._status_updated_listeners = []
-        self._presets_updated_listeners = []
-        self._zone_status_updated_listeners = []
-        self._device_info_updated_listeners = []
+    def __init__(self, host, port=8090, cache_max_age=None):
+        SoundTouchDevice.__init__(self, host, port, lazy=True,
+                                  cache_max_age=cache_max_age)
 
     def set_base_config(self, ip, id):
         xml = """<?xml version="1.0" encoding="UTF-8" ?>
@@ -55,9 +45,7 @@ class MockDevice(SoundTouchDevice):
         <ipAddress>%s</ipAddress>
     </networkInfo>
 </info>""" % (id, id, ip)
-        dom = minidom.parseString(xml)
-        self._config = Config(dom)
-        pass
+        self._config = Config(ElementTree.fromstring(xml))
 
 
 class MockPreset(Preset):
@@ -458,7 +446,7 @@ class TestLibSoundTouch(unittest.TestCase):
         """Stop everything that was started."""
         logging.disable(logging.NOTSET)
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     def test_init_device(self, mocked_device_info):
         device = libsoundtouch.soundtouch_device("192.168.1.1")
         self.assertEqual(mocked_device_info.call_count, 1)
@@ -476,6 +464,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(device.config.country_code, "GB")
         self.assertEqual(device.config.region_code, "GB")
         self.assertEqual(len(device.config.networks), 2)
+        self.assertIsInstance(device.config.networks, tuple)
+        self.assertIsInstance(device.config.components, tuple)
         self.assertEqual(len(device.config.components), 2)
         self.assertListEqual(
             [component.category for component in device.config.components],
@@ -489,7 +479,8 @@ class TestLibSoundTouch(unittest.TestCase):
              device.config.components],
             ['13.0.9.29919.1889959 epdbuild.trunk.cepeswbldXXX', None])
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info_without_values)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_device_info_without_values)
     def test_init_device_with_none_values(self, mocked_device_info):
         device = libsoundtouch.soundtouch_device("192.168.1.1")
         self.assertEqual(mocked_device_info.call_count, 1)
@@ -503,7 +494,135 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertIsNone(device.config.country_code)
         self.assertIsNone(device.config.region_code)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify)
+    def test_init_device_with_session(self):
+        session = mock.MagicMock()
+        session.get.side_effect = _mocked_device_info
+        session.post.side_effect = _mocked_play
+        device = SoundTouchDevice("192.168.1.1", session=session)
+        self.assertEqual(device.config.name, "Home")
+        device.play()
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(session.post.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_init_device_lazy(self, mocked_device_info):
+        device = SoundTouchDevice("192.168.1.1", lazy=True)
+        self.assertEqual(mocked_device_info.call_count, 0)
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(device.config.device_id, "00112233445566")
+        self.assertEqual(mocked_device_info.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_init_device_with_config(self, mocked_device_info):
+        config = SoundTouchDevice("192.168.1.1").config
+        device = SoundTouchDevice("192.168.1.1", config=config)
+        self.assertIs(device.config, config)
+        self.assertEqual(mocked_device_info.call_count, 1)
+        device.refresh_config()
+        self.assertEqual(device.config.name, "Home")
+        self.assertEqual(mocked_device_info.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_init_device_pool_size(self, mocked_device_info):
+        device = SoundTouchDevice("192.168.1.1", pool_size=2)
+        adapter = device._session.get_adapter("http://192.168.1.1:8090/")
+        self.assertEqual(adapter._pool_maxsize, 2)
+
+    @mock.patch('requests.Session.close')
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_idle_connections_closed(self, mocked_volume, mocked_close):
+        device = MockDevice("192.168.1.1")
+        device._idle_timeout = 10
+        device.volume()
+        device.volume()
+        self.assertEqual(mocked_close.call_count, 0)
+        device._last_request -= 11
+        device.volume()
+        self.assertEqual(mocked_close.call_count, 1)
+        self.assertEqual(mocked_volume.call_count, 3)
+
+    def test_shared_session_not_closed(self):
+        session = mock.MagicMock()
+        session.get.side_effect = _mocked_device_info
+        device = SoundTouchDevice("192.168.1.1", session=session,
+                                  idle_timeout=10)
+        device._last_request -= 11
+        device.refresh_config()
+        device.close()
+        self.assertEqual(session.get.call_count, 2)
+        self.assertEqual(session.close.call_count, 0)
+
+    def test_concurrent_refreshes(self):
+        started = threading.Event()
+        unblock = threading.Event()
+
+        def get(*args, **kwargs):
+            started.set()
+            unblock.wait(5)
+            return _mocked_status_spotify(*args, **kwargs)
+
+        device = MockDevice("192.168.1.1")
+        statuses = []
+        with mock.patch('requests.Session.get',
+                        side_effect=get) as mocked_get:
+            threads = [threading.Thread(
+                target=lambda: statuses.append(device.status()))
+                for _ in range(5)]
+            threads[0].start()
+            started.wait(5)
+            for thread in threads[1:]:
+                thread.start()
+            # Let the other threads join the in-flight refresh
+            time.sleep(0.1)
+            unblock.set()
+            for thread in threads:
+                thread.join(5)
+            self.assertEqual(mocked_get.call_count, 1)
+            self.assertEqual(len(statuses), 5)
+            self.assertTrue(all(status is statuses[0] for status in statuses))
+            # Not in flight anymore: a new refresh sends a new request
+            device.refresh_status()
+            self.assertEqual(mocked_get.call_count, 2)
+
+    def test_concurrent_refresh_interrupted(self):
+        started = threading.Event()
+        unblock = threading.Event()
+        errors = []
+
+        def interrupted():
+            started.set()
+            unblock.wait(5)
+            raise SystemExit()
+
+        def call(function):
+            try:
+                refreshes.do('/now_playing', function)
+            except BaseException as exception:  # noqa
+                errors.append(type(exception))
+
+        refreshes = _SingleFlight()
+        leader = threading.Thread(target=call, args=(interrupted,))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call, args=(None,))
+        follower.start()
+        time.sleep(0.1)
+        unblock.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertFalse(follower.is_alive())
+        self.assertEqual(errors, [SystemExit, SystemExit])
+
+    @mock.patch('requests.Session.get', side_effect=Exception("Failed"))
+    def test_refresh_error(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        with self.assertRaises(Exception):
+            device.refresh_volume()
+        with self.assertRaises(Exception):
+            device.refresh_volume()
+        self.assertEqual(mocked_get.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_spotify)
     def test_status_spotify(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -542,7 +661,8 @@ class TestLibSoundTouch(unittest.TestCase):
                          "Metallica")
         self.assertEqual(mocked_device_status.call_count, 3)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_spotify_utf8)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_spotify_utf8)
     def test_status_spotify_utf8(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -550,7 +670,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.track, u'Música Urbana')
         self.assertEqual(mocked_device_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_radio)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_radio)
     def test_status_radio(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -570,7 +690,8 @@ class TestLibSoundTouch(unittest.TestCase):
                          "MP3 64 kbps Paris France, Radio du sport")
         self.assertEqual(status.station_location, "Paris France")
 
-    @mock.patch('requests.get', side_effect=_mocked_status_radio_non_ascii)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_radio_non_ascii)
     def test_status_radio_non_ascii(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -588,7 +709,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.station_name, "France Info")
         self.assertEqual(status.station_location, "Paris France")
 
-    @mock.patch('requests.get', side_effect=_mocked_status_stored_music)
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_stored_music)
     def test_status_stored_music(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -598,7 +720,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.content_item.location, "27$2745")
         self.assertIsNone(status.image)
 
-    @mock.patch('requests.get', side_effect=_mocked_status_standby)
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_standby)
     def test_status_standby(self, mocked_device_status):
         device = MockDevice("192.168.1.1")
         status = device.status()
@@ -606,7 +728,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(status.source, "STANDBY")
         self.assertEqual(status.content_item.source, "STANDBY")
 
-    @mock.patch('requests.get', side_effect=_mocked_volume)
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
     def test_volume(self, mocked_volume):
         device = MockDevice("192.168.1.1")
         volume = device.volume()
@@ -615,39 +737,53 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(volume.target, 26)
         self.assertEqual(volume.muted, False)
 
-    @mock.patch('requests.post', side_effect=_mocked_play)
+    @mock.patch('requests.Session.post', side_effect=_mocked_play)
     def test_play(self, mocked_play):
         device = MockDevice("192.168.1.1")
         device.play()
         self.assertEqual(mocked_play.call_count, 2)
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post', side_effect=_mocked_play)
+    def test_play_async_key_release(self, mocked_play):
+        device = MockDevice("192.168.1.1")
+        device._async_key_release = True
+        device.play()
+        device.play()
+        device.close()
+        bodies = [call[0][1] for call in mocked_play.call_args_list]
+        self.assertEqual(bodies, [
+            '<key state="press" sender="Gabbo">PLAY</key>',
+            '<key state="release" sender="Gabbo">PLAY</key>'] * 2)
+
+    @mock.patch('requests.Session.post',
                 side_effect=_mocked_play_media_without_account)
     def test_play_media_without_account(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.INTERNET_RADIO, "4712")
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_media_with_account)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_play_media_with_account)
     def test_play_media_with_account(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.SPOTIFY, "uri_track", "spot_user_id")
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_media_with_type)
+    @mock.patch('requests.Session.post',
+                side_effect=_mocked_play_media_with_type)
     def test_play_media_with_type(self, mocked_play_media):
         device = MockDevice("192.168.1.1")
         device.play_media(Source.LOCAL_MUSIC, "album:1", "account_id",
                           Type.ALBUM)
         self.assertEqual(mocked_play_media.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_pause)
+    @mock.patch('requests.Session.post', side_effect=_mocked_pause)
     def test_pause(self, mocked_pause):
         device = MockDevice("192.168.1.1")
         device.pause()
         self.assertEqual(mocked_pause.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_play_pause)
+    @mock.patch('requests.Session.post', side_effect=_mocked_play_pause)
     def test_play_plause(self, mocked_play_pause):
         device = MockDevice("192.168.1.1")
         device.play_pause()
@@ -655,7 +791,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_on(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -666,7 +802,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_on_if_already_on(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -677,7 +813,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_off(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -688,7 +824,7 @@ class TestLibSoundTouch(unittest.TestCase):
 
     @mock.patch('libsoundtouch.SoundTouchDevice.refresh_status',
                 side_effect=None)
-    @mock.patch('requests.post', side_effect=_mocked_power)
+    @mock.patch('requests.Session.post', side_effect=_mocked_power)
     def test_power_off_if_already_off(self, mocked_power, refresh):
         device = MockDevice("192.168.1.1")
         device._status = Mock()
@@ -697,73 +833,110 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_power.call_count, 0)
         self.assertEqual(refresh.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_set_volume)
+    @mock.patch('requests.Session.post', side_effect=_mocked_set_volume)
     def test_set_volume(self, mocked_set_volume):
         device = MockDevice("192.168.1.1")
         device.set_volume(10)
         self.assertEqual(mocked_set_volume.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_volume_up)
+    def test_set_volume_last_write_wins(self):
+        posted = []
+        first_posted = threading.Event()
+        unblock = threading.Event()
+
+        def post(url, body, **kwargs):
+            posted.append(body)
+            first_posted.set()
+            unblock.wait(5)
+
+        device = MockDevice("192.168.1.1")
+        with mock.patch('requests.Session.post', side_effect=post):
+            slider = threading.Thread(target=device.set_volume, args=(10,))
+            slider.start()
+            first_posted.wait(5)
+            # Set while /volume 10 is in flight: only the latest is sent
+            for level in (20, 30):
+                device.set_volume(level, wait=False)
+            waiting = threading.Thread(target=device.set_volume, args=(40,))
+            waiting.start()
+            unblock.set()
+            slider.join(5)
+            waiting.join(5)
+            self.assertFalse(waiting.is_alive())
+            device.close()
+        self.assertEqual(posted, ['<volume>10</volume>',
+                                  '<volume>40</volume>'])
+
+    @mock.patch('requests.Session.post', side_effect=Exception("Failed"))
+    def test_set_volume_error(self, mocked_post):
+        device = MockDevice("192.168.1.1")
+        with self.assertRaises(Exception):
+            device.set_volume(10)
+        device.set_volume(20, wait=False)
+        device.close()
+        self.assertEqual(mocked_post.call_count, 2)
+
+    @mock.patch('requests.Session.post', side_effect=_mocked_volume_up)
     def test_volume_up(self, mocked_volume_up):
         device = MockDevice("192.168.1.1")
         device.volume_up()
         self.assertEqual(mocked_volume_up.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_volume_down)
+    @mock.patch('requests.Session.post', side_effect=_mocked_volume_down)
     def test_volume_down(self, mocked_volume_down):
         device = MockDevice("192.168.1.1")
         device.volume_down()
         self.assertEqual(mocked_volume_down.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_next_track)
+    @mock.patch('requests.Session.post', side_effect=_mocked_next_track)
     def test_next_track(self, mocked_next_track):
         device = MockDevice("192.168.1.1")
         device.next_track()
         self.assertEqual(mocked_next_track.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_previous_track)
+    @mock.patch('requests.Session.post', side_effect=_mocked_previous_track)
     def test_previous_track(self, mocked_previous_track):
         device = MockDevice("192.168.1.1")
         device.previous_track()
         self.assertEqual(mocked_previous_track.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_mute)
+    @mock.patch('requests.Session.post', side_effect=_mocked_mute)
     def test_mute(self, mocked_mute):
         device = MockDevice("192.168.1.1")
         device.mute()
         self.assertEqual(mocked_mute.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_one)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_one)
     def test_repeat_one(self, mocked_repeat_one):
         device = MockDevice("192.168.1.1")
         device.repeat_one()
         self.assertEqual(mocked_repeat_one.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_all)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_all)
     def test_repeat_all(self, mocked_repeat_all):
         device = MockDevice("192.168.1.1")
         device.repeat_all()
         self.assertEqual(mocked_repeat_all.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_repeat_off)
+    @mock.patch('requests.Session.post', side_effect=_mocked_repeat_off)
     def test_repeat_off(self, mocked_repeat_off):
         device = MockDevice("192.168.1.1")
         device.repeat_off()
         self.assertEqual(mocked_repeat_off.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_shuffle_on)
+    @mock.patch('requests.Session.post', side_effect=_mocked_shuffle_on)
     def test_shuffle_on(self, mocked_shuffle):
         device = MockDevice("192.168.1.1")
         device.shuffle(True)
         self.assertEqual(mocked_shuffle.call_count, 2)
 
-    @mock.patch('requests.post', side_effect=_mocked_shuffle_off)
+    @mock.patch('requests.Session.post', side_effect=_mocked_shuffle_off)
     def test_shuffle_off(self, mocked_shuffle):
         device = MockDevice("192.168.1.1")
         device.shuffle(False)
         self.assertEqual(mocked_shuffle.call_count, 2)
 
-    @mock.patch('requests.get', side_effect=_mocked_presets)
+    @mock.patch('requests.Session.get', side_effect=_mocked_presets)
     def test_presets(self, mocked_presets):
         device = MockDevice("192.168.1.1")
         presets = device.presets()
@@ -778,15 +951,23 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(presets[0].source_account, "spotify_account")
         self.assertEqual(presets[0].is_presetable, True)
         self.assertIsNotNone(presets[0].source_xml)
-
-    @mock.patch('requests.post', side_effect=_mocked_select_preset)
+        source_xml = ElementTree.fromstring(presets[4].source_xml)
+        self.assertEqual(source_xml.tag, "ContentItem")
+        self.assertEqual(source_xml.get("location"), "21630")
+        self.assertEqual(source_xml.find("itemName").text,
+                         "RMC Info Talk Sport")
+        self.assertTrue(presets[4].source_xml.endswith("</ContentItem>"))
+        self.assertEqual(presets[4].source, "INTERNET_RADIO")
+        self.assertIsNone(presets[4].type)
+
+    @mock.patch('requests.Session.post', side_effect=_mocked_select_preset)
     def test_select_preset(self, mocked_select_preset):
         device = MockDevice("192.168.1.1")
         preset = MockPreset("<xml>source</xml>")
         device.select_preset(preset)
         self.assertEqual(mocked_select_preset.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_zone_status_master(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         zone_status = device.zone_status()
@@ -798,7 +979,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(zone_status.slaves[0].device_ip, "192.168.1.2")
         self.assertEqual(zone_status.slaves[0].role, "NORMAL")
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_slave)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_slave)
     def test_zone_status_slave(self, mocked_zone_status):
         device = MockDevice("192.168.1.2")
         zone_status = device.zone_status()
@@ -810,14 +991,14 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(zone_status.slaves[0].device_ip, "192.168.1.2")
         self.assertEqual(zone_status.slaves[0].role, "NORMAL")
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_zone_status_none(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         zone_status = device.zone_status()
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertIsNone(zone_status)
 
-    @mock.patch('requests.post', side_effect=_mocked_create_zone)
+    @mock.patch('requests.Session.post', side_effect=_mocked_create_zone)
     def test_create_zone(self, mocked_create_zone):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -831,8 +1012,8 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertRaises(NoSlavesException, device.create_zone,
                           [])
 
-    @mock.patch('requests.post', side_effect=_mocked_remove_slaves)
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.post', side_effect=_mocked_remove_slaves)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_remove_zone_slaves(self, mocked_remove_slave, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -842,7 +1023,7 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertEqual(mocked_remove_slave.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_remove_zone_slave_without_slaves(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoSlavesException,
@@ -850,7 +1031,7 @@ class TestLibSoundTouch(unittest.TestCase):
                           [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_remove_zone_slave_without_zone(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoExistingZoneException,
@@ -858,8 +1039,8 @@ class TestLibSoundTouch(unittest.TestCase):
                           [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.post', side_effect=_mocked_add_slaves)
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.post', side_effect=_mocked_add_slaves)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_add_zone_slaves(self, mocked_add_slaves, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         device.set_base_config("192.168.1.1", "1111MASTER")
@@ -869,14 +1050,14 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(mocked_zone_status.call_count, 1)
         self.assertEqual(mocked_add_slaves.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_add_zone_slaves_without_master(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoSlavesException,
                           device.add_zone_slave, [])
         self.assertEqual(mocked_zone_status.call_count, 1)
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_none)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
     def test_add_zone_slaves_without_zone(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.assertRaises(NoExistingZoneException,
@@ -997,7 +1178,7 @@ class TestLibSoundTouch(unittest.TestCase):
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_zone_status_master)
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_master)
     def test_ws_zone_notification(self, mocked_zone_status):
         device = MockDevice("192.168.1.1")
         self.listener_called = False
@@ -1019,7 +1200,7 @@ class TestLibSoundTouch(unittest.TestCase):
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     def test_ws_info_notification(self, mocked_device_info):
         device = MockDevice("192.168.1.1")
         self.listener_called = False
@@ -1040,7 +1221,7 @@ class TestLibSoundTouch(unittest.TestCase):
         finally:
             codecs_open.close()
 
-    @mock.patch('requests.get', side_effect=_mocked_device_info)
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
     @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
     @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
                 side_effect=_mocked_service_browser)
@@ -1053,3 +1234,368 @@ class TestLibSoundTouch(unittest.TestCase):
         self.assertEqual(len(devices), 1)
         self.assertEqual(devices[0].host, "192.168.1.1")
         self.assertEqual(devices[0].port, 8090)
+
+    @mock.patch('zeroconf.Zeroconf.close')
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_discover_devices_early_exit(self, mocked_service_browser,
+                                         mocked_inet_ntoa, mocked_request_get,
+                                         mocked_close):
+        found = []
+        start = time.time()
+        devices = libsoundtouch.discover_devices(timeout=5, expected_count=1,
+                                                 callback=found.append)
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(len(devices), 1)
+        self.assertEqual(found, devices)
+        self.assertEqual(mocked_close.call_count, 1)
+        start = time.time()
+        devices = libsoundtouch.discover_devices(
+            timeout=5, expected_ids=["00112233445566"])
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(devices[0].config.device_id, "00112233445566")
+        self.assertEqual(mocked_close.call_count, 2)
+
+    @mock.patch('zeroconf.Zeroconf.close')
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    @mock.patch('socket.inet_ntoa', return_value='192.168.1.1')
+    @mock.patch('zeroconf.ServiceBrowser.__init__', return_value=None,
+                side_effect=_mocked_service_browser)
+    def test_iter_devices(self, mocked_service_browser, mocked_inet_ntoa,
+                          mocked_request_get, mocked_close):
+        start = time.time()
+        for device in libsoundtouch.iter_devices(timeout=5):
+            self.assertEqual(device.host, "192.168.1.1")
+            break
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual(mocked_close.call_count, 1)
+
+    def test_listener_concurrent_resolution(self):
+        resolved = []
+        lock = threading.Lock()
+        all_started = threading.Event()
+
+        def get_service_info(device_type, name):
+            with lock:
+                resolved.append(name)
+                if len(resolved) == 4:
+                    all_started.set()
+            # Only completes if the 4 services are resolved concurrently
+            self.assertTrue(all_started.wait(2))
+            service_info = mock.MagicMock()
+            service_info.addresses = [b'\xc0\xa8\x01\x02',
+                                      b'\xfe\x80' + b'\x00' * 14]
+            service_info.port = 8090
+            return service_info
+
+        added = []
+        done = threading.Event()
+
+        def add_device(name, host, port):
+            added.append((name, host, port))
+            if len(added) == 4:
+                done.set()
+
+        mock_zeroconf = mock.MagicMock()
+        mock_zeroconf.get_service_info.side_effect = get_service_info
+        listener = SoundtouchDeviceListener(add_device, max_workers=4)
+        for index in range(4):
+            listener.add_service(mock_zeroconf, '', 'device%i.tcp' % index)
+            listener.add_service(mock_zeroconf, '', 'device%i.tcp' % index)
+        self.assertTrue(done.wait(5))
+        listener.close()
+        self.assertEqual(sorted(added),
+                         [('device%i' % index, '192.168.1.2', 8090)
+                          for index in range(4)])
+        self.assertEqual(len(resolved), 4)
+
+    def test_listener_unresolved_service(self):
+        added = []
+        mock_zeroconf = mock.MagicMock()
+        mock_zeroconf.get_service_info.return_value = None
+        listener = SoundtouchDeviceListener(
+            lambda *args: added.append(args), max_workers=1)
+        listener.add_service(mock_zeroconf, '', 'device.tcp')
+        listener.close()
+        listener._executor.shutdown(wait=True)
+        self.assertEqual(added, [])
+        # Resolved again on the next announcement
+        self.assertNotIn('device.tcp', listener._names)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_cache_disabled(self, mocked_volume):
+        device = MockDevice("192.168.1.1")
+        device._on_open(None)
+        device.volume()
+        device.volume()
+        self.assertEqual(mocked_volume.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_cache_served_from_notifications(self, mocked_volume):
+        device = MockDevice("192.168.1.1", cache_max_age=60)
+        self.assertFalse(device.notification_connected)
+        device.volume()
+        device._on_open(None)
+        self.assertTrue(device.notification_connected)
+        # Refreshed before the connection: notifications may have been missed
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(mocked_volume.call_count, 2)
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(mocked_volume.call_count, 2)
+        codecs_open = codecs.open("tests/data/ws_volume.xml", "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read())
+        finally:
+            codecs_open.close()
+        self.assertEqual(device.volume().actual, 21)
+        self.assertEqual(mocked_volume.call_count, 2)
+        # Socket closed: back to HTTP
+        device._on_close(None, None, None)
+        self.assertFalse(device.notification_connected)
+        self.assertEqual(device.volume().actual, 25)
+        self.assertEqual(mocked_volume.call_count, 3)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_volume)
+    def test_cache_max_age(self, mocked_volume):
+        device = MockDevice("192.168.1.1", cache_max_age=10)
+        device._on_open(None)
+        device.volume()
+        device.volume()
+        self.assertEqual(mocked_volume.call_count, 1)
+        device._updated_at['volume'] -= 11
+        device.volume()
+        self.assertEqual(mocked_volume.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_zone_status_none)
+    def test_cache_zone_status_none(self, mocked_zone_status):
+        device = MockDevice("192.168.1.1", cache_max_age=60)
+        device._on_open(None)
+        self.assertIsNone(device.zone_status())
+        self.assertIsNone(device.zone_status(refresh=False))
+        self.assertEqual(mocked_zone_status.call_count, 1)
+
+    def _ws_message(self, device, path, suffix=""):
+        codecs_open = codecs.open(path, "r", "utf-8")
+        try:
+            device._on_message(None, codecs_open.read() + suffix)
+        finally:
+            codecs_open.close()
+
+    @mock.patch('requests.Session.get')
+    def test_ws_zone_notification_with_payload(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        zones = []
+        device.add_zone_status_listener(zones.append)
+        self._ws_message(device, "tests/data/ws_zone_members.xml")
+        self.assertEqual(mocked_get.call_count, 0)
+        self.assertEqual(zones[0].master_id, "1111MASTER")
+        self.assertEqual(zones[0].master_ip, "192.168.1.1")
+        self.assertEqual([slave.device_ip for slave in zones[0].slaves],
+                         ["192.168.1.2", "192.168.1.3"])
+        self.assertIs(device.zone_status(refresh=False), zones[0])
+        self._ws_message(device, "tests/data/ws_zone_empty.xml")
+        self.assertEqual(mocked_get.call_count, 0)
+        self.assertIsNone(zones[1])
+
+    @mock.patch('requests.Session.get')
+    def test_ws_info_notification_with_payload(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        infos = []
+        device.add_device_info_listener(infos.append)
+        self._ws_message(device, "tests/data/ws_info_full.xml")
+        self.assertEqual(mocked_get.call_count, 0)
+        self.assertIs(device.config, infos[0])
+        self.assertEqual(device.config.name, "Living room")
+        self.assertEqual(device.config.device_ip, "192.168.1.1")
+        self.assertEqual(len(device.config.components), 1)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_device_info)
+    def test_ws_info_notification_incomplete_payload(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        infos = []
+        device.add_device_info_listener(infos.append)
+        device._on_message(None, '<updates deviceID="00112233445566">'
+                                 '<infoUpdated><info deviceID="0011">'
+                                 '<name>Partial</name></info>'
+                                 '</infoUpdated></updates>')
+        self.assertEqual(mocked_get.call_count, 1)
+        self.assertEqual(infos[0].name, "Home")
+
+    def test_model_equality(self):
+        device = MockDevice("192.168.1.1")
+        self._ws_message(device, "tests/data/ws_status.xml")
+        status = device.status(refresh=False)
+        # Same status in another payload
+        self._ws_message(device, "tests/data/ws_status.xml", "\n")
+        self.assertIsNot(device.status(refresh=False), status)
+        self.assertEqual(device.status(refresh=False), status)
+        self.assertFalse(device.status(refresh=False) != status)
+        self.assertEqual(hash(device.status(refresh=False)), hash(status))
+        self.assertEqual(device.status(refresh=False).diff(status), {})
+        self.assertNotEqual(status, None)
+        self.assertNotEqual(status, status.content_item)
+        self._ws_message(device, "tests/data/ws_zone_members.xml")
+        zone_status = device.zone_status(refresh=False)
+        self._ws_message(device, "tests/data/ws_zone_members.xml", "\n")
+        self.assertEqual(device.zone_status(refresh=False), zone_status)
+        self.assertEqual(hash(device.zone_status(refresh=False)),
+                         hash(zone_status))
+        self.assertIsInstance(zone_status.slaves, tuple)
+
+    def test_model_diff(self):
+        device = MockDevice("192.168.1.1")
+        with codecs.open("tests/data/ws_volume.xml", "r", "utf-8") as data:
+            message = data.read()
+        device._on_message(None, message)
+        volume = device.volume(refresh=False)
+        device._on_message(None, message.replace(
+            "<actualvolume>21", "<actualvolume>30"))
+        self.assertEqual(device.volume(refresh=False).diff(volume),
+                         {"actual": (21, 30)})
+        self.assertEqual(volume.diff(None), {"actual": (None, 21),
+                                             "target": (None, 21),
+                                             "muted": (None, False)})
+
+    def test_model_slots(self):
+        device = MockDevice("192.168.1.1")
+        self._ws_message(device, "tests/data/ws_status.xml")
+        status = device.status(refresh=False)
+        self.assertFalse(hasattr(status, "__dict__"))
+        self.assertFalse(hasattr(status.content_item, "__dict__"))
+        with self.assertRaises(AttributeError):
+            status.source = Source.BLUETOOTH.value
+        with self.assertRaises(AttributeError):
+            status.other = 1
+        self._ws_message(device, "tests/data/ws_status.xml", "\n")
+        self.assertIsNot(device.status(refresh=False), status)
+        self.assertIs(device.status(refresh=False).source, status.source)
+        self.assertIs(device.status(refresh=False).play_status,
+                      status.play_status)
+        self.assertIs(status.content_item.source, status.source)
+
+    def test_status_estimated_position(self):
+        device = MockDevice("192.168.1.1")
+        before = time.time()
+        self._ws_message(device, "tests/data/ws_status.xml")
+        status = device.status(refresh=False)
+        self.assertGreaterEqual(status.captured_at, before)
+        self.assertEqual(status.position, 30)
+        self.assertEqual(status.estimated_position(status.captured_at), 30)
+        self.assertEqual(status.estimated_position(status.captured_at + 10),
+                         40)
+        self.assertEqual(status.estimated_position(status.captured_at - 10),
+                         30)
+        self.assertEqual(status.estimated_position(status.captured_at + 500),
+                         201)
+        self.assertGreaterEqual(status.estimated_position(), 30)
+
+    @mock.patch('requests.Session.get',
+                side_effect=_mocked_status_spotify_utf8)
+    def test_estimated_position(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        # Paused
+        self.assertEqual(device.estimated_position(), 44)
+        self.assertEqual(device.estimated_position(max_age=60), 44)
+        self.assertEqual(mocked_get.call_count, 1)
+        self.assertEqual(device.estimated_position(max_age=-1), 44)
+        self.assertEqual(mocked_get.call_count, 2)
+
+    def test_ws_same_payload_reused(self):
+        device = MockDevice("192.168.1.1")
+        statuses = []
+        device.add_status_listener(statuses.append)
+        self._ws_message(device, "tests/data/ws_status.xml")
+        self._ws_message(device, "tests/data/ws_status.xml")
+        self.assertEqual(len(statuses), 2)
+        self.assertIs(statuses[1], statuses[0])
+        self.assertEqual(device.payload_cache_info,
+                         {"hits": 1, "misses": 1})
+        self._ws_message(device, "tests/data/ws_status.xml", "\n")
+        self.assertIsNot(device.status(refresh=False), statuses[0])
+        self.assertEqual(device.payload_cache_info,
+                         {"hits": 1, "misses": 2})
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_status_spotify)
+    def test_refresh_same_payload_reused(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        status = device.status()
+        self.assertIs(device.status(), status)
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(device.payload_cache_info,
+                         {"hits": 1, "misses": 1})
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_presets)
+    def test_reused_presets_not_shared(self, mocked_get):
+        device = MockDevice("192.168.1.1")
+        presets = device.presets()
+        presets.pop()
+        self.assertEqual(len(device.presets()), 6)
+        self.assertEqual(mocked_get.call_count, 2)
+        self.assertEqual(device.payload_cache_info,
+                         {"hits": 1, "misses": 1})
+
+    def test_ws_listeners_changes_only(self):
+        device = MockDevice("192.168.1.1")
+        with codecs.open("tests/data/ws_volume.xml", "r", "utf-8") as data:
+            message = data.read()
+        all_volumes = []
+        changes = []
+        device.add_volume_listener(all_volumes.append)
+        device.add_volume_listener(
+            lambda volume, changed: changes.append(changed),
+            changes_only=True)
+        device._on_message(None, message)
+        device._on_message(None, message)
+        device._on_message(None, message.replace(
+            "<muteenabled>false", "<muteenabled>true"))
+        self.assertEqual(len(all_volumes), 3)
+        self.assertEqual(changes, [{"actual": (None, 21),
+                                    "target": (None, 21),
+                                    "muted": (None, False)},
+                                   {"muted": (False, True)}])
+
+    def test_ws_presets_listener_changes_only(self):
+        device = MockDevice("192.168.1.1")
+        self._ws_message(device, "tests/data/ws_presets.xml")
+        changes = []
+
+        def listener(presets, changed):
+            changes.append(changed)
+
+        device.add_presets_listener(listener, changes_only=True)
+        self._ws_message(device, "tests/data/ws_presets.xml")
+        self.assertEqual(changes, [])
+        device.remove_presets_listener(listener)
+        self.assertEqual(device.presets_updated_listeners, [])
+
+    def test_ws_listener_plain_and_changes_only(self):
+        device = MockDevice("192.168.1.1")
+        volumes = []
+
+        def listener(volume, changed=None):
+            volumes.append(changed)
+
+        device.add_volume_listener(listener, changes_only=True)
+        device.add_volume_listener(listener)
+        listeners = device.volume_updated_listeners
+        self.assertNotEqual(listeners[0], listeners[1])
+        device.remove_volume_listener(listener)
+        self.assertEqual(len(listeners), 1)
+        self.assertIsNot(listeners[0], listener)
+        device.remove_volume_listener(listener)
+        self.assertEqual(listeners, [])
+
+    def test_ws_zone_listener_changes_only(self):
+        device = MockDevice("192.168.1.1")
+        changes = []
+        device.add_zone_status_listener(
+            lambda zone_status, changed: changes.append(changed),
+            changes_only=True)
+        self._ws_message(device, "tests/data/ws_zone_empty.xml")
+        self.assertEqual(changes, [])
+        self._ws_message(device, "tests/data/ws_zone_members.xml")
+        self.assertEqual(changes[0]["master_id"], (None, "1111MASTER"))
+        self._ws_message(device, "tests/data/ws_zone_empty.xml")
+        self.assertEqual(changes[1]["master_id"], ("1111MASTER", None))
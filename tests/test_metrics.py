@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import unittest
+
+import requests
+
+from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.emulator import SoundTouchEmulator
+from libsoundtouch.metrics import DeviceMetrics
+from libsoundtouch.notification import EventCoalescer
+
+
+def _read(name):
+    path = os.path.join(os.path.dirname(__file__), 'data', name)
+    with io.open(path, 'r', encoding='utf-8') as data_file:
+        return data_file.read()
+
+
+class TestDeviceMetrics(unittest.TestCase):
+    def test_histogram(self):
+        metrics = DeviceMetrics(buckets=(0.01, 0.1))
+        metrics.record_request('GET', '/volume', 0.005, 120)
+        metrics.record_request('GET', '/volume', 0.05, 130)
+        metrics.record_request('GET', '/volume', 2, error='ReadTimeout')
+        metrics.record_parse('/volume', 0.0001)
+        endpoint = metrics.snapshot()['requests']['GET /volume']
+        self.assertEqual(endpoint['count'], 3)
+        self.assertEqual(endpoint['errors'], 1)
+        self.assertEqual(endpoint['error_types'], {'ReadTimeout': 1})
+        self.assertEqual(endpoint['response_bytes'], 250)
+        self.assertEqual(endpoint['latency']['buckets'],
+                         {'0.01': 1, '0.1': 2, '+Inf': 3})
+        self.assertEqual(endpoint['latency']['min'], 0.005)
+        self.assertEqual(endpoint['latency']['max'], 2)
+        self.assertAlmostEqual(endpoint['latency']['sum'], 2.055)
+        self.assertEqual(endpoint['parse']['count'], 1)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()['requests'], {})
+
+
+class TestDeviceMetricsHooks(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        self.emulator = SoundTouchEmulator()
+        self.emulated = self.emulator.add_device()
+        self.emulator.start()
+        self.metrics = DeviceMetrics()
+        self.device = SoundTouchDevice(self.emulated.host, self.emulated.port,
+                                       metrics=self.metrics)
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        self.device.close()
+        self.emulator.close()
+
+    def test_requests(self):
+        self.device.volume()
+        self.device.set_volume(30)
+        self.device.play()
+        requests_metrics = self.metrics.snapshot()['requests']
+        self.assertEqual(sorted(requests_metrics), [
+            'GET /info', 'GET /volume', 'POST /key', 'POST /volume'])
+        info = requests_metrics['GET /info']
+        self.assertEqual(info['count'], 1)
+        self.assertEqual(info['errors'], 0)
+        self.assertGreater(info['response_bytes'], 0)
+        self.assertEqual(info['latency']['count'], 1)
+        self.assertEqual(info['parse']['count'], 1)
+        self.assertEqual(requests_metrics['POST /key']['count'], 2)
+        self.assertEqual(requests_metrics['POST /volume']['parse']['count'],
+                         0)
+
+    def test_errors(self):
+        # pylint: disable=protected-access
+        self.emulator._failure_rate = 1
+        with self.assertRaises(requests.ConnectionError):
+            self.device.volume()
+        self.emulator._failure_rate = 0
+        self.device._get('/unknown')
+        requests_metrics = self.metrics.snapshot()['requests']
+        self.assertEqual(requests_metrics['GET /volume']['error_types'],
+                         {'ConnectionError': 1})
+        self.assertEqual(requests_metrics['GET /unknown']['error_types'],
+                         {'HTTP 404': 1})
+
+    def test_websocket_frames(self):
+        self.device._on_message(None, _read('ws_volume.xml'))
+        self.device._on_message(None, _read('ws_status.xml'))
+        self.device._on_message(None, '<updates/>')
+        websocket = self.metrics.snapshot()['websocket']
+        self.assertEqual(websocket['frames'], 3)
+        self.assertEqual(websocket['actions'], {
+            'volumeUpdated': 1, 'nowPlayingUpdated': 1, 'unknown': 1})
+        self.assertGreater(websocket['characters'], 0)
+        self.assertEqual(websocket['parse']['count'], 3)
+
+    def test_coalesced_frames(self):
+        coalescer = EventCoalescer(window=60)
+        device = SoundTouchDevice(self.emulated.host, self.emulated.port,
+                                  metrics=self.metrics, coalescer=coalescer,
+                                  config=self.device.config)
+        try:
+            for _ in range(3):
+                device._on_message(None, _read('ws_volume.xml'))
+        finally:
+            coalescer.close()
+        websocket = self.metrics.snapshot()['websocket']
+        # Frames are counted when received, parsed once handled
+        self.assertEqual(websocket['frames'], 3)
+        self.assertEqual(websocket['parse']['count'], 0)
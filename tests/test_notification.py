@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import io
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+import unittest
+
+from libsoundtouch.device import SoundTouchDevice, BaseSoundTouchDevice, \
+    _message_action
+from libsoundtouch.notification import NotificationHub, \
+    ListenerDispatcher, EventCoalescer, COALESCE, DROP_NEWEST, DROP_OLDEST
+
+_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _read(name):
+    path = os.path.join(os.path.dirname(__file__), 'data', name)
+    with io.open(path, 'r', encoding='utf-8') as data_file:
+        return data_file.read()
+
+
+def _frame(payload, opcode=0x1):
+    if len(payload) < 126:
+        header = struct.pack('!BB', 0x80 | opcode, len(payload))
+    else:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, len(payload))
+    return header + payload
+
+
+class WebSocketServer(object):
+    """Minimal websocket server: handshake and text frames from the server."""
+
+    def __init__(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(8)
+        self.port = self._server.getsockname()[1]
+        self.clients = []
+        self.client_connected = threading.Condition()
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client = self._server.accept()[0]
+            except socket.error:
+                return
+            request = b""
+            while b"\r\n\r\n" not in request:
+                request += client.recv(1024)
+            key = [line.split(b":", 1)[1].strip()
+                   for line in request.split(b"\r\n")
+                   if line.lower().startswith(b"sec-websocket-key:")][0]
+            accept = base64.b64encode(hashlib.sha1(key + _GUID).digest())
+            client.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+                           b"Upgrade: websocket\r\n"
+                           b"Connection: Upgrade\r\n"
+                           b"Sec-WebSocket-Protocol: gabbo\r\n"
+                           b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            with self.client_connected:
+                self.clients.append(client)
+                self.client_connected.notify_all()
+
+    def wait_clients(self, count):
+        with self.client_connected:
+            deadline = time.time() + 5
+            while len(self.clients) < count and time.time() < deadline:
+                self.client_connected.wait(0.1)
+        return len(self.clients) >= count
+
+    def send(self, index, message):
+        self.clients[index].sendall(_frame(message.encode('utf-8')))
+
+    def close(self):
+        self._server.close()
+        for client in self.clients:
+            client.close()
+
+
+class HubDevice(SoundTouchDevice):
+    def __init__(self, ws_port):
+        SoundTouchDevice.__init__(self, '127.0.0.1', ws_port=ws_port,
+                                  lazy=True)
+        self.threads = []
+        self.received = threading.Event()
+        self.add_volume_listener(self._on_volume)
+
+    def _on_volume(self, volume):
+        self.threads.append(threading.current_thread().name)
+        self.received.set()
+
+
+def _wait(predicate):
+    deadline = time.time() + 5
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestNotificationHub(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.server = WebSocketServer()
+        self.hub = NotificationHub(reconnect_delay=0.05)
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        self.hub.close()
+        self.server.close()
+        logging.disable(logging.NOTSET)
+
+    def test_multiplexed_devices(self):
+        devices = [HubDevice(self.server.port) for _ in range(3)]
+        threads = threading.active_count()
+        for device in devices:
+            device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(3))
+        self.assertTrue(_wait(lambda: all(device.notification_connected
+                                          for device in devices)))
+        self.assertEqual(len(self.hub.devices), 3)
+        for index in range(3):
+            self.server.send(index, _read('ws_volume.xml'))
+        for device in devices:
+            self.assertTrue(device.received.wait(5))
+            self.assertEqual(device.volume(refresh=False).actual, 21)
+            self.assertEqual(device.threads, ['NotificationHub'])
+        # One hub thread and the connect workers, whatever the device count
+        self.assertLessEqual(threading.active_count() - threads, 5)
+
+    def test_partial_frame(self):
+        device = HubDevice(self.server.port)
+        device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(1))
+        frame = _frame(_read('ws_volume.xml').encode('utf-8'))
+        self.server.clients[0].sendall(frame[:20])
+        time.sleep(0.2)
+        self.assertFalse(device.received.is_set())
+        self.server.clients[0].sendall(frame[20:])
+        self.assertTrue(device.received.wait(5))
+        self.assertEqual(device.volume(refresh=False).actual, 21)
+
+    def test_reconnect(self):
+        device = HubDevice(self.server.port)
+        device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(1))
+        self.assertTrue(_wait(lambda: device.notification_connected))
+        self.server.clients[0].sendall(_frame(b"", 0x8))
+        self.assertTrue(self.server.wait_clients(2))
+        self.server.send(1, _read('ws_volume.xml'))
+        self.assertTrue(device.received.wait(5))
+        self.assertTrue(_wait(lambda: device.notification_connected))
+
+    def test_stop_notification(self):
+        device = HubDevice(self.server.port)
+        device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(1))
+        self.assertTrue(_wait(lambda: device.notification_connected))
+        device.stop_notification()
+        self.assertTrue(_wait(lambda: not device.notification_connected))
+        self.assertEqual(self.hub.devices, [])
+
+    def test_unreachable_device(self):
+        unused = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+        unreachable = HubDevice(port)
+        device = HubDevice(self.server.port)
+        unreachable.start_notification(hub=self.hub)
+        device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(1))
+        self.server.send(0, _read('ws_volume.xml'))
+        self.assertTrue(device.received.wait(5))
+        self.assertFalse(unreachable.notification_connected)
+
+    def test_standalone_address_change(self):
+        device = HubDevice(self.server.port)
+        device._host = 'localhost'
+        device.start_notification()
+        self.assertTrue(self.server.wait_clients(1))
+        device._set_address('127.0.0.1', 8090)
+        self.assertTrue(self.server.wait_clients(2))
+        self.assertEqual(device._ws_client.url,
+                         'ws://127.0.0.1:%d/' % self.server.port)
+        self.server.send(1, _read('ws_volume.xml'))
+        self.assertTrue(device.received.wait(5))
+        device.stop_notification()
+
+    def test_hub_address_change(self):
+        device = HubDevice(self.server.port)
+        device._host = 'localhost'
+        device.start_notification(hub=self.hub)
+        self.assertTrue(self.server.wait_clients(1))
+        device._set_address('127.0.0.1', 8090)
+        self.assertTrue(self.server.wait_clients(2))
+        self.assertEqual(self.hub.devices, [device])
+        self.server.send(1, _read('ws_volume.xml'))
+        self.assertTrue(device.received.wait(5))
+
+    def test_closed_hub(self):
+        self.hub.close()
+        self.assertRaises(RuntimeError, self.hub.register,
+                          HubDevice(self.server.port))
+
+
+class BlockingListener(object):
+    """Listener blocked on its first event until released."""
+
+    def __init__(self):
+        self.values = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, value):
+        self.started.set()
+        self.release.wait(5)
+        self.values.append(value)
+
+
+class TestListenerDispatcher(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.device = BaseSoundTouchDevice('192.168.1.1')
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        logging.disable(logging.NOTSET)
+
+    def _overflow(self, policy):
+        dispatcher = ListenerDispatcher(max_pending=2, policy=policy)
+        listener = BlockingListener()
+        dispatcher.dispatch(self.device, listener, 0)
+        self.assertTrue(listener.started.wait(5))
+        for value in (1, 2, 3):
+            dispatcher.dispatch(self.device, listener, value)
+        self.assertEqual(dispatcher.pending, 2)
+        listener.release.set()
+        self.assertTrue(dispatcher.flush(5))
+        dispatcher.close()
+        self.assertEqual(dispatcher.pending, 0)
+        return dispatcher, listener.values
+
+    def test_drop_newest(self):
+        dispatcher, values = self._overflow(DROP_NEWEST)
+        self.assertEqual(values, [0, 1, 2])
+        self.assertEqual(dispatcher.dropped, 1)
+
+    def test_drop_oldest(self):
+        dispatcher, values = self._overflow(DROP_OLDEST)
+        self.assertEqual(values, [0, 2, 3])
+        self.assertEqual(dispatcher.dropped, 1)
+
+    def test_coalesce(self):
+        dispatcher, values = self._overflow(COALESCE)
+        self.assertEqual(values, [0, 1, 3])
+        self.assertEqual(dispatcher.dropped, 0)
+        self.assertEqual(dispatcher.coalesced, 1)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, ListenerDispatcher, policy='unknown')
+
+    def test_slow_listener(self):
+        dispatcher = ListenerDispatcher(max_workers=2)
+        slow = BlockingListener()
+        fast = []
+        dispatcher.dispatch(self.device, slow, 'slow')
+        self.assertTrue(slow.started.wait(5))
+        for value in range(50):
+            dispatcher.dispatch(self.device, fast.append, value)
+        self.assertTrue(_wait(lambda: len(fast) == 50))
+        self.assertEqual(fast, list(range(50)))
+        self.assertFalse(dispatcher.flush(0.05))
+        slow.release.set()
+        self.assertTrue(dispatcher.flush(5))
+        dispatcher.close()
+        self.assertEqual(slow.values, ['slow'])
+
+    def test_failing_listener(self):
+        dispatcher = ListenerDispatcher()
+        values = []
+
+        def listener(value):
+            values.append(value)
+            raise ValueError()
+
+        dispatcher.dispatch(self.device, listener, 1)
+        dispatcher.dispatch(self.device, listener, 2)
+        self.assertTrue(dispatcher.flush(5))
+        dispatcher.close()
+        self.assertEqual(values, [1, 2])
+
+    def test_device_listeners(self):
+        dispatcher = ListenerDispatcher()
+        device = BaseSoundTouchDevice('192.168.1.1', dispatcher=dispatcher)
+        threads = []
+        device.add_volume_listener(
+            lambda volume: threads.append(threading.current_thread()))
+        device._on_update(device._parse_message(_read('ws_volume.xml')))
+        self.assertTrue(dispatcher.flush(5))
+        dispatcher.close()
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.current_thread())
+        self.assertEqual(device._volume.actual, 21)
+
+    def test_listener_of_several_events(self):
+        dispatcher = ListenerDispatcher(max_pending=1, policy=COALESCE)
+        device = BaseSoundTouchDevice('192.168.1.1', dispatcher=dispatcher)
+        listener = BlockingListener()
+        device.add_volume_listener(listener)
+        device.add_status_listener(listener)
+        device._run_listener(device._volume_updated_listeners, 'blocker')
+        self.assertTrue(listener.started.wait(5))
+        device._run_listener(device._volume_updated_listeners, 'volume=30')
+        device._run_listener(device._status_updated_listeners, 'status=PLAY')
+        listener.release.set()
+        self.assertTrue(dispatcher.flush(5))
+        dispatcher.close()
+        self.assertEqual(sorted(listener.values),
+                         ['blocker', 'status=PLAY', 'volume=30'])
+        self.assertEqual(dispatcher.coalesced, 0)
+
+    def test_closed_dispatcher(self):
+        dispatcher = ListenerDispatcher()
+        dispatcher.close()
+        values = []
+        dispatcher.dispatch(self.device, values.append, 1)
+        self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(values, [])
+
+
+class TestEventCoalescer(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.coalescer = EventCoalescer(window=0.1)
+        self.device = HubDevice(8080)
+        self.device._coalescer = self.coalescer
+        self.volumes = []
+        self.device.add_volume_listener(
+            lambda volume: self.volumes.append(volume.actual))
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        self.coalescer.close()
+        logging.disable(logging.NOTSET)
+
+    def test_message_action(self):
+        self.assertEqual(_message_action(_read('ws_volume.xml')),
+                         'volumeUpdated')
+        self.assertEqual(_message_action(_read('ws_zone.xml')),
+                         'zoneUpdated')
+        self.assertEqual(_message_action(
+            '<?xml version="1.0" encoding="UTF-8" ?>\n<updates>'
+            '<presetsUpdated/></updates>'), 'presetsUpdated')
+        self.assertIsNone(_message_action('<SoundTouchSdkInfo/>'))
+
+    def test_latest_event_per_type(self):
+        message = _read('ws_volume.xml')
+        for level in range(10):
+            self.device._on_message(None, message.replace(
+                '<actualvolume>21', '<actualvolume>%d' % level))
+        self.device._on_message(None, _read('ws_status.xml'))
+        self.assertEqual(self.volumes, [])
+        self.assertTrue(_wait(lambda: self.volumes))
+        time.sleep(0.2)
+        self.assertEqual(self.volumes, [9])
+        self.assertEqual(self.device._status.track, 'Devil We Know')
+        self.assertEqual(self.coalescer.received, 11)
+        self.assertEqual(self.coalescer.coalesced, 9)
+        # A new window opens with the next update
+        self.device._on_message(None, message)
+        self.assertTrue(_wait(lambda: len(self.volumes) == 2))
+        self.assertEqual(self.volumes, [9, 21])
+
+    def test_not_an_update(self):
+        self.device._on_message(None, '<SoundTouchSdkInfo/>')
+        self.assertEqual(self.coalescer.received, 0)
+
+    def test_close(self):
+        self.coalescer.close()
+        self.device._on_message(None, _read('ws_volume.xml'))
+        time.sleep(0.2)
+        self.assertEqual(self.volumes, [])
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from libsoundtouch.device import SoundTouchDevice
+from libsoundtouch.emulator import SoundTouchEmulator
+from libsoundtouch.polling import PollingScheduler
+
+
+def _wait(predicate):
+    deadline = time.time() + 5
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestPollingScheduler(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        self.emulator = SoundTouchEmulator()
+        self.emulated = self.emulator.add_devices(3)
+        self.emulator.start()
+        self.devices = [SoundTouchDevice(emulated.host, emulated.port,
+                                         emulated.ws_port, lazy=True)
+                        for emulated in self.emulated]
+        self.scheduler = None
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        if self.scheduler is not None:
+            self.scheduler.close()
+        for device in self.devices:
+            device.close()
+        self.emulator.close()
+
+    def _scheduler(self, **kwargs):
+        options = dict(active_interval=0.05, idle_interval=0.1,
+                       standby_interval=0.2, max_rate=None)
+        options.update(kwargs)
+        self.scheduler = PollingScheduler(**options)
+        return self.scheduler
+
+    def test_listeners(self):
+        device = self.devices[0]
+        statuses = []
+        volumes = []
+        device.add_status_listener(statuses.append)
+        device.add_volume_listener(volumes.append)
+        self._scheduler().register(device)
+        self.assertTrue(_wait(lambda: statuses and volumes))
+        self.assertEqual(statuses[0].source, 'STANDBY')
+        # Unchanged values don't call the listeners
+        polls = self.scheduler.polls
+        self.assertTrue(_wait(lambda: self.scheduler.polls >= polls + 2))
+        self.assertEqual(len(statuses), 1)
+        self.assertEqual(len(volumes), 1)
+        self.emulated[0].set_volume(42)
+        self.assertTrue(_wait(lambda: len(volumes) == 2))
+        self.assertEqual(volumes[1].actual, 42)
+
+    def test_intervals(self):
+        device = self.devices[0]
+        scheduler = self._scheduler(active_period=0)
+        scheduler.register(device)
+        self.assertTrue(_wait(lambda: scheduler.interval(device) == 0.2))
+        self.emulated[0].power(True)
+        self.assertTrue(_wait(lambda: scheduler.interval(device) == 0.05))
+        self.emulated[0].set_play_status('PAUSE_STATE')
+        self.assertTrue(_wait(lambda: scheduler.interval(device) == 0.1))
+
+    def test_active_after_change(self):
+        device = self.devices[0]
+        scheduler = self._scheduler(active_period=60)
+        scheduler.register(device)
+        self.assertTrue(_wait(lambda: scheduler.interval(device) == 0.2))
+        self.emulated[0].power(True)
+        self.emulated[0].set_play_status('PAUSE_STATE')
+        self.assertTrue(_wait(lambda: device.status(refresh=False)
+                              .play_status == 'PAUSE_STATE'))
+        # Paused, but changed less than active_period ago
+        time.sleep(0.2)
+        self.assertEqual(scheduler.interval(device), 0.05)
+
+    def test_max_rate(self):
+        scheduler = self._scheduler(active_interval=0, idle_interval=0,
+                                    standby_interval=0, max_rate=40)
+        for device in self.devices:
+            scheduler.register(device)
+        time.sleep(0.5)
+        scheduler.close()
+        requests = sum(emulated.requests for emulated in self.emulated)
+        # 2 requests (status and volume) per poll, 40 requests per second
+        self.assertGreater(requests, 10)
+        self.assertLessEqual(requests, 24)
+
+    def test_notification_connected(self):
+        device = self.devices[0]
+        device._on_open()
+        scheduler = self._scheduler()
+        scheduler.register(device)
+        self.assertTrue(_wait(lambda: scheduler.polls >= 2))
+        self.assertEqual(self.emulated[0].requests, 0)
+        device._on_close()
+        self.assertTrue(_wait(lambda: self.emulated[0].requests > 0))
+
+    def test_errors(self):
+        self.emulator._failure_rate = 1
+        device = self.devices[0]
+        scheduler = self._scheduler()
+        scheduler.register(device)
+        self.assertTrue(_wait(lambda: scheduler.errors >= 2))
+        self.assertEqual(scheduler.interval(device), 0.1)
+
+    def test_unregister(self):
+        device = self.devices[0]
+        scheduler = self._scheduler()
+        scheduler.register(device)
+        scheduler.register(device)
+        self.assertEqual(scheduler.devices, [device])
+        self.assertTrue(_wait(lambda: scheduler.polls >= 1))
+        scheduler.unregister(device)
+        self.assertEqual(scheduler.devices, [])
+        time.sleep(0.1)
+        requests = self.emulated[0].requests
+        time.sleep(0.2)
+        self.assertEqual(self.emulated[0].requests, requests)
+        scheduler.close()
+        self.assertRaises(RuntimeError, scheduler.register, device)
+
+    def test_unknown_resource(self):
+        self.assertRaises(ValueError, PollingScheduler, ('status', 'bass'))
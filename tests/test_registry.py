@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from mock import Mock, mock
+except ImportError:
+    from unittest import mock
+    from unittest.mock import Mock
+
+from libsoundtouch.device import Config, SoundTouchDevice
+from libsoundtouch.registry import DeviceRegistry, _VERSION
+
+INFO = """<?xml version="1.0" encoding="UTF-8" ?>
+<info deviceID="%s">
+    <name>%s</name>
+    <type>SoundTouch 20</type>
+    <components>
+        <component>
+            <componentCategory>SCM</componentCategory>
+            <softwareVersion>13.0.9.29919.1889959</softwareVersion>
+            <serialNumber>XXXXX</serialNumber>
+        </component>
+    </components>
+    <networkInfo type="SMSC">
+        <macAddress>%s</macAddress>
+        <ipAddress>%s</ipAddress>
+    </networkInfo>
+</info>"""
+
+
+def _response(device_id, name, host):
+    return Mock(content=(INFO % (device_id, name, device_id, host)).encode(
+        'utf-8'))
+
+
+def _mocked_info(*args, **kwargs):
+    if args[0] == 'http://192.168.1.1:8090/info':
+        return _response("0001", "Kitchen", "192.168.1.1")
+    if args[0] == 'http://192.168.1.2:8090/info':
+        return _response("0002", "Bedroom", "192.168.1.2")
+    raise IOError("unreachable")
+
+
+class TestDeviceRegistry(unittest.TestCase):
+    def setUp(self):  # pylint: disable=invalid-name
+        """Setup things to be run when tests are started."""
+        logging.disable(logging.DEBUG)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'devices.json')
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """Stop everything that was started."""
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_info)
+    def _register(self, mocked_info):
+        registry = DeviceRegistry(self.path)
+        registry.update([SoundTouchDevice("192.168.1.1"),
+                         SoundTouchDevice("192.168.1.2", ws_port=8081)])
+        registry.save()
+        return registry
+
+    def test_config_dict(self):
+        config = Config.from_dict({
+            'device_id': '0001', 'name': 'Kitchen',
+            'networks': [{'type': 'SMSC', 'mac_address': '0001',
+                          'ip_address': '192.168.1.1'}],
+            'components': [{'category': 'SCM', 'serial_number': 'XXXXX'}]})
+        self.assertEqual(config.device_id, '0001')
+        self.assertEqual(config.name, 'Kitchen')
+        self.assertIsNone(config.type)
+        self.assertEqual(config.device_ip, '192.168.1.1')
+        self.assertEqual(config.components[0].serial_number, 'XXXXX')
+        self.assertIsNone(config.components[0].software_version)
+        self.assertEqual(Config.from_dict(config.to_dict()).to_dict(),
+                         config.to_dict())
+
+    @mock.patch('requests.Session.get', side_effect=_mocked_info)
+    def test_load(self, mocked_info):
+        self._register()
+        registry = DeviceRegistry(self.path)
+        self.assertEqual(sorted(registry.device_ids), ['0001', '0002'])
+        device = registry.device('0002')
+        self.assertIs(registry.device('0002'), device)
+        self.assertEqual(device.host, '192.168.1.2')
+        self.assertEqual(device.ws_port, 8081)
+        self.assertEqual(device.config.name, 'Bedroom')
+        self.assertEqual(device.config.device_ip, '192.168.1.2')
+        self.assertEqual(device.config.components[0].software_version,
+                         '13.0.9.29919.1889959')
+        self.assertEqual(len(registry.devices()), 2)
+        self.assertIsNone(registry.device('0003'))
+        self.assertIsNotNone(registry.validated_at('0001'))
+        self.assertEqual(mocked_info.call_count, 0)
+
+    def test_revalidate(self):
+        self._register()
+        registry = DeviceRegistry(self.path)
+        validated_at = registry.validated_at('0001')
+
+        def _info(*args, **kwargs):
+            if args[0] == 'http://192.168.1.1:8090/info':
+                return _response("0001", "Living room", "192.168.1.1")
+            raise IOError("unreachable")
+
+        with mock.patch('requests.Session.get', side_effect=_info):
+            registry.start_revalidation().join(5)
+        self.assertEqual(registry.device('0001').config.name, 'Living room')
+        self.assertEqual(registry.config('0002').name, 'Bedroom')
+        self.assertGreaterEqual(registry.validated_at('0001'), validated_at)
+        self.assertEqual(DeviceRegistry(self.path).config('0001').name,
+                         'Living room')
+
+    def test_remove(self):
+        registry = self._register()
+        registry.remove('0001')
+        registry.save()
+        self.assertEqual(DeviceRegistry(self.path).device_ids, ['0002'])
+
+    def test_invalid_file(self):
+        self.assertEqual(DeviceRegistry(self.path).devices(), [])
+        with io.open(self.path, 'w', encoding='utf-8') as registry_file:
+            registry_file.write(u'{invalid')
+        self.assertEqual(DeviceRegistry(self.path).devices(), [])
+        with io.open(self.path, 'w', encoding='utf-8') as registry_file:
+            registry_file.write(u'' + json.dumps({'version': 0}))
+        self.assertEqual(DeviceRegistry(self.path).devices(), [])
+
+    def test_malformed_file(self):
+        for data in ([], {'version': _VERSION, 'devices': [{'host': 'x'}]},
+                     {'version': _VERSION, 'devices': 1}):
+            with io.open(self.path, 'w', encoding='utf-8') as registry_file:
+                registry_file.write(u'' + json.dumps(data))
+            self.assertEqual(DeviceRegistry(self.path).devices(), [])